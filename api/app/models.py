@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, JSON, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, JSON, Text, Index, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime
 from .db import Base
@@ -80,6 +80,13 @@ class Shortage(Base):
 
 class Alert(Base):
     __tablename__ = "alerts"
+    # At most one open alert per dedup key (target of the worker's upsert)
+    __table_args__ = (
+        Index(
+            "uq_alerts_open_dedup_key", "dedup_key", unique=True,
+            postgresql_where=text("status = 'open'"), sqlite_where=text("status = 'open'")
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     ts: Mapped[datetime] = mapped_column(DateTime, index=True, default=datetime.utcnow)
     hospital_id: Mapped[int] = mapped_column(ForeignKey("hospitals.id"), index=True)
@@ -90,6 +97,19 @@ class Alert(Base):
     status: Mapped[str] = mapped_column(String, default="open")
     ack_by: Mapped[str | None] = mapped_column(String, nullable=True)
     ack_ts: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Stable identity of agent alerts (hospital, type, subject, horizon) used to suppress repeats
+    dedup_key: Mapped[str | None] = mapped_column(String, nullable=True)
+    recommendation_set_id: Mapped[int | None] = mapped_column(ForeignKey("recommendation_sets.id"), nullable=True)
+
+
+class RecommendationSet(Base):
+    """Recommendations of an agent run, stored once and referenced by its alerts"""
+    __tablename__ = "recommendation_sets"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ts: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    hospital_id: Mapped[int] = mapped_column(ForeignKey("hospitals.id"), index=True)
+    digest: Mapped[str] = mapped_column(String, unique=True, index=True)
+    recommendations_json: Mapped[list] = mapped_column(JSON, default=list)
 
 
 class User(Base):
@@ -103,6 +103,14 @@ def ack_alert(alert_id: int, payload: schemas.AlertAck, db: Session = Depends(ge
     return schemas.AlertOut.model_validate(alert)
 
 
+@router.get("/recommendation-sets/{set_id}", response_model=schemas.RecommendationSetOut)
+def get_recommendation_set(set_id: int, db: Session = Depends(get_db), user=Depends(auth.get_current_user)):
+    rec_set = db.query(models.RecommendationSet).filter(models.RecommendationSet.id == set_id).first()
+    if not rec_set:
+        raise HTTPException(404, "Recommendation set not found")
+    return schemas.RecommendationSetOut.model_validate(rec_set)
+
+
 @router.post("/documents", response_model=schemas.DocumentOut)
 def upload_document(doc: schemas.DocumentIn, db: Session = Depends(get_db), user=Depends(auth.require_role("admin", "ops-manager"))):
     # MVP: store empty embedding; worker can backfill
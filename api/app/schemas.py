@@ -55,6 +55,17 @@ class AlertOut(BaseModel):
     message: str
     action_json: Dict[str, Any] | None
     status: str
+    recommendation_set_id: int | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class RecommendationSetOut(BaseModel):
+    id: int
+    ts: datetime
+    hospital_id: int
+    recommendations_json: List[Dict[str, Any]]
 
     class Config:
         from_attributes = True
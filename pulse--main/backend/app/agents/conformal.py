@@ -0,0 +1,88 @@
+import math
+import threading
+from typing import Optional
+import numpy as np
+
+# Split-conformal prediction intervals from out-of-sample residuals.
+# Residuals are stored per (engine, data version) as a matrix of
+# (backtest origins x horizon step); bands are |residual| quantiles per step.
+
+DEFAULT_COVERAGE = 0.8
+MIN_COVERAGE = 0.5
+MAX_COVERAGE = 0.99
+
+# Residuals from this many neighbouring horizon steps on each side are pooled,
+# since a few backtest origins alone give too few scores per step
+STEP_WINDOW = 2
+
+_store = {}
+_lock = threading.Lock()
+
+
+def _pooled_scores(residuals: np.ndarray) -> np.ndarray:
+    """Sorted |residual| scores per horizon step (steps x pooled scores), NaN last"""
+    residuals = np.atleast_2d(np.asarray(residuals, dtype=float))
+    origins, steps = residuals.shape
+    padded = np.full((origins, steps + 2 * STEP_WINDOW), np.nan)
+    padded[:, STEP_WINDOW:STEP_WINDOW + steps] = np.abs(residuals)
+    # windows[j] holds the scores of steps j-STEP_WINDOW .. j+STEP_WINDOW
+    windows = np.stack([padded[:, offset:offset + steps] for offset in range(2 * STEP_WINDOW + 1)], axis=0)
+    scores = windows.transpose(2, 0, 1).reshape(steps, -1)
+    return np.sort(scores, axis=1)
+
+
+def record(engine: str, version: str, residuals: np.ndarray):
+    """Store out-of-sample residuals (origins x horizon step) of an engine for a data version"""
+    scores = _pooled_scores(residuals)
+    with _lock:
+        # Only the newest data version of each engine is kept
+        for key in [k for k in _store if k[0] == engine and k[1] != version]:
+            del _store[key]
+        _store[(engine, version)] = (scores, np.sum(~np.isnan(scores), axis=1))
+
+
+def has(engine: str, version: str) -> bool:
+    return (engine, version) in _store
+
+
+def half_widths(engine: str, version: str, horizon_days: int, coverage: float = DEFAULT_COVERAGE):
+    """
+    (band half-width per day, coverage achieved) for the requested coverage,
+    or None without residuals.
+
+    Uses the finite-sample split-conformal quantile: the ceil((n + 1) * coverage)-th
+    smallest of the n scores for each step. With few scores that rank can
+    exceed n; the largest score is used then, which only guarantees
+    n / (n + 1), and the coverage achieved is reported as the lowest over the
+    days. Days past the backtest horizon reuse the last step.
+    """
+    entry = _store.get((engine, version))
+    if entry is None:
+        return None
+    scores, counts = entry
+    rank = np.minimum(np.ceil((counts + 1) * coverage).astype(int), counts) - 1
+    widths = np.take_along_axis(scores, np.maximum(rank, 0)[:, None], axis=1)[:, 0]
+    widths = np.where(counts > 0, widths, np.nan)
+    achieved = np.where(counts > 0, np.minimum(coverage, counts / (counts + 1.0)), np.nan)
+    if np.isnan(widths).all():
+        return None
+    # Steps without scores borrow the widest band and its coverage
+    achieved = np.where(np.isnan(widths), achieved[np.nanargmax(widths)], achieved)
+    widths = np.where(np.isnan(widths), np.nanmax(widths), widths)
+    steps = np.minimum(np.arange(horizon_days), len(widths) - 1)
+    return widths[steps], float(achieved[steps].min())
+
+
+def bands(engine: str, version: str, point: np.ndarray, coverage: float = DEFAULT_COVERAGE):
+    """(low, high, coverage achieved) around point, or None without residuals for this engine and data"""
+    result = half_widths(engine, version, len(point), coverage)
+    if result is None:
+        return None
+    widths, achieved = result
+    return np.maximum(0.0, point - widths), point + widths, achieved
+
+
+def validate_coverage(coverage: Optional[float]) -> float:
+    if coverage is None or (isinstance(coverage, float) and math.isnan(coverage)):
+        return DEFAULT_COVERAGE
+    return min(MAX_COVERAGE, max(MIN_COVERAGE, float(coverage)))
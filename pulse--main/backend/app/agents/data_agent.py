@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+import hashlib
 from datetime import datetime
 
 DATA_DIR = "app/data"
@@ -10,6 +11,15 @@ def load_csv(filename: str) -> pd.DataFrame:
         raise FileNotFoundError(f"{filename} not found in {DATA_DIR}")
     return pd.read_csv(path)
 
+def get_data_version() -> str:
+    """Fingerprint of the data files; changes whenever any CSV is rewritten"""
+    digest = hashlib.sha1()
+    for filename in sorted(os.listdir(DATA_DIR)):
+        if filename.endswith(".csv"):
+            stat = os.stat(os.path.join(DATA_DIR, filename))
+            digest.update(f"{filename}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return digest.hexdigest()[:16]
+
 def load_admissions() -> pd.DataFrame:
     df = load_csv("admissions.csv")
     df['date'] = pd.to_datetime(df['date'])
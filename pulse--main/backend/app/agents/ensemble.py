@@ -0,0 +1,307 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+import numpy as np
+import pandas as pd
+from app.agents import forecast_agent, multi_series, regressors
+from app.services import model_registry, forecast_pool
+
+# Ensemble members, combined with inverse backtest-MAE weights
+MEMBERS = ["prophet", "fourier", "linear_trend", "seasonal_naive"]
+
+# Rolling-origin backtest: BACKTEST_FOLDS origins BACKTEST_STEP days apart,
+# each forecasting BACKTEST_HORIZON days
+BACKTEST_FOLDS = 4
+BACKTEST_STEP = 7
+BACKTEST_HORIZON = 14
+
+# Members still running after this are left out of the combination
+MEMBER_TIMEOUT_SECONDS = float(os.getenv("ENSEMBLE_MEMBER_TIMEOUT_SECONDS", "20"))
+
+_executor = ThreadPoolExecutor(max_workers=2 * len(MEMBERS), thread_name_prefix="ensemble")
+# Backtests started by requests run here, off the request path
+_backtest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ensemble-backtest")
+
+# Per data version: folds, per-member forecast futures and the summary.
+# The lock only guards the dictionaries; forecasts are computed outside it.
+_backtests = {}
+_backtest_lock = threading.Lock()
+# Weights of the latest finished backtest, used while a new one runs
+_prior_weights = {}
+
+
+class MemberUnavailable(Exception):
+    """The member can't forecast this data (missing dependency or columns)"""
+
+
+def seasonal_naive(feature_df: pd.DataFrame, horizon_days: int, projection: pd.DataFrame) -> np.ndarray:
+    """Same weekday last week"""
+    y = pd.to_numeric(feature_df['admissions_count'], errors="coerce").dropna().to_numpy(dtype=float)
+    if len(y) < 7:
+        raise MemberUnavailable("needs a week of history")
+    return np.resize(y[-7:], horizon_days)
+
+
+def linear_trend(feature_df: pd.DataFrame, horizon_days: int, projection: pd.DataFrame) -> np.ndarray:
+    return forecast_agent._fit_statistical(forecast_agent.prophet_frame(feature_df), horizon_days)["baseline"]
+
+
+def fourier(feature_df: pd.DataFrame, horizon_days: int, projection: pd.DataFrame, model: dict = None) -> np.ndarray:
+    """Multi-series Fourier regression, summed over components, at the projected regressors"""
+    if not multi_series.has_components(feature_df):
+        raise MemberUnavailable("needs respiratory_cases and trauma_cases")
+    model = model or multi_series.fit(feature_df)
+    return multi_series.predict(
+        model, horizon_days,
+        aqi=projection['aqi'].to_numpy(dtype=float)[:horizon_days],
+        festival=projection['holiday'].to_numpy(dtype=float)[:horizon_days],
+        temperature=projection['temperature'].to_numpy(dtype=float)[:horizon_days],
+        humidity=projection['humidity'].to_numpy(dtype=float)[:horizon_days]
+    )["total"]
+
+
+def _prophet_fold(feature_df: pd.DataFrame, horizon_days: int, projection: pd.DataFrame) -> np.ndarray:
+    """Prophet fit for one backtest fold (runs in the forecast pool; folds are not stored in the registry)"""
+    df_train = forecast_agent.prophet_frame(feature_df)
+    fitted = forecast_agent._fit_baseline(df_train, horizon_days, None, projection)
+    if not fitted["use_prophet"]:
+        raise MemberUnavailable("Prophet is not available")
+    return fitted["baseline"]
+
+
+def _folds(feature_df: pd.DataFrame):
+    """(train frame, actual admissions) per backtest origin, oldest first"""
+    df = feature_df.sort_values('date').reset_index(drop=True)
+    y = pd.to_numeric(df['admissions_count'], errors="coerce").to_numpy(dtype=float)
+    folds = []
+    for k in reversed(range(BACKTEST_FOLDS)):
+        cut = len(df) - BACKTEST_HORIZON - k * BACKTEST_STEP
+        if cut >= 60:
+            folds.append((df.iloc[:cut], y[cut:cut + BACKTEST_HORIZON]))
+    return folds
+
+
+def _fold_data(feature_df: pd.DataFrame, fingerprint: str) -> dict:
+    """
+    Folds, projected regressors per fold and the per-member cache for one
+    data version. Built outside the lock; a concurrent duplicate is dropped.
+    """
+    with _backtest_lock:
+        entry = _backtests.get(fingerprint)
+    if entry is not None:
+        return entry
+
+    folds = _folds(feature_df)
+    built = {
+        "folds": folds,
+        "projections": [regressors.project(train, BACKTEST_HORIZON) for train, _ in folds],
+        "actuals": np.array([actual for _, actual in folds]).reshape(len(folds), BACKTEST_HORIZON),
+        "forecasts": {}
+    }
+    with _backtest_lock:
+        entry = _backtests.get(fingerprint)
+        if entry is None:
+            # Only the current data version is kept
+            _backtests.clear()
+            entry = _backtests[fingerprint] = built
+    return entry
+
+
+def _claim(table: dict, key: str):
+    """(future, True if the caller must compute it) for a cache slot (caller holds the lock)"""
+    future = table.get(key)
+    if future is not None:
+        return future, False
+    future = table[key] = Future()
+    return future, True
+
+
+def _fulfil(future: Future, fn, *args) -> None:
+    try:
+        future.set_result(fn(*args))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+def _member_forecasts(name: str, data: dict) -> np.ndarray:
+    """Backtest forecasts of one member, (folds x BACKTEST_HORIZON) with NaN where it had none"""
+    forecasts = np.full((len(data["folds"]), BACKTEST_HORIZON), np.nan)
+    if name == "prophet":
+        # Prophet folds are fitted in parallel in the forecast pool
+        if not forecast_pool.allow_slow_engine():
+            return forecasts
+        jobs = [forecast_pool.submit(_prophet_fold, train, BACKTEST_HORIZON, projection) for (train, _), projection in zip(data["folds"], data["projections"])]
+        for i, job in enumerate(jobs):
+            result = job.result()
+            if result is not None:
+                forecasts[i] = result
+        return forecasts
+
+    member = {"fourier": fourier, "linear_trend": linear_trend, "seasonal_naive": seasonal_naive}[name]
+    for i, ((train, _), projection) in enumerate(zip(data["folds"], data["projections"])):
+        try:
+            forecasts[i] = member(train, BACKTEST_HORIZON, projection)
+        except MemberUnavailable:
+            continue
+    return forecasts
+
+
+def member_residuals(feature_df: pd.DataFrame, name: str, compute: bool = True):
+    """
+    Out-of-sample residuals (actual - forecast) of one member, (folds x
+    BACKTEST_HORIZON), computed once per data version. Cheap members take
+    milliseconds; Prophet refits every fold in the forecast pool. Each member
+    has its own cache slot and the lock is only held to claim it, so the
+    cheap members' conformal residuals never wait for Prophet.
+    Without compute, None unless they are ready.
+    """
+    data = _fold_data(feature_df, model_registry.data_fingerprint(feature_df))
+    with _backtest_lock:
+        if not compute:
+            future = data["forecasts"].get(name)
+            if future is None or not future.done():
+                return None
+            owner = False
+        else:
+            future, owner = _claim(data["forecasts"], name)
+    if owner:
+        _fulfil(future, _member_forecasts, name, data)
+    return data["actuals"] - future.result()
+
+
+def _weights(mae: dict) -> dict:
+    inverse = {name: 1.0 / max(error, 1e-6) for name, error in mae.items()}
+    total = sum(inverse.values())
+    return {name: value / total for name, value in inverse.items()}
+
+
+def _summarize(data: dict, residuals: dict) -> dict:
+    mae = {name: float(np.nanmean(np.abs(r))) for name, r in residuals.items() if not np.isnan(r).all()}
+    weights = _weights(mae)
+
+    # Residuals of the combination itself, with weights renormalized where a member is missing
+    stacked = np.array([data["actuals"] - residuals[name] for name in weights])
+    w = np.array([weights[name] for name in weights])[:, None, None] * ~np.isnan(stacked)
+    weight_sum = w.sum(axis=0)
+    combined = np.where(weight_sum > 0, np.sum(np.nan_to_num(stacked) * w, axis=0) / np.maximum(weight_sum, 1e-9), np.nan)
+    residuals["ensemble"] = data["actuals"] - combined
+
+    with _backtest_lock:
+        _prior_weights.clear()
+        _prior_weights.update(weights)
+    return {
+        "weights": weights,
+        "mae": mae,
+        "residuals": residuals,
+        "actuals": data["actuals"],
+        "folds": len(data["folds"])
+    }
+
+
+def get_backtest(feature_df: pd.DataFrame) -> dict:
+    """
+    Rolling backtest of every member plus the weighted combination: weights,
+    MAE and residuals per member (and "ensemble"), computed once per data
+    version. Blocks until the Prophet folds are fitted; requests use
+    ``ready_backtest`` instead.
+    """
+    data = _fold_data(feature_df, model_registry.data_fingerprint(feature_df))
+    with _backtest_lock:
+        future, owner = _claim(data, "summary")
+    if owner:
+        _fulfil(future, lambda: _summarize(data, {name: member_residuals(feature_df, name) for name in MEMBERS}))
+    return future.result()
+
+
+def ready_backtest(feature_df: pd.DataFrame):
+    """
+    The backtest of this data version if it has finished, else None. The
+    first call per data version starts it in the background.
+    """
+    data = _fold_data(feature_df, model_registry.data_fingerprint(feature_df))
+    with _backtest_lock:
+        future = data.get("summary")
+        start = future is None and not data.get("started")
+        data["started"] = True
+    if start:
+        _backtest_executor.submit(get_backtest, feature_df)
+    elif future is not None and future.done() and future.exception() is None:
+        return future.result()
+    return None
+
+
+def _current_weights(backtest) -> tuple:
+    """(weights, source): the backtest's, else the previous data version's, else equal"""
+    if backtest is not None:
+        return backtest["weights"], "backtest"
+    with _backtest_lock:
+        prior = dict(_prior_weights)
+    if prior:
+        return prior, "prior"
+    return {name: 1.0 / len(MEMBERS) for name in MEMBERS}, "equal"
+
+
+def _production_member(name: str, feature_df: pd.DataFrame, horizon_days: int, projection: pd.DataFrame) -> np.ndarray:
+    if name == "prophet":
+        fitted = forecast_agent.get_baseline(forecast_agent.prophet_frame(feature_df), horizon_days, projection)
+        if not fitted["use_prophet"]:
+            raise MemberUnavailable("Prophet fit unavailable")
+        return fitted["baseline"]
+    if name == "fourier":
+        if not multi_series.has_components(feature_df):
+            raise MemberUnavailable("needs respiratory_cases and trauma_cases")
+        return fourier(feature_df, horizon_days, projection, model=forecast_agent.get_multi_series(feature_df))
+    return {"linear_trend": linear_trend, "seasonal_naive": seasonal_naive}[name](feature_df, horizon_days, projection)
+
+
+def combine(feature_df: pd.DataFrame, horizon_days: int, projection: pd.DataFrame) -> dict:
+    """
+    Run all members in parallel and combine them with the backtest weights.
+
+    The backtest runs in the background: until it finishes, the previous
+    data version's weights (or equal weights) are used and "backtest" is
+    None. Members that time out, fail or are unavailable are left out and
+    the remaining weights renormalized. Returns the combined forecast and one
+    entry per member (status, weight used, mean forecast, contribution).
+    """
+    backtest = ready_backtest(feature_df)
+    member_weights, weighting = _current_weights(backtest)
+    futures = {name: _executor.submit(_production_member, name, feature_df, horizon_days, projection) for name in MEMBERS}
+    done, _ = wait(list(futures.values()), timeout=MEMBER_TIMEOUT_SECONDS)
+
+    forecasts, statuses = {}, {}
+    for name, future in futures.items():
+        if future not in done:
+            statuses[name] = "timeout"
+        elif isinstance(future.exception(), MemberUnavailable):
+            statuses[name] = "unavailable"
+        elif future.exception() is not None:
+            print(f"Ensemble member {name} failed: {future.exception()}")
+            statuses[name] = "failed"
+        elif name not in member_weights:
+            statuses[name] = "no_backtest"
+        else:
+            forecasts[name] = np.nan_to_num(np.asarray(future.result(), dtype=float)[:horizon_days])
+            statuses[name] = "ok"
+
+    if forecasts:
+        total_weight = sum(member_weights[name] for name in forecasts)
+        weights = {name: member_weights[name] / total_weight for name in forecasts}
+    else:
+        # Nothing usable in time: the linear trend alone, computed here
+        forecasts["linear_trend"] = linear_trend(feature_df, horizon_days, projection)
+        statuses["linear_trend"] = "fallback"
+        weights = {"linear_trend": 1.0}
+    combined = sum(weights[name] * forecasts[name] for name in forecasts)
+
+    members = []
+    for name in MEMBERS:
+        entry = {"engine": name, "status": statuses[name], "weight": round(weights.get(name, 0.0), 3)}
+        if backtest is not None and name in backtest["mae"]:
+            entry["backtest_mae"] = round(backtest["mae"][name], 2)
+        if name in forecasts:
+            entry["avg_predicted"] = round(float(forecasts[name].mean()), 1)
+            entry["contribution"] = round(float((weights[name] * forecasts[name]).mean()), 1)
+        members.append(entry)
+
+    return {"forecast": np.maximum(0.0, combined), "members": members, "backtest": backtest, "weighting": weighting}
@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from app.agents import regressors
+
+# Lags and rolling windows of daily admissions
+LAGS = [1, 7, 14]
+ROLLING_WINDOWS = [7, 28]
+AQI_LAGS = [1, 7]
+# Event proximity is capped at this many days
+EVENT_HORIZON = 30
+
+_CACHE_SIZE = 4
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _days_to_event(holiday: np.ndarray, forward: bool) -> np.ndarray:
+    """Days until the next (forward) or since the last event on each row, capped at EVENT_HORIZON"""
+    index = np.arange(len(holiday), dtype=float)
+    marks = pd.Series(np.where(holiday > 0, index, np.nan))
+    if forward:
+        days = marks.bfill().to_numpy() - index
+    else:
+        days = index - marks.ffill().to_numpy()
+    return np.nan_to_num(np.minimum(days, EVENT_HORIZON), nan=EVENT_HORIZON)
+
+
+def calendar_features(dates: pd.Series) -> pd.DataFrame:
+    """Day-of-week one-hot and day-of-year cyclic encodings"""
+    dates = pd.to_datetime(pd.Series(dates)).reset_index(drop=True)
+    angle = 2 * np.pi * dates.dt.dayofyear.to_numpy(dtype=float) / 365.25
+    out = pd.DataFrame({f"dow_{d}": (dates.dt.dayofweek == d).astype(float) for d in range(7)})
+    out["doy_sin"] = np.sin(angle)
+    out["doy_cos"] = np.cos(angle)
+    return out
+
+
+def build_features(feature_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-day model features from build_feature_frame output.
+
+    Every feature on a row uses data up to and including that day: admissions
+    lags and rolling mean/std, AQI lags and rolling mean, weather, calendar
+    encodings and days to the next / since the last event. Rows are in date
+    order; early rows have NaN where the history is too short.
+    """
+    df = feature_df.sort_values('date').reset_index(drop=True)
+    y = pd.to_numeric(df['admissions_count'], errors="coerce")
+    regs = regressors.history(df)
+
+    out = pd.DataFrame({"date": pd.to_datetime(df['date']), "admissions_count": y})
+    for column in ['respiratory_cases', 'trauma_cases']:
+        if column in df.columns:
+            out[column] = pd.to_numeric(df[column], errors="coerce")
+
+    out["lag_0"] = y
+    for lag in LAGS:
+        out[f"lag_{lag}"] = y.shift(lag)
+    for window in ROLLING_WINDOWS:
+        rolling = y.rolling(window, min_periods=max(2, window // 2))
+        out[f"roll_mean_{window}"] = rolling.mean()
+        out[f"roll_std_{window}"] = rolling.std()
+
+    aqi = regs['aqi']
+    out["aqi"] = aqi
+    for lag in AQI_LAGS:
+        out[f"aqi_lag_{lag}"] = aqi.shift(lag)
+    out["aqi_roll_mean_7"] = aqi.rolling(7, min_periods=1).mean()
+    out["temperature"] = regs['temperature']
+    out["humidity"] = regs['humidity']
+
+    holiday = regs['holiday'].to_numpy(dtype=float)
+    out["holiday"] = holiday
+    out["days_to_event"] = _days_to_event(holiday, forward=True)
+    out["days_since_event"] = _days_to_event(holiday, forward=False)
+
+    return pd.concat([out, calendar_features(out['date'])], axis=1)
+
+
+def get_features(feature_df: pd.DataFrame) -> pd.DataFrame:
+    """build_features, cached per data version"""
+    from app.services import model_registry
+
+    key = model_registry.data_fingerprint(feature_df)
+    with _lock:
+        features = _cache.get(key)
+        if features is not None:
+            _cache.move_to_end(key)
+            return features
+
+    features = build_features(feature_df)
+    with _lock:
+        _cache[key] = features
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return features
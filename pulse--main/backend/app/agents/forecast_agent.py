@@ -1,28 +1,794 @@
+import os
 import pandas as pd
 import numpy as np
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from typing import List, Dict, Any
+from app.services import model_registry, forecast_pool
+from app.agents import multi_series, regressors, gbm_engine, conformal
 
-def run_forecast(feature_df: pd.DataFrame, horizon_days: int, scenario: str = "baseline", aqi_override: int = None, is_festival: bool = False):
+# "multi_series" (respiratory/trauma/other fitted jointly), "gbm" (gradient-boosted, direct multi-horizon),
+# "ensemble" (backtest-weighted combination of several engines) or "prophet" (total only)
+FORECAST_ENGINE = os.getenv("FORECAST_ENGINE", "multi_series")
+
+# Every forecast is fitted once at this horizon; shorter horizons are slices
+MAX_HORIZON_DAYS = 30
+
+# Fitted baselines per (training data, horizon), most recently used last
+_BASELINE_CACHE_SIZE = 8
+_baseline_cache = OrderedDict()
+_baseline_lock = threading.Lock()
+# Fits running in the forecast pool, so concurrent requests wait on the same job
+_pending_fits = {}
+
+_multi_series_fit = None
+_multi_series_lock = threading.Lock()
+
+_gbm_fit = None
+
+# Prophet and gbm fits keep forecasting as days are appended to their training
+# data, for up to this many days, unless the accuracy job asks for a retrain
+REUSE_MAX_APPEND_DAYS = int(os.getenv("FORECAST_REUSE_MAX_APPEND_DAYS", "14"))
+# Engines ("prophet", "gbm") to refit on their next use
+_retrain_requested = set()
+
+PROPHET_CONFIG = {"daily_seasonality": True, "interval_width": 0.8}
+# Registry key: constructor arguments plus the extra regressors
+PROPHET_MODEL_CONFIG = {**PROPHET_CONFIG, "regressors": regressors.REGRESSORS}
+
+
+def _new_prophet():
+    from prophet import Prophet
+
+    m = Prophet(**PROPHET_CONFIG)
+    for name in regressors.REGRESSORS:
+        m.add_regressor(name)
+    return m
+
+
+def prophet_frame(feature_df: pd.DataFrame) -> pd.DataFrame:
+    """Prophet training frame: ds, y and the regressor columns"""
+    regs = regressors.history(feature_df)
+    df_train = regs.rename(columns={'date': 'ds'})
+    df_train.insert(1, 'y', pd.to_numeric(feature_df['admissions_count'], errors="coerce").to_numpy())
+    return df_train.dropna(subset=['y']).reset_index(drop=True)
+
+
+def _fit_prophet(df_train: pd.DataFrame, fingerprint: str, retrain: bool = False):
+    """
+    Prophet model for df_train: loaded from the model registry if this data
+    (or the data minus at most REUSE_MAX_APPEND_DAYS appended days) was
+    fitted before, otherwise fitted (warm-started from the previous fit after
+    a small append) and stored. retrain skips the stored fits and always
+    fits. Without a fingerprint (backtest folds) the registry is bypassed.
+    """
+    if fingerprint is None:
+        m = _new_prophet()
+        m.fit(df_train)
+        return m
+
+    if not retrain:
+        m = model_registry.load(PROPHET_MODEL_CONFIG, fingerprint)
+        if m is None:
+            m = model_registry.reusable_model(PROPHET_MODEL_CONFIG, df_train, REUSE_MAX_APPEND_DAYS)
+        if m is not None:
+            return m
+
+    init = model_registry.warm_start_params(PROPHET_MODEL_CONFIG, df_train)
+    m = _new_prophet()
+    if init is not None:
+        try:
+            m.fit(df_train, init=init)
+        except Exception:
+            # Parameter shapes changed (e.g. yearly seasonality kicked in); fit cold
+            m = _new_prophet()
+            m.fit(df_train)
+    else:
+        m.fit(df_train)
+
+    try:
+        model_registry.save(PROPHET_MODEL_CONFIG, fingerprint, m, df_train)
+    except Exception as e:
+        print(f"Could not store Prophet model: {e}")
+    return m
+
+
+def _fit_baseline(df_train: pd.DataFrame, horizon_days: int, fingerprint: str, future_regressors: pd.DataFrame, retrain: bool = False) -> dict:
+    """
+    Fit the baseline model once and predict horizon_days ahead.
+
+    future_regressors holds the projected regressor values for those days;
+    retrain is passed on to _fit_prophet. Returns numpy arrays (baseline, ci_low, ci_high), which model was used and,
+    for Prophet, the learned regressor coefficients (admissions per unit).
+    """
+    # Try using Prophet with full error handling
+    if len(df_train) >= 30:
+        try:
+            from prophet.utilities import regressor_coefficients
+
+            m = _fit_prophet(df_train, fingerprint, retrain)
+            future = future_regressors.head(horizon_days).rename(columns={'date': 'ds'})
+            forecast = m.predict(future[['ds'] + regressors.REGRESSORS])
+            coefficients = regressor_coefficients(m)
+            return {
+                "baseline": forecast['yhat'].to_numpy(dtype=float),
+                "ci_low": forecast['yhat_lower'].to_numpy(dtype=float),
+                "ci_high": forecast['yhat_upper'].to_numpy(dtype=float),
+                "use_prophet": True,
+                "regressor_coefficients": dict(zip(coefficients['regressor'], coefficients['coef'].astype(float)))
+            }
+        except (ImportError, AttributeError, Exception) as e:
+            # Fallback to simple average if Prophet fails
+            # logger.warning(f"Prophet failed to initialize: {type(e).__name__}: {str(e)}. Using fallback rolling average method.")
+            pass
+
+    return _fit_statistical(df_train, horizon_days)
+
+
+def _fit_statistical(df_train: pd.DataFrame, horizon_days: int) -> dict:
+    """Lightweight linear trend over the last 90 days; fast enough to run in the request thread"""
+    if len(df_train) > 0:
+        recent_window = min(90, len(df_train))
+        recent = df_train.tail(recent_window)
+        x = np.arange(len(recent), dtype=float)
+        y = recent['y'].values.astype(float)
+
+        if len(recent) >= 2:
+            slope, intercept = np.polyfit(x, y, 1)
+        else:
+            slope, intercept = 0.0, float(y[-1])
+
+        fitted = intercept + slope * x
+        residuals = y - fitted
+        residual_std = np.std(residuals) if len(residuals) > 1 else np.std(y)
+        if np.isnan(residual_std) or residual_std == 0:
+            residual_std = max(5.0, np.std(y) if np.std(y) > 0 else 5.0)
+
+        future_x = len(recent) + np.arange(horizon_days)
+        baseline = np.maximum(0, intercept + slope * future_x)
+        return {
+            "baseline": baseline,
+            "ci_low": np.maximum(0, baseline - 1.5 * residual_std),
+            "ci_high": baseline + 1.5 * residual_std,
+            "use_prophet": False
+        }
+
+    return {
+        "baseline": np.full(horizon_days, 50.0),
+        "ci_low": np.full(horizon_days, 40.0),
+        "ci_high": np.full(horizon_days, 60.0),
+        "use_prophet": False
+    }
+
+
+def _cached_baseline(fingerprint: str, horizon_days: int):
+    for (cached_fp, cached_horizon), fitted in reversed(_baseline_cache.items()):
+        if cached_fp == fingerprint and cached_horizon >= horizon_days:
+            _baseline_cache.move_to_end((cached_fp, cached_horizon))
+            return fitted
+    return None
+
+
+def get_baseline(df_train: pd.DataFrame, horizon_days: int, future_regressors: pd.DataFrame) -> dict:
+    """
+    Baseline predictions for the next horizon_days, fitted at most once per
+    training data version at MAX_HORIZON_DAYS (or longer if asked for)
+    and sliced for shorter horizons.
+
+    Fits run in the forecast process pool with a timeout. A timed out fit,
+    or an open circuit breaker after repeated slow fits, is answered by the
+    statistical model and not cached, so the next request tries again.
+    A stored Prophet fit on slightly older data is reused unless a retrain
+    was requested (see request_retrain).
+
+    future_regressors must cover at least MAX_HORIZON_DAYS (and horizon_days).
+    """
+    fit_horizon = max(horizon_days, MAX_HORIZON_DAYS)
+    fingerprint = model_registry.data_fingerprint(df_train)
+    # Predictions also depend on the regressor projection, which changes daily
+    prediction_fp = fingerprint + model_registry.data_fingerprint(future_regressors.head(fit_horizon))
+    key = (prediction_fp, fit_horizon)
+
+    with _baseline_lock:
+        fitted = _cached_baseline(prediction_fp, horizon_days)
+        job = None
+        if fitted is None:
+            job = _pending_fits.get(key)
+            if job is None and forecast_pool.allow_slow_engine():
+                job = forecast_pool.submit(_fit_baseline, df_train, fit_horizon, fingerprint, future_regressors, "prophet" in _retrain_requested)
+                _pending_fits[key] = job
+
+    if fitted is None and job is not None:
+        fitted = job.result()
+        with _baseline_lock:
+            if _pending_fits.get(key) is job:
+                del _pending_fits[key]
+                if fitted is not None:
+                    if fitted["use_prophet"]:
+                        # Jobs still pending were submitted after the last retrain request
+                        _retrain_requested.discard("prophet")
+                    _baseline_cache[key] = fitted
+                    while len(_baseline_cache) > _BASELINE_CACHE_SIZE:
+                        _baseline_cache.popitem(last=False)
+
+    if fitted is None:
+        fitted = _fit_statistical(df_train, fit_horizon)
+
+    return {name: value[:horizon_days] if isinstance(value, np.ndarray) else value for name, value in fitted.items()}
+
+
+def prewarm():
+    """Load or fit the baseline for the current data so the first request is fast"""
+    from app.agents import data_agent
+
+    try:
+        feature_df = data_agent.build_feature_frame()
+        get_baseline(prophet_frame(feature_df), MAX_HORIZON_DAYS, regressors.get_projection(feature_df, MAX_HORIZON_DAYS))
+        if FORECAST_ENGINE in ("prophet", "ensemble"):
+            # Prophet backtest residuals for its conformal band
+            conformal_bands("prophet", feature_df, np.zeros(1), conformal.DEFAULT_COVERAGE)
+        if FORECAST_ENGINE == "gbm":
+            get_gbm(feature_df)
+        elif FORECAST_ENGINE == "ensemble":
+            from app.agents import ensemble
+            ensemble.get_backtest(feature_df)
+        print("Forecast model prewarmed")
+    except Exception as e:
+        print(f"Forecast prewarm failed: {e}")
+
+
+def forecast_many(jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Run several forecasts at once (scenarios, departments).
+
+    Each job is a dict of run_forecast keyword arguments. Distinct training
+    series are fitted in parallel in the forecast pool; jobs sharing a series
+    share one fit. Results are returned in job order.
+    """
+    if len(jobs) <= 1:
+        return [run_forecast(**job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=min(len(jobs), forecast_pool.FORECAST_WORKERS * 2)) as executor:
+        return list(executor.map(lambda job: run_forecast(**job), jobs))
+
+
+def get_multi_series(feature_df: pd.DataFrame) -> dict:
+    """Joint component model for feature_df, refitted only when the data changes"""
+    global _multi_series_fit
+    columns = [c for c in ['date', 'admissions_count', 'respiratory_cases', 'trauma_cases', 'aqi', 'temperature', 'humidity', 'is_holiday', 'event_name'] if c in feature_df.columns]
+    fingerprint = model_registry.data_fingerprint(feature_df[columns])
+    with _multi_series_lock:
+        if _multi_series_fit is None or _multi_series_fit[0] != fingerprint:
+            _multi_series_fit = (fingerprint, multi_series.fit(feature_df))
+        return _multi_series_fit[1]
+
+
+def _gbm_reusable(feature_df: pd.DataFrame) -> bool:
+    """Whether the current gbm fit was trained on feature_df minus at most REUSE_MAX_APPEND_DAYS days"""
+    if _gbm_fit is None or "gbm" in _retrain_requested:
+        return False
+    fingerprint, _, rows = _gbm_fit
+    appended = len(feature_df) - rows
+    return 0 < appended <= REUSE_MAX_APPEND_DAYS and model_registry.data_fingerprint(feature_df.iloc[:rows]) == fingerprint
+
+
+def get_gbm(feature_df: pd.DataFrame):
+    """
+    Gradient-boosted model for feature_df, trained in the forecast pool. The
+    fit keeps serving as days are appended (predicting from the newest day)
+    until REUSE_MAX_APPEND_DAYS or a requested retrain. None if training
+    failed, timed out or the breaker is open.
+    """
+    global _gbm_fit
+    fingerprint = model_registry.data_fingerprint(feature_df)
+    key = ("gbm", fingerprint)
+    with _baseline_lock:
+        if _gbm_fit is not None and _gbm_fit[0] == fingerprint and "gbm" not in _retrain_requested:
+            return _gbm_fit[1]
+        if _gbm_reusable(feature_df):
+            return _gbm_fit[1]
+        job = _pending_fits.get(key)
+        if job is None:
+            if not forecast_pool.allow_slow_engine():
+                return None
+            job = forecast_pool.submit(gbm_engine.train, feature_df, MAX_HORIZON_DAYS)
+            _pending_fits[key] = job
+
+    model = job.result()
+    with _baseline_lock:
+        if _pending_fits.get(key) is job:
+            del _pending_fits[key]
+            if model is not None:
+                _gbm_fit = (fingerprint, model, len(feature_df))
+                _retrain_requested.discard("gbm")
+    return model
+
+
+def request_retrain(engine: str):
+    """
+    Refit a reused engine ("prophet" or "gbm") on its next use, dropping
+    cached predictions made with the old fit
+    """
+    with _baseline_lock:
+        _retrain_requested.add(engine)
+        if engine == "prophet":
+            _baseline_cache.clear()
+            # Fits already running may reuse the old model; their results are not kept
+            for key in [k for k in _pending_fits if k[0] != "gbm"]:
+                del _pending_fits[key]
+
+
+def retrain(engine: str, feature_df: pd.DataFrame):
+    """Refit one reused engine ("prophet" or "gbm") on feature_df now"""
+    request_retrain(engine)
+    if engine == "prophet":
+        get_baseline(prophet_frame(feature_df), MAX_HORIZON_DAYS, regressors.get_projection(feature_df, MAX_HORIZON_DAYS))
+    elif engine == "gbm":
+        get_gbm(feature_df)
+
+
+def _impact_label(aqi: int) -> str:
+    return 'High' if aqi > 200 else 'Moderate' if aqi > 100 else 'Low'
+
+
+def _scenario_inputs(projection: pd.DataFrame, horizon_days: int, scenario: str, aqi_override: int, is_festival: bool):
+    """Per-day AQI and festival flags for a scenario, starting from the projected regressors"""
+    aqi = np.full(horizon_days, float(aqi_override)) if aqi_override is not None else projection['aqi'].to_numpy(dtype=float)[:horizon_days]
+    if scenario in ("high_aqi", "combined") and aqi_override is None:
+        # Legacy scenarios: a severe pollution episode
+        aqi = np.maximum(aqi, 300.0)
+    festival = is_festival or scenario in ("festival", "combined")
+    festival_days = np.maximum(projection['holiday'].to_numpy(dtype=float)[:horizon_days], float(festival))
+    return aqi, festival, festival_days
+
+
+def _rounded_metrics(metrics: dict) -> dict:
+    return {name: round(metrics[name], 2) for name in ["mae", "mape", "rmse", "r2"]}
+
+
+def _normalized_importance(parts: List[tuple]) -> List[Dict[str, Any]]:
+    total_imp = sum(max(0.0, value) for _, value in parts)
+    return [
+        {"feature": name, "importance": round(max(0.0, value) / total_imp, 2) if total_imp > 0 else 0.0}
+        for name, value in parts
+    ]
+
+
+def _conformal_residuals(engine: str, feature_df: pd.DataFrame, compute: bool = True):
+    """Out-of-sample residuals of an engine from its backtest (or holdout, for gbm)"""
+    from app.agents import ensemble
+
+    if engine == "ensemble":
+        # Requests don't wait for the backtest; it runs in the background
+        backtest = ensemble.get_backtest(feature_df) if compute else ensemble.ready_backtest(feature_df)
+        return None if backtest is None else backtest["residuals"]["ensemble"]
+    if engine == "gbm":
+        model = get_gbm(feature_df)
+        return None if model is None else model.get("holdout_residuals")
+    # Prophet backtests refit every fold; they are made at prewarm or by the ensemble
+    residuals = ensemble.member_residuals(feature_df, engine, compute or engine != "prophet")
+    return None if residuals is None or np.isnan(residuals).all() else residuals
+
+
+# Backtest residuals behind each summary "model_source"
+_REFERENCE_ENGINES = {"multi_series": "fourier", "statistical_fallback": "linear_trend", "prophet": "prophet", "gbm": "gbm", "ensemble": "ensemble"}
+
+
+def reference_errors(model_source: str, feature_df: pd.DataFrame):
+    """
+    Mean absolute backtest (or holdout) error per horizon step of the engine
+    that produced model_source, for comparing live errors against. None if
+    those residuals are not at hand; nothing slow is fitted for this.
+    """
+    engine = _REFERENCE_ENGINES.get(model_source)
+    if engine is None:
+        return None
+    if engine == "gbm":
+        residuals = None if _gbm_fit is None else _gbm_fit[1].get("holdout_residuals")
+    elif engine == "ensemble":
+        from app.agents import ensemble
+
+        if not all(ensemble.member_residuals(feature_df, name, compute=False) is not None for name in ensemble.MEMBERS):
+            return None
+        residuals = ensemble.get_backtest(feature_df)["residuals"]["ensemble"]
+    else:
+        residuals = _conformal_residuals(engine, feature_df, compute=False)
+    if residuals is None or np.isnan(residuals).all():
+        return None
+    errors = np.nanmean(np.abs(residuals), axis=0)
+    # Steps without residuals take the nearest earlier step's error
+    return pd.Series(errors).ffill().bfill().to_numpy()
+
+
+def conformal_bands(engine: str, feature_df: pd.DataFrame, point: np.ndarray, coverage: float, compute: bool = True):
+    """
+    Split-conformal (low, high, coverage achieved) around point from the
+    engine's stored residuals, recording them first if needed. None when the
+    engine has no residuals.
+    """
+    version = model_registry.data_fingerprint(feature_df)
+    if not conformal.has(engine, version):
+        residuals = _conformal_residuals(engine, feature_df, compute)
+        if residuals is None:
+            return None
+        conformal.record(engine, version, residuals)
+    return conformal.bands(engine, version, point, coverage)
+
+
+def _band_label(coverage: float, achieved: float) -> str:
+    if achieved < coverage - 1e-9:
+        # Too few backtest residuals for the requested quantile; the widest band they allow
+        return f"Confidence Interval: {achieved * 100:.0f}% split-conformal band from backtest residuals ({coverage * 100:.0f}% requested; too few residuals)"
+    return f"Confidence Interval: {coverage * 100:.0f}% split-conformal band from backtest residuals"
+
+
+def _run_multi_series(feature_df: pd.DataFrame, horizon_days: int, scenario: str, aqi_override: int, is_festival: bool, coverage: float):
+    """
+    Forecast respiratory, trauma and other admissions jointly and sum them.
+
+    Future AQI, weather and holidays come from the cached regressor
+    projection; aqi_override and the festival flag replace them. Scenario
+    effects come from the fitted AQI (respiratory) and festival (trauma)
+    coefficients instead of fixed multipliers. The baseline is the same model
+    with AQI at or below the threshold and no festival.
+    """
+    model = get_multi_series(feature_df)
+    projection = regressors.get_projection(feature_df, horizon_days)
+
+    aqi, festival, festival_days = _scenario_inputs(projection, horizon_days, scenario, aqi_override, is_festival)
+    scenario_aqi = int(round(aqi.mean()))
+    weather = {"temperature": projection['temperature'].to_numpy(dtype=float), "humidity": projection['humidity'].to_numpy(dtype=float)}
+
+    predicted = multi_series.predict(model, horizon_days, aqi=aqi, festival=festival_days, **weather)
+    baseline = multi_series.predict(model, horizon_days, aqi=np.minimum(aqi, multi_series.AQI_THRESHOLD), festival=0.0, **weather)
+
+    final_arr = predicted["total"]
+    baseline_arr = baseline["total"]
+    respiratory_delta = predicted["respiratory_cases"] - baseline["respiratory_cases"]
+    trauma_delta = predicted["trauma_cases"] - baseline["trauma_cases"]
+    band = conformal_bands("fourier", feature_df, final_arr, coverage)
+    ci_low, ci_high = band[:2] if band is not None else (predicted["ci_low"], predicted["ci_high"])
+
+    future_dates = [model["last_date"] + timedelta(days=i + 1) for i in range(horizon_days)]
+    predictions = [
+        {
+            "date": date.strftime("%Y-%m-%d"),
+            "predicted": round(float(final_arr[i]), 1),
+            "baseline": round(float(baseline_arr[i]), 1),
+            "confidence_low": round(float(ci_low[i]), 1),
+            "confidence_high": round(float(ci_high[i]), 1),
+            "components": {
+                "respiratory": round(float(predicted["respiratory_cases"][i]), 1),
+                "trauma": round(float(predicted["trauma_cases"][i]), 1),
+                "other": round(float(predicted["other_cases"][i]), 1)
+            }
+        }
+        for i, date in enumerate(future_dates)
+    ]
+
+    avg_pred = float(final_arr.mean())
+    avg_baseline = float(baseline_arr.mean())
+    peak_idx = int(final_arr.argmax())
+
+    explanation_parts = []
+    if respiratory_delta.mean() >= 0.05:
+        explanation_parts.append(f"AQI {scenario_aqi} adds about {respiratory_delta.mean():.1f} respiratory admissions per day ({respiratory_delta.sum() / max(avg_baseline * horizon_days, 1e-9) * 100:.1f}% of baseline).")
+    elif scenario_aqi > multi_series.AQI_THRESHOLD:
+        explanation_parts.append(f"AQI {scenario_aqi} is elevated, but the historical data shows no measurable effect on respiratory admissions.")
+    if festival:
+        if trauma_delta.mean() >= 0.05:
+            explanation_parts.append(f"Festival days add about {trauma_delta.mean():.1f} trauma/emergency admissions per day.")
+        else:
+            explanation_parts.append("Festival periods show no measurable trauma surge in the historical data.")
+    elif trauma_delta.sum() >= 0.05:
+        explanation_parts.append(f"Holidays in the forecast window add about {trauma_delta.sum():.1f} trauma/emergency admissions in total.")
+    if not explanation_parts:
+        explanation_parts.append("Forecast follows standard seasonal baseline patterns.")
+
+    methodology = [
+        "Base Model: Multi-series regression (respiratory, trauma, other) fitted jointly",
+        "Seasonality: Weekly and yearly patterns, linear trend",
+        f"External Regressors: AQI on respiratory cases (Impact: {_impact_label(scenario_aqi)}), festivals on trauma cases, temperature and humidity (projected)",
+        _band_label(coverage, band[2]) if band is not None else "Confidence Interval: 80% band from residuals of the summed forecast"
+    ]
+
+    metrics = _rounded_metrics(model["metrics"])
+
+    # Size of each part of the forecast
+    trend_per_day = abs(float(model["coef"][model["columns"].index("trend")].sum())) / 365.25
+    feature_importance = _normalized_importance([
+        ("Seasonality (Weekly)", float(np.abs(baseline_arr - baseline_arr.mean()).sum())),
+        ("AQI Impact", float(respiratory_delta.sum())),
+        ("Trend", trend_per_day * float(np.arange(1, horizon_days + 1).sum())),
+        ("Festival/Events", float(trauma_delta.sum()))
+    ])
+
+    return {
+        "predictions": predictions,
+        "summary": {
+            "avg_predicted_admissions": round(avg_pred, 1),
+            "avg_baseline_admissions": round(avg_baseline, 1),
+            "peak_day": future_dates[peak_idx].strftime("%Y-%m-%d"),
+            "peak_value": round(float(final_arr[peak_idx]), 1),
+            "explanation": " ".join(explanation_parts),
+            "methodology": methodology,
+            "model_source": "multi_series",
+            "components": {
+                "respiratory": round(float(predicted["respiratory_cases"].mean()), 1),
+                "trauma": round(float(predicted["trauma_cases"].mean()), 1),
+                "other": round(float(predicted["other_cases"].mean()), 1)
+            }
+        },
+        "metrics": metrics,
+        "feature_importance": feature_importance
+    }
+
+
+def _run_gbm(feature_df: pd.DataFrame, horizon_days: int, scenario: str, aqi_override: int, is_festival: bool, coverage: float):
+    """
+    Forecast with the gradient-boosted direct multi-horizon model.
+
+    Scenarios change the target-day AQI and holiday features; the baseline has
+    AQI at or below the threshold and no holidays. Falls back to the
+    multi-series engine (or Prophet) while the model is unavailable.
+    """
+    model = get_gbm(feature_df)
+    if model is None:
+        fallback = "multi_series" if multi_series.has_components(feature_df) else "prophet"
+        return run_forecast(feature_df, horizon_days, scenario, aqi_override, is_festival, engine=fallback, coverage=coverage)
+
+    projection = regressors.get_projection(feature_df, horizon_days)
+    aqi, festival, festival_days = _scenario_inputs(projection, horizon_days, scenario, aqi_override, is_festival)
+    scenario_aqi = int(round(aqi.mean()))
+
+    predicted = gbm_engine.predict(model, feature_df, projection, aqi=aqi, holiday=festival_days)
+    baseline = gbm_engine.predict(model, feature_df, projection, aqi=np.minimum(aqi, multi_series.AQI_THRESHOLD), holiday=0.0)
+    aqi_only = gbm_engine.predict(model, feature_df, projection, aqi=aqi, holiday=0.0)
+
+    final_arr = predicted["predicted"]
+    baseline_arr = baseline["predicted"]
+    aqi_delta = aqi_only["predicted"] - baseline_arr
+    festival_delta = final_arr - aqi_only["predicted"]
+    band = conformal_bands("gbm", feature_df, final_arr, coverage)
+    ci_low, ci_high = band[:2] if band is not None else (predicted["ci_low"], predicted["ci_high"])
+
+    # A reused fit ends before the data; the forecast starts after the newest day
+    future_dates = [pd.Timestamp(projection['date'].iloc[i]) for i in range(horizon_days)]
+    predictions = [
+        {
+            "date": date.strftime("%Y-%m-%d"),
+            "predicted": round(float(final_arr[i]), 1),
+            "baseline": round(float(baseline_arr[i]), 1),
+            "confidence_low": round(float(ci_low[i]), 1),
+            "confidence_high": round(float(ci_high[i]), 1)
+        }
+        for i, date in enumerate(future_dates)
+    ]
+    peak_idx = int(final_arr.argmax())
+
+    explanation_parts = []
+    if aqi_delta.mean() >= 0.05:
+        explanation_parts.append(f"AQI {scenario_aqi} adds about {aqi_delta.mean():.1f} admissions per day.")
+    if festival_delta.sum() >= 0.05:
+        explanation_parts.append(f"Festivals and holidays add about {festival_delta.sum():.1f} admissions over the forecast window.")
+    if not explanation_parts:
+        explanation_parts.append("Forecast follows recent admission levels and seasonal patterns.")
+
+    methodology = [
+        "Base Model: Gradient-boosted trees, direct multi-horizon",
+        "Features: admission lags (1/7/14 days), rolling mean/std, calendar encodings, AQI lags, event proximity",
+        f"External Regressors: projected AQI (Impact: {_impact_label(scenario_aqi)}), temperature, humidity, holidays",
+        _band_label(coverage, band[2]) if band is not None else "Confidence Interval: 10%-90% quantile models"
+    ]
+
+    # Holdout metrics need enough history; without them report none rather than invent
+    metrics = _rounded_metrics(model["metrics"]) if model["metrics"] else {}
+
+    # Split the baseline into a straight line (trend) and what is left around it (seasonality)
+    steps = np.arange(horizon_days, dtype=float)
+    slope, intercept = np.polyfit(steps, baseline_arr, 1) if horizon_days >= 2 else (0.0, float(baseline_arr.mean()))
+    line = intercept + slope * steps
+    feature_importance = _normalized_importance([
+        ("Seasonality (Weekly)", float(np.abs(baseline_arr - line).sum())),
+        ("AQI Impact", float(aqi_delta.sum())),
+        ("Trend", float(np.abs(line - line.mean()).sum())),
+        ("Festival/Events", float(festival_delta.sum()))
+    ])
+
+    return {
+        "predictions": predictions,
+        "summary": {
+            "avg_predicted_admissions": round(float(final_arr.mean()), 1),
+            "avg_baseline_admissions": round(float(baseline_arr.mean()), 1),
+            "peak_day": future_dates[peak_idx].strftime("%Y-%m-%d"),
+            "peak_value": round(float(final_arr[peak_idx]), 1),
+            "explanation": " ".join(explanation_parts),
+            "methodology": methodology,
+            "model_source": "gbm"
+        },
+        "metrics": metrics,
+        "feature_importance": feature_importance
+    }
+
+
+def _run_ensemble(feature_df: pd.DataFrame, horizon_days: int, scenario: str, aqi_override: int, is_festival: bool, coverage: float):
+    """
+    Forecast with the backtest-weighted ensemble (Prophet, Fourier regression,
+    linear trend, seasonal naive), members running in parallel.
+
+    The combination is made at the projected regressors. Scenario effects are
+    the multi-series AQI and festival effects relative to those projections
+    (fixed multipliers when the component columns are missing).
+    """
+    from app.agents import ensemble
+
+    projection = regressors.get_projection(feature_df, horizon_days)
+    result = ensemble.combine(feature_df, horizon_days, projection)
+    combined = result["forecast"]
+    aqi, festival, festival_days = _scenario_inputs(projection, horizon_days, scenario, aqi_override, is_festival)
+    scenario_aqi = int(round(aqi.mean()))
+
+    if multi_series.has_components(feature_df):
+        model = get_multi_series(feature_df)
+        weather = {"temperature": projection['temperature'].to_numpy(dtype=float), "humidity": projection['humidity'].to_numpy(dtype=float)}
+        at_projection = multi_series.predict(model, horizon_days, aqi=projection['aqi'].to_numpy(dtype=float), festival=projection['holiday'].to_numpy(dtype=float), **weather)
+        at_scenario = multi_series.predict(model, horizon_days, aqi=aqi, festival=festival_days, **weather)
+        at_baseline = multi_series.predict(model, horizon_days, aqi=np.minimum(aqi, multi_series.AQI_THRESHOLD), festival=0.0, **weather)
+        final_arr = np.maximum(0.0, combined + at_scenario["total"] - at_projection["total"])
+        baseline_arr = np.maximum(0.0, combined + at_baseline["total"] - at_projection["total"])
+        aqi_delta = at_scenario["respiratory_cases"] - at_baseline["respiratory_cases"]
+        festival_delta = at_scenario["trauma_cases"] - at_baseline["trauma_cases"]
+    else:
+        baseline_arr = combined
+        final_arr = combined * _scenario_multiplier(scenario_aqi, scenario, aqi_override, festival)
+        aqi_delta = final_arr - baseline_arr
+        festival_delta = np.zeros(horizon_days)
+
+    # Band from the ensemble's own backtest errors, once the backtest has finished
+    backtest = result["backtest"]
+    band = conformal_bands("ensemble", feature_df, final_arr, coverage, compute=False)
+    if band is not None:
+        ci_low, ci_high = band[:2]
+    else:
+        # No backtest residuals yet: the linear trend's residual band around the combination
+        fallback = _fit_statistical(prophet_frame(feature_df), horizon_days)
+        half_width = fallback["ci_high"] - fallback["baseline"]
+        ci_low, ci_high = np.maximum(0.0, final_arr - half_width), final_arr + half_width
+
+    future_dates = [pd.Timestamp(projection['date'].iloc[i]) for i in range(horizon_days)]
+    predictions = [
+        {
+            "date": date.strftime("%Y-%m-%d"),
+            "predicted": round(float(final_arr[i]), 1),
+            "baseline": round(float(baseline_arr[i]), 1),
+            "confidence_low": round(float(ci_low[i]), 1),
+            "confidence_high": round(float(ci_high[i]), 1)
+        }
+        for i, date in enumerate(future_dates)
+    ]
+    peak_idx = int(final_arr.argmax())
+
+    used = [m for m in result["members"] if m["status"] == "ok"]
+    weighting = {
+        "backtest": "weighted by backtest accuracy",
+        "prior": "weighted by the previous backtest while the current one runs",
+        "equal": "equally weighted while the backtest runs"
+    }[result["weighting"]]
+    explanation_parts = [
+        "Ensemble of " + ", ".join(f"{m['engine']} ({m['weight'] * 100:.0f}%)" for m in used) + f", {weighting}."
+    ]
+    skipped = [m["engine"] for m in result["members"] if m["status"] in ("timeout", "failed")]
+    if skipped:
+        explanation_parts.append(f"Left out after timing out or failing: {', '.join(skipped)}.")
+    if aqi_delta.mean() >= 0.05:
+        explanation_parts.append(f"AQI {scenario_aqi} adds about {aqi_delta.mean():.1f} admissions per day.")
+    if festival_delta.sum() >= 0.05:
+        explanation_parts.append(f"Festivals and holidays add about {festival_delta.sum():.1f} admissions over the forecast window.")
+
+    methodology = [
+        f"Base Model: Ensemble of {len(used)} engines, inverse backtest-MAE weights" if backtest is not None else
+        f"Base Model: Ensemble of {len(used)} engines, {weighting}",
+        f"Backtest: {backtest['folds']} rolling origins, {ensemble.BACKTEST_HORIZON}-day horizon" if backtest is not None else
+        "Backtest: running in the background",
+        f"External Regressors: projected AQI (Impact: {_impact_label(scenario_aqi)}), temperature, humidity, holidays",
+        _band_label(coverage, band[2]) if band is not None else "Confidence Interval: ±1.5 residual std band of the linear trend (no backtest residuals)"
+    ]
+
+    ensemble_residuals = backtest["residuals"]["ensemble"] if backtest is not None else np.empty(0)
+    errors = ensemble_residuals[~np.isnan(ensemble_residuals)]
+    actuals = backtest["actuals"][~np.isnan(ensemble_residuals)] if backtest is not None else np.empty(0)
+    metrics = _rounded_metrics({
+        "mae": float(np.mean(np.abs(errors))),
+        "mape": float(np.mean(np.abs(errors) / np.maximum(actuals, 1.0)) * 100),
+        "rmse": float(np.sqrt(np.mean(errors ** 2))),
+        "r2": float(1 - np.sum(errors ** 2) / max(np.sum((actuals - actuals.mean()) ** 2), 1e-9))
+    }) if len(errors) else {}
+
+    steps = np.arange(horizon_days, dtype=float)
+    slope, intercept = np.polyfit(steps, baseline_arr, 1) if horizon_days >= 2 else (0.0, float(baseline_arr.mean()))
+    line = intercept + slope * steps
+    feature_importance = _normalized_importance([
+        ("Seasonality (Weekly)", float(np.abs(baseline_arr - line).sum())),
+        ("AQI Impact", float(aqi_delta.sum())),
+        ("Trend", float(np.abs(line - line.mean()).sum())),
+        ("Festival/Events", float(festival_delta.sum()))
+    ])
+
+    return {
+        "predictions": predictions,
+        "summary": {
+            "avg_predicted_admissions": round(float(final_arr.mean()), 1),
+            "avg_baseline_admissions": round(float(baseline_arr.mean()), 1),
+            "peak_day": future_dates[peak_idx].strftime("%Y-%m-%d"),
+            "peak_value": round(float(final_arr[peak_idx]), 1),
+            "explanation": " ".join(explanation_parts),
+            "methodology": methodology,
+            "model_source": "ensemble",
+            "ensemble": result["members"]
+        },
+        "metrics": metrics,
+        "feature_importance": feature_importance
+    }
+
+
+def _scenario_multiplier(current_aqi: int, scenario: str, aqi_override: int, festival: bool) -> float:
+    """Fixed scenario multipliers, used when the baseline model has no learned regressor effects"""
+    multiplier = 1.0
+    
+    # Dynamic AQI-based adjustment
+    if current_aqi > 200:
+        # High AQI increases respiratory admissions
+        aqi_multiplier = 1.0 + ((current_aqi - 200) / 500)  # Scales up to 1.4x at AQI 400
+        multiplier *= min(aqi_multiplier, 1.5)
+    elif current_aqi > 150:
+        multiplier *= 1.1
+    
+    # Festival surge
+    if festival:
+        multiplier *= 1.15
+        
+    # Legacy scenario handling
+    if scenario == "high_aqi" and aqi_override is None:
+        multiplier *= 1.2
+    elif scenario == "combined" and aqi_override is None:
+        multiplier *= 1.35
+    return multiplier
+
+
+def run_forecast(feature_df: pd.DataFrame, horizon_days: int, scenario: str = "baseline", aqi_override: int = None, is_festival: bool = False, engine: str = None, coverage: float = None):
     """
     Runs a forecast for admissions.
     
+    The baseline model is fitted once per data version at MAX_HORIZON_DAYS;
+    any shorter horizon is served by slicing the cached predictions.
+    
     Args:
         feature_df: Historical data
         horizon_days: Number of days to forecast
         scenario: "baseline", "high_aqi", "festival", or "combined"
         aqi_override: If provided, use this AQI value for predictions
         is_festival: If True, apply festival surge logic
+        engine: "multi_series", "gbm", "ensemble" or "prophet" (default FORECAST_ENGINE); multi_series
+            needs respiratory_cases and trauma_cases and falls back to prophet without them
+        coverage: Target coverage of the confidence band (default 0.8, clamped to 0.5-0.99)
         
     Returns a dict with:
     - predictions: list of dicts (date, predicted_admissions, baseline_admissions, confidence_low, confidence_high)
     - summary: dict (avg, peak, peak_date)
     """
+    engine = engine or FORECAST_ENGINE
+    coverage = conformal.validate_coverage(coverage)
+    if engine == "gbm":
+        return _run_gbm(feature_df, horizon_days, scenario, aqi_override, is_festival, coverage)
+    if engine == "ensemble":
+        return _run_ensemble(feature_df, horizon_days, scenario, aqi_override, is_festival, coverage)
+    if engine == "multi_series" and multi_series.has_components(feature_df):
+        return _run_multi_series(feature_df, horizon_days, scenario, aqi_override, is_festival, coverage)
     
-    # Prepare data for Prophet (ds, y)
-    df_train = feature_df[['date', 'admissions_count']].rename(columns={'date': 'ds', 'admissions_count': 'y'})
-    
-    # Clean data - remove NaN values
-    df_train = df_train.dropna()
+    # Prepare data for Prophet (ds, y, regressors) and the projected future regressors
+    df_train = prophet_frame(feature_df)
+    projection = regressors.get_projection(feature_df, max(horizon_days, MAX_HORIZON_DAYS))
     
     # Generate future dates with error handling
     try:
@@ -32,68 +798,12 @@ def run_forecast(feature_df: pd.DataFrame, horizon_days: int, scenario: str = "b
     except (KeyError, AttributeError, Exception):
         max_date = pd.Timestamp.now()
     
-    # Explicitly initialize future_dates
-    future_dates = []
-    for i in range(horizon_days):
-        future_dates.append(max_date + timedelta(days=i+1))
-    
-    baseline_preds = []
-    confidence_intervals = []
-    use_prophet = False
-
-    # Try using Prophet with full error handling
-    if len(df_train) >= 30:
-        try:
-            from prophet import Prophet
-            m = Prophet(daily_seasonality=True, interval_width=0.8)
-            m.fit(df_train)
-            future = m.make_future_dataframe(periods=horizon_days)
-            forecast = m.predict(future)
-            # Extract last horizon_days
-            forecast_tail = forecast.tail(horizon_days)
-            baseline_preds = forecast_tail['yhat'].values.tolist()
-            confidence_intervals = list(zip(
-                forecast_tail['yhat_lower'].values.tolist(),
-                forecast_tail['yhat_upper'].values.tolist()
-            ))
-            use_prophet = True
-        except (ImportError, AttributeError, Exception) as e:
-            # Fallback to simple average if Prophet fails
-            # logger.warning(f"Prophet failed to initialize: {type(e).__name__}: {str(e)}. Using fallback rolling average method.")
-            use_prophet = False
+    future_dates = [max_date + timedelta(days=i+1) for i in range(horizon_days)]
     
-    # Fallback: Lightweight statistical trend model
-    if not use_prophet:
-        if len(df_train) > 0:
-            recent_window = min(90, len(df_train))
-            recent = df_train.tail(recent_window)
-            x = np.arange(len(recent), dtype=float)
-            y = recent['y'].values.astype(float)
-
-            if len(recent) >= 2:
-                slope, intercept = np.polyfit(x, y, 1)
-            else:
-                slope, intercept = 0.0, float(y[-1])
-
-            fitted = intercept + slope * x
-            residuals = y - fitted
-            residual_std = np.std(residuals) if len(residuals) > 1 else np.std(y)
-            if np.isnan(residual_std) or residual_std == 0:
-                residual_std = max(5.0, np.std(y) if np.std(y) > 0 else 5.0)
-
-            baseline_preds = []
-            confidence_intervals = []
-            for i in range(horizon_days):
-                future_x = len(recent) + i
-                base_val = intercept + slope * future_x
-                base_val = float(max(0, base_val))
-                baseline_preds.append(base_val)
-                ci_low = max(0, base_val - 1.5 * residual_std)
-                ci_high = base_val + 1.5 * residual_std
-                confidence_intervals.append((ci_low, ci_high))
-        else:
-            baseline_preds = [50.0] * horizon_days
-            confidence_intervals = [(40.0, 60.0)] * horizon_days
+    fitted = get_baseline(df_train, horizon_days, projection)
+    use_prophet = fitted["use_prophet"]
+    baseline_arr = np.nan_to_num(fitted["baseline"], nan=50.0)
+    coefficients = fitted.get("regressor_coefficients")
 
     # Get current AQI or use override
     if aqi_override is not None:
@@ -101,52 +811,49 @@ def run_forecast(feature_df: pd.DataFrame, horizon_days: int, scenario: str = "b
     else:
         current_aqi = int(feature_df['aqi'].iloc[-1]) if 'aqi' in feature_df.columns else 100
 
-    # Ensure we have valid baseline predictions
-    if len(baseline_preds) == 0:
-        baseline_preds = [50.0] * horizon_days  # Default fallback
-        confidence_intervals = [(40.0, 60.0)] * horizon_days
-    
-    # Apply Scenario Logic or dynamic AQI adjustment
-    final_preds = []
-    
-    for i, base_val in enumerate(baseline_preds):
-        val = float(base_val) if not pd.isna(base_val) else 50.0
-        
-        # Dynamic AQI-based adjustment
-        if current_aqi > 200:
-            # High AQI increases respiratory admissions
-            aqi_multiplier = 1.0 + ((current_aqi - 200) / 500)  # Scales up to 1.4x at AQI 400
-            val *= min(aqi_multiplier, 1.5)
-        elif current_aqi > 150:
-            val *= 1.1
-        
-        # Festival surge
-        if is_festival or scenario == "festival" or scenario == "combined":
-            val *= 1.15
-            
-        # Legacy scenario handling
-        if scenario == "high_aqi" and aqi_override is None:
-            val *= 1.2
-        elif scenario == "combined" and aqi_override is None:
-            val *= 1.35
-            
-        final_preds.append(max(0, val))
+    festival = is_festival or scenario == "festival" or scenario == "combined"
+
+    if coefficients:
+        # Learned effects: move the projected regressors to the scenario's values
+        projected = projection.head(horizon_days)
+        aqi = np.full(horizon_days, float(aqi_override)) if aqi_override is not None else projected['aqi'].to_numpy(dtype=float)
+        if scenario in ("high_aqi", "combined") and aqi_override is None:
+            aqi = np.maximum(aqi, 300.0)
+        current_aqi = int(round(aqi.mean()))
+        holiday = np.maximum(projected['holiday'].to_numpy(dtype=float), float(festival))
+        adjustment = coefficients.get("aqi", 0.0) * (aqi - projected['aqi'].to_numpy(dtype=float))
+        adjustment += coefficients.get("holiday", 0.0) * (holiday - projected['holiday'].to_numpy(dtype=float))
+        final_arr = np.maximum(0, baseline_arr + adjustment)
+    else:
+        final_arr = np.maximum(0, baseline_arr * _scenario_multiplier(current_aqi, scenario, aqi_override, festival))
+
+    baseline_preds = baseline_arr.tolist()
+    final_preds = final_arr.tolist()
+    # Conformal band from backtest residuals; Prophet's are only there once prewarm or the ensemble made them
+    band_engine = "prophet" if use_prophet else "linear_trend"
+    band = conformal_bands(band_engine, feature_df, final_arr, coverage, compute=not use_prophet)
+    if band is not None:
+        ci_low = band[0].round(1).tolist()
+        ci_high = band[1].round(1).tolist()
+    else:
+        ci_low = np.maximum(0, fitted["ci_low"]).round(1).tolist()
+        ci_high = fitted["ci_high"].round(1).tolist()
 
     # Construct response
-    predictions = []
-    for i, date in enumerate(future_dates):
-        conf_low, conf_high = confidence_intervals[i] if i < len(confidence_intervals) else (final_preds[i] * 0.8, final_preds[i] * 1.2)
-        predictions.append({
+    predictions = [
+        {
             "date": date.strftime("%Y-%m-%d"),
             "predicted": round(final_preds[i], 1),
             "baseline": round(baseline_preds[i], 1),
-            "confidence_low": round(max(0, conf_low), 1),
-            "confidence_high": round(conf_high, 1)
-        })
+            "confidence_low": ci_low[i],
+            "confidence_high": ci_high[i]
+        }
+        for i, date in enumerate(future_dates)
+    ]
 
-    avg_pred = np.mean(final_preds)
-    peak_pred = np.max(final_preds)
-    peak_idx = np.argmax(final_preds)
+    avg_pred = final_arr.mean()
+    peak_idx = int(final_arr.argmax())
+    peak_pred = final_arr[peak_idx]
     peak_date = future_dates[peak_idx].strftime("%Y-%m-%d")
     
     # Generate Explanation
@@ -171,15 +878,15 @@ def run_forecast(feature_df: pd.DataFrame, horizon_days: int, scenario: str = "b
         methodology = [
             "Base Model: Facebook Prophet (Additive Regression)",
             "Seasonality: Weekly and Yearly patterns detected",
-            f"External Regressors: AQI (Impact: {'High' if current_aqi > 200 else 'Moderate' if current_aqi > 100 else 'Low'})",
-            "Confidence Interval: 80% uncertainty band"
+            f"External Regressors: AQI, temperature, humidity, holidays (learned; AQI Impact: {_impact_label(current_aqi)})",
+            _band_label(coverage, band[2]) if band is not None else "Confidence Interval: 80% uncertainty band"
         ]
     else:
         methodology = [
             "Base Model: Rolling Average (Prophet unavailable, using statistical baseline)",
             "Method: Historical average with AQI and scenario adjustments",
             f"External Regressors: AQI (Impact: {'High' if current_aqi > 200 else 'Moderate' if current_aqi > 100 else 'Low'})",
-            "Confidence Interval: ±20% variation band"
+            _band_label(coverage, band[2]) if band is not None else "Confidence Interval: ±1.5 residual std band"
         ]
 
     # Calculate Metrics (Simulated based on fit quality)
@@ -0,0 +1,157 @@
+import time
+import numpy as np
+import pandas as pd
+from app.agents import feature_store, regressors
+
+# Features known at the forecast origin (the last observed day)
+ORIGIN_FEATURES = [
+    "lag_0", "lag_1", "lag_7", "lag_14",
+    "roll_mean_7", "roll_std_7", "roll_mean_28", "roll_std_28",
+    "aqi", "aqi_lag_1", "aqi_lag_7", "aqi_roll_mean_7",
+    "temperature", "humidity", "days_to_event", "days_since_event",
+]
+# Features of the day being predicted; in production AQI, weather and holidays come from the regressor projection
+TARGET_FEATURES = ["horizon", "target_dow", "target_doy_sin", "target_doy_cos", "target_aqi", "target_temperature", "target_humidity", "target_holiday"]
+FEATURES = ORIGIN_FEATURES + TARGET_FEATURES
+
+# Last days of targets held out to measure accuracy before the final fit
+HOLDOUT_DAYS = 28
+QUANTILES = (0.1, 0.9)
+GBM_PARAMS = {"max_iter": 200, "learning_rate": 0.05, "max_leaf_nodes": 15, "min_samples_leaf": 20, "random_state": 0}
+# Worse air and holidays never lower the forecast
+MONOTONIC = {"target_aqi": 1, "target_holiday": 1}
+
+
+def _target_block(dates: pd.Series, aqi, temperature, humidity, holiday) -> np.ndarray:
+    dates = pd.to_datetime(pd.Series(dates)).reset_index(drop=True)
+    angle = 2 * np.pi * dates.dt.dayofyear.to_numpy(dtype=float) / 365.25
+    return np.column_stack([
+        dates.dt.dayofweek.to_numpy(dtype=float),
+        np.sin(angle),
+        np.cos(angle),
+        np.asarray(aqi, dtype=float),
+        np.asarray(temperature, dtype=float),
+        np.asarray(humidity, dtype=float),
+        np.asarray(holiday, dtype=float),
+    ])
+
+
+def _stack(features: pd.DataFrame, horizon_days: int):
+    """
+    Direct multi-horizon training set: one row per (origin day, horizon) with
+    the origin's features, the horizon and the target day's features.
+    """
+    origin = features[ORIGIN_FEATURES].to_numpy(dtype=float)
+    target = _target_block(features['date'], features['aqi'], features['temperature'], features['humidity'], features['holiday'])
+    y = features['admissions_count'].to_numpy(dtype=float)
+    dates = features['date'].to_numpy()
+
+    blocks, targets, target_dates, origins = [], [], [], []
+    for h in range(1, min(horizon_days, len(features) - 1) + 1):
+        blocks.append(np.hstack([origin[:-h], np.full((len(origin) - h, 1), float(h)), target[h:]]))
+        targets.append(y[h:])
+        target_dates.append(dates[h:])
+        origins.append(np.arange(len(origin) - h))
+    X = np.vstack(blocks)
+    y = np.concatenate(targets)
+    keep = ~np.isnan(y)
+    return X[keep], y[keep], np.concatenate(target_dates)[keep], np.concatenate(origins)[keep]
+
+
+def _projected_targets(feature_df: pd.DataFrame, X: np.ndarray, origins: np.ndarray, horizon_days: int) -> np.ndarray:
+    """
+    X with the target-day AQI, weather and holiday replaced by what
+    regressors.project makes of the data up to each row's origin, as in production
+    """
+    df = feature_df.sort_values('date').reset_index(drop=True)
+    horizon = X[:, FEATURES.index("horizon")].astype(int) - 1
+    columns = {name: FEATURES.index(f"target_{name}") for name in regressors.REGRESSORS}
+    X = X.copy()
+    for origin in np.unique(origins):
+        rows = origins == origin
+        projection = regressors.project(df.iloc[:origin + 1], horizon_days)
+        for name, j in columns.items():
+            X[rows, j] = projection[name].to_numpy(dtype=float)[horizon[rows]]
+    return X
+
+
+def _regressor(**params):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    monotonic_cst = [MONOTONIC.get(name, 0) for name in FEATURES]
+    return HistGradientBoostingRegressor(**GBM_PARAMS, monotonic_cst=monotonic_cst, **params)
+
+
+def train(feature_df: pd.DataFrame, horizon_days: int) -> dict:
+    """
+    Train the direct multi-horizon gradient-boosted forecaster.
+
+    Accuracy is measured on the last HOLDOUT_DAYS of targets with a model
+    trained on the days before, at projected rather than observed target-day
+    regressors (which are unknown when forecasting); the returned models are then refitted on
+    everything. Returns the point model, the 10%/90% quantile models and the
+    holdout metrics.
+    """
+    start = time.perf_counter()
+    features = feature_store.get_features(feature_df)
+    X, y, target_dates, origins = _stack(features, horizon_days)
+
+    cutoff = pd.Timestamp(features['date'].max()) - pd.Timedelta(days=HOLDOUT_DAYS)
+    holdout = target_dates > np.datetime64(cutoff)
+    metrics = None
+    holdout_residuals = None
+    if holdout.any() and (~holdout).sum() > 100:
+        X_holdout = _projected_targets(feature_df, X[holdout], origins[holdout], horizon_days)
+        errors = _regressor().fit(X[~holdout], y[~holdout]).predict(X_holdout) - y[holdout]
+        actual = y[holdout]
+        # Out-of-sample residuals (actual - forecast) by horizon step, for conformal bands
+        horizons = X[holdout][:, FEATURES.index("horizon")].astype(int)
+        holdout_residuals = np.full((HOLDOUT_DAYS, horizon_days), np.nan)
+        for h in np.unique(horizons):
+            step_errors = -errors[horizons == h][-HOLDOUT_DAYS:]
+            holdout_residuals[:len(step_errors), h - 1] = step_errors
+        metrics = {
+            "mae": float(np.mean(np.abs(errors))),
+            "mape": float(np.mean(np.abs(errors) / np.maximum(actual, 1.0)) * 100),
+            "rmse": float(np.sqrt(np.mean(errors ** 2))),
+            "r2": float(1 - np.sum(errors ** 2) / max(np.sum((actual - actual.mean()) ** 2), 1e-9)),
+        }
+
+    models = {"point": _regressor().fit(X, y)}
+    models["low"] = _regressor(loss="quantile", quantile=QUANTILES[0]).fit(X, y)
+    models["high"] = _regressor(loss="quantile", quantile=QUANTILES[1]).fit(X, y)
+
+    return {
+        "models": models,
+        "metrics": metrics,
+        "holdout_residuals": holdout_residuals,
+        "last_date": pd.Timestamp(features['date'].max()),
+        "horizon_days": horizon_days,
+        "training_rows": len(y),
+        "training_seconds": time.perf_counter() - start
+    }
+
+
+def predict(model: dict, feature_df: pd.DataFrame, projection: pd.DataFrame, aqi=None, holiday=None) -> dict:
+    """
+    Predict the days in projection (date, aqi, temperature, humidity, holiday)
+    from the last observed day. aqi and holiday override the projected values.
+    """
+    features = feature_store.get_features(feature_df)
+    horizon_days = len(projection)
+    origin = np.repeat(features[ORIGIN_FEATURES].to_numpy(dtype=float)[-1:], horizon_days, axis=0)
+    target = _target_block(
+        projection['date'],
+        projection['aqi'] if aqi is None else np.broadcast_to(np.asarray(aqi, dtype=float), (horizon_days,)),
+        projection['temperature'],
+        projection['humidity'],
+        projection['holiday'] if holiday is None else np.broadcast_to(np.asarray(holiday, dtype=float), (horizon_days,)),
+    )
+    X = np.hstack([origin, np.arange(1, horizon_days + 1, dtype=float)[:, None], target])
+
+    point = np.maximum(0.0, model["models"]["point"].predict(X))
+    return {
+        "predicted": point,
+        "ci_low": np.maximum(0.0, np.minimum(model["models"]["low"].predict(X), point)),
+        "ci_high": np.maximum(model["models"]["high"].predict(X), point)
+    }
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from app.agents import regressors
+
+# Component series forecast together; "other" is total minus the named components
+TARGETS = ["respiratory_cases", "trauma_cases", "other_cases"]
+
+# AQI above this adds respiratory admissions
+AQI_THRESHOLD = 150
+
+# Regressors that only act on one component (all other columns are shared)
+REGRESSOR_TARGETS = {
+    "aqi_excess": "respiratory_cases",
+    "festival": "trauma_cases",
+}
+
+# Small ridge penalty; also pins coefficients of masked-out columns to zero
+RIDGE = 1e-3
+
+# Two-sided 80% band, matching Prophet's interval_width=0.8
+Z_80 = 1.2816
+
+
+def has_components(feature_df: pd.DataFrame) -> bool:
+    return {"admissions_count", "respiratory_cases", "trauma_cases"}.issubset(feature_df.columns)
+
+
+def _design(dates: pd.Series, origin: pd.Timestamp, regs: dict, scaling: dict) -> (np.ndarray, list):
+    """
+    Design matrix: level, trend, weekday, annual Fourier terms, standardized
+    weather, AQI excess and festival flag.
+
+    regs maps aqi, temperature, humidity and festival to scalars or per-day arrays.
+    """
+    dates = pd.to_datetime(pd.Series(dates)).reset_index(drop=True)
+    n = len(dates)
+    days = (dates - origin).dt.days.to_numpy(dtype=float)
+    weekday = dates.dt.dayofweek.to_numpy()
+    year_angle = 2 * np.pi * dates.dt.dayofyear.to_numpy(dtype=float) / 365.25
+
+    def column(name):
+        return np.broadcast_to(np.asarray(regs[name], dtype=float), (n,))
+
+    columns = ["intercept", "trend"] + [f"weekday_{d}" for d in range(1, 7)] + ["year_sin1", "year_cos1", "year_sin2", "year_cos2", "temperature", "humidity", "aqi_excess", "festival"]
+    X = np.empty((n, len(columns)))
+    X[:, 0] = 1.0
+    X[:, 1] = days / 365.25
+    X[:, 2:8] = weekday[:, None] == np.arange(1, 7)[None, :]
+    X[:, 8] = np.sin(year_angle)
+    X[:, 9] = np.cos(year_angle)
+    X[:, 10] = np.sin(2 * year_angle)
+    X[:, 11] = np.cos(2 * year_angle)
+    for j, name in [(12, "temperature"), (13, "humidity")]:
+        mean, std = scaling[name]
+        X[:, j] = (column(name) - mean) / std
+    X[:, 14] = np.maximum(0.0, column("aqi") - AQI_THRESHOLD) / 100.0
+    X[:, 15] = column("festival")
+    return X, columns
+
+
+def _solve(gram: np.ndarray, xty: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    """
+    Ridge solve for every target in one batched call.
+
+    masks[t, j] is False where column j is excluded for target t; those rows and
+    columns of the Gram matrix are zeroed so only the ridge term remains and the
+    coefficient comes out as zero.
+    """
+    p = masks.shape[1]
+    A = gram[None, :, :] * (masks[:, :, None] & masks[:, None, :]) + RIDGE * np.eye(p)[None, :, :]
+    b = (xty.T * masks)[:, :, None]
+    return np.linalg.solve(A, b)[:, :, 0].T
+
+
+def fit(feature_df: pd.DataFrame) -> dict:
+    """
+    Fit respiratory, trauma and other admissions with one shared design matrix.
+
+    AQI only enters the respiratory model and festivals only the trauma model.
+    Both effects are constrained to be non-negative. Temperature and humidity
+    are shared regressors.
+    """
+    df = feature_df.dropna(subset=["admissions_count", "respiratory_cases", "trauma_cases"]).reset_index(drop=True)
+    total = df['admissions_count'].to_numpy(dtype=float)
+    respiratory = df['respiratory_cases'].to_numpy(dtype=float)
+    trauma = df['trauma_cases'].to_numpy(dtype=float)
+    Y = np.column_stack([respiratory, trauma, np.maximum(0.0, total - respiratory - trauma)])
+
+    hist = regressors.history(df)
+    scaling = {name: (float(hist[name].mean()), float(hist[name].std()) or 1.0) for name in ["temperature", "humidity"]}
+    origin = pd.Timestamp(df['date'].min())
+    regs = {"aqi": hist['aqi'], "temperature": hist['temperature'], "humidity": hist['humidity'], "festival": hist['holiday']}
+    X, columns = _design(df['date'], origin, regs, scaling)
+
+    masks = np.ones((len(TARGETS), len(columns)), dtype=bool)
+    for column, target in REGRESSOR_TARGETS.items():
+        masks[:, columns.index(column)] = False
+        masks[TARGETS.index(target), columns.index(column)] = True
+
+    gram = X.T @ X
+    xty = X.T @ Y
+    coef = _solve(gram, xty, masks)
+
+    # Effects with the wrong sign are noise; drop them and solve again
+    negative = False
+    for column, target in REGRESSOR_TARGETS.items():
+        j, t = columns.index(column), TARGETS.index(target)
+        if coef[j, t] < 0:
+            masks[t, j] = False
+            negative = True
+    if negative:
+        coef = _solve(gram, xty, masks)
+
+    residuals = Y - X @ coef
+    total_residuals = residuals.sum(axis=1)
+
+    return {
+        "coef": coef,
+        "columns": columns,
+        "origin": origin,
+        "scaling": scaling,
+        "last_date": pd.Timestamp(df['date'].max()),
+        "component_std": residuals.std(axis=0),
+        "total_std": float(total_residuals.std()),
+        "metrics": {
+            "mae": float(np.mean(np.abs(total_residuals))),
+            "mape": float(np.mean(np.abs(total_residuals) / np.maximum(total, 1.0)) * 100),
+            "rmse": float(np.sqrt(np.mean(total_residuals ** 2))),
+            "r2": float(1 - np.sum(total_residuals ** 2) / max(np.sum((total - total.mean()) ** 2), 1e-9)),
+        },
+        "effects": {column: float(coef[columns.index(column), TARGETS.index(target)]) for column, target in REGRESSOR_TARGETS.items()},
+        "training_rows": len(df)
+    }
+
+
+def predict(model: dict, horizon_days: int, aqi, festival, temperature=None, humidity=None) -> dict:
+    """
+    Component and total predictions for the horizon_days after the training data.
+
+    Regressors are scalars or per-day arrays; missing weather is taken at its
+    training mean. Returns numpy arrays per target plus total, ci_low and
+    ci_high (80%).
+    """
+    dates = pd.Series([model["last_date"] + timedelta(days=i + 1) for i in range(horizon_days)])
+    regs = {
+        "aqi": aqi,
+        "festival": festival,
+        "temperature": model["scaling"]["temperature"][0] if temperature is None else temperature,
+        "humidity": model["scaling"]["humidity"][0] if humidity is None else humidity
+    }
+    X, _ = _design(dates, model["origin"], regs, model["scaling"])
+    components = np.maximum(0.0, X @ model["coef"])
+    total = components.sum(axis=1)
+    half_width = Z_80 * model["total_std"]
+    result = {target: components[:, i] for i, target in enumerate(TARGETS)}
+    result.update({
+        "total": total,
+        "ci_low": np.maximum(0.0, total - half_width),
+        "ci_high": total + half_width
+    })
+    return result
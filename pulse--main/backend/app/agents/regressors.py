@@ -0,0 +1,110 @@
+import threading
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+# Regressor columns used by the forecast engines
+REGRESSORS = ["aqi", "temperature", "humidity", "holiday"]
+CONTINUOUS = ["aqi", "temperature", "humidity"]
+
+# Projections are computed this far ahead once and sliced for shorter horizons
+PROJECTION_DAYS = 30
+
+# Day-of-year window (±days) for the climatology of past years
+CLIMATOLOGY_WINDOW = 7
+# Recent anomaly (last 7 days vs climatology) decays by this factor per day ahead
+ANOMALY_DECAY = 0.8
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def history(feature_df: pd.DataFrame) -> pd.DataFrame:
+    """Regressor columns of feature_df with gaps filled, one row per date"""
+    out = pd.DataFrame({"date": pd.to_datetime(feature_df['date']).reset_index(drop=True)})
+    for column in CONTINUOUS:
+        if column in feature_df.columns:
+            values = pd.to_numeric(feature_df[column], errors="coerce").reset_index(drop=True).ffill().bfill()
+            out[column] = values.fillna(values.mean() if values.notna().any() else 0.0)
+        else:
+            out[column] = 0.0
+    holiday = np.zeros(len(feature_df), dtype=float)
+    if 'is_holiday' in feature_df.columns:
+        holiday = np.maximum(holiday, feature_df['is_holiday'].fillna(False).astype(bool).to_numpy(dtype=float))
+    if 'event_name' in feature_df.columns:
+        holiday = np.maximum(holiday, (feature_df['event_name'].fillna("None") != "None").to_numpy(dtype=float))
+    out["holiday"] = holiday
+    return out
+
+
+def _climatology(hist: pd.DataFrame, column: str, doys: np.ndarray) -> np.ndarray:
+    """Mean of column over past years within CLIMATOLOGY_WINDOW days of each day of year"""
+    past_doy = hist['date'].dt.dayofyear.to_numpy()
+    values = hist[column].to_numpy(dtype=float)
+    # Circular day-of-year distance, (len(doys) x len(history))
+    distance = np.abs(doys[:, None] - past_doy[None, :])
+    distance = np.minimum(distance, 366 - distance)
+    weights = distance <= CLIMATOLOGY_WINDOW
+    counts = weights.sum(axis=1)
+    sums = (weights * values[None, :]).sum(axis=1)
+    fallback = values.mean() if len(values) else 0.0
+    return np.where(counts > 0, sums / np.maximum(counts, 1), fallback)
+
+
+def _project_holidays(feature_df: pd.DataFrame, dates: pd.Series) -> np.ndarray:
+    """Known future events from the calendar, plus fixed-date events recurring yearly"""
+    from app.agents import data_agent
+
+    try:
+        event_dates = pd.to_datetime(data_agent.load_events_calendar()['date'])
+    except Exception:
+        hist = history(feature_df)
+        event_dates = hist.loc[hist['holiday'] > 0, 'date']
+    known = set(event_dates.dt.date)
+    recurring = set(zip(event_dates.dt.month, event_dates.dt.day))
+    return np.array([1.0 if d.date() in known or (d.month, d.day) in recurring else 0.0 for d in dates])
+
+
+def project(feature_df: pd.DataFrame, horizon_days: int) -> pd.DataFrame:
+    """
+    Lightweight projection of regressor values for the horizon_days after the data.
+
+    Continuous regressors follow their day-of-year climatology plus the recent
+    anomaly decaying geometrically; holidays come from the events calendar.
+    """
+    hist = history(feature_df)
+    last_date = hist['date'].max()
+    dates = pd.Series([last_date + timedelta(days=i + 1) for i in range(horizon_days)])
+    doys = dates.dt.dayofyear.to_numpy()
+    decay = ANOMALY_DECAY ** np.arange(1, horizon_days + 1)
+
+    out = pd.DataFrame({"date": dates})
+    recent = hist.tail(7)
+    recent_doys = recent['date'].dt.dayofyear.to_numpy()
+    for column in CONTINUOUS:
+        anomaly = float((recent[column].to_numpy(dtype=float) - _climatology(hist, column, recent_doys)).mean()) if len(recent) else 0.0
+        out[column] = _climatology(hist, column, doys) + anomaly * decay
+    out["aqi"] = out["aqi"].clip(lower=0)
+    out["humidity"] = out["humidity"].clip(0, 100)
+    out["holiday"] = _project_holidays(feature_df, dates)
+    return out
+
+
+def get_projection(feature_df: pd.DataFrame, horizon_days: int) -> pd.DataFrame:
+    """
+    Projected regressors for the next horizon_days, computed once per day and
+    data version (at PROJECTION_DAYS) and shared by every forecast request.
+    """
+    from app.services import model_registry
+
+    hist = history(feature_df)
+    key = (model_registry.data_fingerprint(hist), date.today().isoformat(), max(horizon_days, PROJECTION_DAYS))
+    with _lock:
+        projection = _cache.get(key)
+        if projection is None:
+            projection = project(feature_df, key[2])
+            # Projections from earlier days are never used again
+            for stale in [k for k in _cache if k[1] != key[1]]:
+                del _cache[stale]
+            _cache[key] = projection
+    return projection.head(horizon_days).copy()
@@ -5,7 +5,7 @@ from app.core.database import get_db
 from app.api.schemas import ForecastRunRequest, ForecastSummaryResponse
 from app.agents.pipeline import run_pipeline
 from app.agents import data_agent, forecast_agent
-from app.services import forecast_service, alerts_service, status_service
+from app.services import forecast_service, alerts_service, status_service, accuracy_service
 from datetime import datetime
 
 router = APIRouter()
@@ -16,6 +16,7 @@ class ForecastRequest(BaseModel):
     horizon_days: int = 7
     aqi_override: Optional[int] = None
     is_festival: bool = False
+    coverage: Optional[float] = None  # confidence band coverage, e.g. 0.8 or 0.95
 
 @router.post("/")
 def run_forecast_api(request: ForecastRequest, db: Session = Depends(get_db)):
@@ -28,7 +29,8 @@ def run_forecast_api(request: ForecastRequest, db: Session = Depends(get_db)):
             horizon_days=request.horizon_days,
             scenario="baseline",
             aqi_override=request.aqi_override,
-            is_festival=request.is_festival
+            is_festival=request.is_festival,
+            coverage=request.coverage
         )
         
         return {
@@ -76,7 +78,8 @@ def run_forecast(request: ForecastRunRequest, db: Session = Depends(get_db)):
         db, 
         result["forecast_summary"], 
         request.horizon_days, 
-        request.scenario
+        request.scenario,
+        predictions=result["forecast_details"]
     )
     
     # Persist Alerts
@@ -107,3 +110,8 @@ def get_latest_forecast(db: Session = Depends(get_db)):
     if not forecast:
         return {} # Or 404
     return forecast
+
+@router.get("/accuracy")
+def get_forecast_accuracy(db: Session = Depends(get_db)):
+    """Rolling error stats per engine and horizon step, and drift status"""
+    return accuracy_service.get_accuracy(db)
@@ -12,22 +12,13 @@ def get_scenarios(horizon_days: int = Query(default=7), db: Session = Depends(ge
     feature_df = data_agent.build_feature_frame()
     current_aqi = data_agent.get_current_aqi()
     
-    # Run all scenarios
-    baseline_result = forecast_agent.run_forecast(
-        feature_df, horizon_days, scenario="baseline"
-    )
-    
-    high_aqi_result = forecast_agent.run_forecast(
-        feature_df, horizon_days, scenario="baseline", aqi_override=250
-    )
-    
-    festival_result = forecast_agent.run_forecast(
-        feature_df, horizon_days, scenario="baseline", is_festival=True
-    )
-    
-    combined_result = forecast_agent.run_forecast(
-        feature_df, horizon_days, scenario="baseline", aqi_override=250, is_festival=True
-    )
+    # Run all scenarios (they share one baseline fit)
+    baseline_result, high_aqi_result, festival_result, combined_result = forecast_agent.forecast_many([
+        dict(feature_df=feature_df, horizon_days=horizon_days, scenario="baseline"),
+        dict(feature_df=feature_df, horizon_days=horizon_days, scenario="baseline", aqi_override=250),
+        dict(feature_df=feature_df, horizon_days=horizon_days, scenario="baseline", is_festival=True),
+        dict(feature_df=feature_df, horizon_days=horizon_days, scenario="baseline", aqi_override=250, is_festival=True),
+    ])
     
     # Transform to frontend format (ds/yhat instead of date/predicted)
     def transform_predictions(predictions):
@@ -54,8 +54,18 @@ app.include_router(landing.router, prefix="/landing", tags=["landing"])
 
 @app.on_event("startup")
 def startup_event():
+    import threading
+    from app.agents import forecast_agent
+
+    # Load (or fit) the forecast model in the background so the first request doesn't pay for it
+    threading.Thread(target=forecast_agent.prewarm, name="forecast-prewarm", daemon=True).start()
     start_scheduler()
 
+@app.on_event("shutdown")
+def shutdown_event():
+    from app.services import forecast_pool
+    forecast_pool.shutdown()
+
 @app.get("/")
 def root():
     return {"message": "Pulse AI Cockpit Backend is running"}
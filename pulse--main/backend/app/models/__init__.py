@@ -4,11 +4,12 @@ from .aqi import AQI
 from .forecast import Forecast
 from .alerts import Alert, OperationalAlert
 from .system_status import SystemStatus
+from .kpi_snapshot import KPISnapshot
 from .hospital import Hospital
 from .department import Department
 from .patient_inflow import PatientInflow
 from .resource_snapshot import ResourceSnapshot
 from .context_signals import ContextSignals
-from .daily_forecast import DailyForecast
+from .daily_forecast import DailyForecast, ForecastRetrain
 from .shortage import Shortage
 from .document import Document
@@ -7,8 +7,28 @@ class DailyForecast(Base):
     id = Column(Integer, primary_key=True)
     hospital_id = Column(Integer, ForeignKey("hospitals.id"), index=True)
     department_id = Column(Integer, ForeignKey("departments.id"), index=True)
+    forecast_id = Column(Integer, ForeignKey("forecasts.id"), index=True)
+    run_timestamp = Column(DateTime)
+    engine = Column(String, index=True)
+    scenario = Column(String)
+    horizon_step = Column(Integer)  # days ahead of the run's last observed day
     horizon_date = Column(DateTime, index=True)
     inflow_pred = Column(Float)
     inflow_ci_low = Column(Float)
     inflow_ci_high = Column(Float)
     model_version = Column(String, default="mvp-0")
+    # Filled in by the accuracy job once the day's admissions are known
+    actual = Column(Float, nullable=True, index=True)
+    abs_error = Column(Float, nullable=True)
+    evaluated_at = Column(DateTime, nullable=True)
+
+
+# Drift-triggered retrains; forecasts made before one no longer count towards the engine's drift
+class ForecastRetrain(Base):
+    __tablename__ = "forecast_retrains"
+
+    id = Column(Integer, primary_key=True)
+    engine = Column(String, index=True)  # summary "model_source" whose error drifted
+    retrained_at = Column(DateTime, index=True)
+    mae = Column(Float)
+    expected_mae = Column(Float)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float
+from app.core.database import Base
+
+class KPISnapshot(Base):
+    __tablename__ = "kpi_snapshots"
+
+    id = Column(Integer, primary_key=True, default=1)
+    computed_at = Column(DateTime)
+    data_version = Column(String)
+    occupancy = Column(Float)
+    admissions_24h = Column(Integer)
+    aqi = Column(Integer)
+    risk_score = Column(Integer)
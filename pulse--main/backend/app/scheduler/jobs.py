@@ -1,8 +1,9 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from app.agents.pipeline import run_pipeline
 from app.core.database import SessionLocal
-from app.services import forecast_service, alerts_service, status_service
+from app.services import forecast_service, alerts_service, status_service, kpi_service, accuracy_service
 from datetime import datetime
+import os
 
 scheduler = BackgroundScheduler()
 
@@ -18,7 +19,8 @@ def run_scheduled_forecast():
             db, 
             result["forecast_summary"], 
             7, 
-            "baseline"
+            "baseline",
+            predictions=result["forecast_details"]
         )
         
         risk = result["risk_level"]
@@ -49,7 +51,31 @@ def run_scheduled_decision():
     # Implementation can be added here
     pass
 
+def refresh_kpi_snapshot():
+    # Cheap when nothing changed: only the data files' mtimes are checked
+    db = SessionLocal()
+    try:
+        kpi_service.refresh_snapshot(db)
+    except Exception as e:
+        print(f"Error refreshing KPI snapshot: {e}")
+    finally:
+        db.close()
+
+def evaluate_forecast_accuracy():
+    # Incremental: only forecasts whose day has not been scored yet are read;
+    # slow engines are refitted here only when their error drifts
+    db = SessionLocal()
+    try:
+        accuracy_service.evaluate(db)
+    except Exception as e:
+        print(f"Error evaluating forecast accuracy: {e}")
+    finally:
+        db.close()
+
 def start_scheduler():
+    kpi_interval = int(os.getenv("KPI_REFRESH_SECONDS", "60"))
+    scheduler.add_job(refresh_kpi_snapshot, 'interval', seconds=kpi_interval, next_run_time=datetime.now())
     scheduler.add_job(run_scheduled_forecast, 'interval', hours=6)
     scheduler.add_job(run_scheduled_decision, 'interval', hours=1)
+    scheduler.add_job(evaluate_forecast_accuracy, 'interval', hours=int(os.getenv("ACCURACY_CHECK_HOURS", "1")))
     scheduler.start()
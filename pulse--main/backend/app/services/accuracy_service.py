@@ -0,0 +1,193 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.daily_forecast import DailyForecast, ForecastRetrain
+from app.agents import data_agent, forecast_agent
+
+# Rolling window of forecast days that error stats are computed over
+ACCURACY_WINDOW_DAYS = int(os.getenv("ACCURACY_WINDOW_DAYS", "28"))
+# Drift: live MAE above this multiple of the engine's backtest MAE (or of the previous window's MAE)
+DRIFT_RATIO = float(os.getenv("FORECAST_DRIFT_RATIO", "1.5"))
+# Distinct evaluated days needed before drift is judged
+MIN_EVALUATED_DAYS = 7
+
+# Reused fits behind each model_source; the other engines are refitted with every data version
+_RETRAIN_ENGINES = {"prophet": ["prophet"], "ensemble": ["prophet"], "gbm": ["gbm"]}
+
+_latest: Optional[Dict[str, Any]] = None
+_lock = threading.Lock()
+
+
+def update_actuals(db: Session, feature_df: pd.DataFrame) -> int:
+    """
+    Fill in actual admissions and absolute errors of stored daily forecasts
+    whose day has been observed. Only rows without an actual are read, so each
+    run handles what arrived since the last one. Returns the rows updated.
+    """
+    actuals = feature_df.dropna(subset=['admissions_count'])
+    if actuals.empty:
+        return 0
+    by_date = dict(zip(pd.to_datetime(actuals['date']).dt.normalize(), actuals['admissions_count'].astype(float)))
+    last_date = max(by_date)
+
+    rows = db.query(DailyForecast).filter(
+        DailyForecast.actual.is_(None),
+        DailyForecast.inflow_pred.isnot(None),
+        DailyForecast.horizon_date <= last_date.to_pydatetime()
+    ).all()
+
+    now = datetime.utcnow()
+    updated = 0
+    for row in rows:
+        actual = by_date.get(pd.Timestamp(row.horizon_date).normalize())
+        if actual is None:
+            continue
+        row.actual = actual
+        row.abs_error = abs(row.inflow_pred - actual)
+        row.evaluated_at = now
+        updated += 1
+    db.commit()
+    return updated
+
+
+def _evaluated(db: Session, since: datetime, until: datetime) -> pd.DataFrame:
+    """
+    Evaluated baseline-scenario rows for days in (since, until], one per
+    engine, data version and day. Manual and scheduled runs on the same data
+    store the same forecast; only the latest copy is kept so the stats aren't
+    weighted by how often a forecast was run.
+    """
+    rows = db.query(
+        DailyForecast.engine, DailyForecast.scenario, DailyForecast.model_version, DailyForecast.horizon_step,
+        DailyForecast.horizon_date, DailyForecast.run_timestamp, DailyForecast.inflow_pred, DailyForecast.actual,
+        DailyForecast.abs_error
+    ).filter(
+        DailyForecast.actual.isnot(None),
+        DailyForecast.scenario == "baseline",
+        DailyForecast.horizon_date > since,
+        DailyForecast.horizon_date <= until
+    ).all()
+    df = pd.DataFrame(rows, columns=[
+        "engine", "scenario", "model_version", "horizon_step", "horizon_date", "run_timestamp", "inflow_pred", "actual", "abs_error"
+    ])
+    df = df.sort_values('run_timestamp').drop_duplicates(['engine', 'scenario', 'model_version', 'horizon_date'], keep='last')
+    return df.reset_index(drop=True)
+
+
+def rolling_errors(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """MAE, MAPE and bias (forecast - actual) per engine and horizon step"""
+    if df.empty:
+        return []
+    df = df.assign(
+        pct_error=df['abs_error'] / np.maximum(df['actual'], 1.0) * 100,
+        error=df['inflow_pred'] - df['actual']
+    )
+    stats = df.groupby(['engine', 'horizon_step']).agg(
+        n=('abs_error', 'size'), mae=('abs_error', 'mean'), mape=('pct_error', 'mean'), bias=('error', 'mean')
+    ).reset_index()
+    return [
+        {
+            "engine": row.engine,
+            "horizon_step": int(row.horizon_step),
+            "count": int(row.n),
+            "mae": round(float(row.mae), 2),
+            "mape": round(float(row.mape), 2),
+            "bias": round(float(row.bias), 2)
+        }
+        for row in stats.itertuples()
+    ]
+
+
+def _drift(engine: str, recent: pd.DataFrame, previous: pd.DataFrame, feature_df: pd.DataFrame) -> Dict[str, Any]:
+    """Live MAE of an engine against what its backtest (or the previous window) leads to expect"""
+    mae = float(recent['abs_error'].mean())
+    reference = forecast_agent.reference_errors(engine, feature_df)
+    if reference is not None:
+        steps = np.minimum(recent['horizon_step'].to_numpy(dtype=int), len(reference)) - 1
+        expected = float(reference[steps].mean())
+        basis = "backtest"
+    elif not previous.empty:
+        expected = float(previous['abs_error'].mean())
+        basis = "previous_window"
+    else:
+        expected, basis = None, None
+
+    ratio = mae / max(expected, 1e-6) if expected is not None else None
+    days = recent['horizon_date'].nunique()
+    return {
+        "engine": engine,
+        "mae": round(mae, 2),
+        "expected_mae": round(expected, 2) if expected is not None else None,
+        "basis": basis,
+        "ratio": round(ratio, 2) if ratio is not None else None,
+        "evaluated_days": int(days),
+        "drifted": bool(ratio is not None and days >= MIN_EVALUATED_DAYS and ratio > DRIFT_RATIO)
+    }
+
+
+def last_retrains(db: Session) -> Dict[str, datetime]:
+    """Time of the latest drift retrain per engine"""
+    rows = db.query(ForecastRetrain.engine, func.max(ForecastRetrain.retrained_at)).group_by(ForecastRetrain.engine).all()
+    return dict(rows)
+
+
+def evaluate(db: Session) -> Dict[str, Any]:
+    """
+    Join newly observed admissions to past forecasts, recompute the rolling
+    error stats and request a refit of engines whose error has drifted.
+
+    Only forecasts made since an engine's last drift retrain (stored in
+    ForecastRetrain, so restarts don't repeat it) count towards its drift,
+    so one bad stretch triggers one retrain.
+    """
+    global _latest
+    feature_df = data_agent.build_feature_frame()
+    updated = update_actuals(db, feature_df)
+
+    until = pd.Timestamp(feature_df['date'].max()).to_pydatetime()
+    since = until - timedelta(days=ACCURACY_WINDOW_DAYS)
+    recent = _evaluated(db, since, until)
+    previous = _evaluated(db, since - timedelta(days=ACCURACY_WINDOW_DAYS), since)
+
+    retrained_at = last_retrains(db)
+    drift = []
+    retrain = []
+    for engine, rows in recent.groupby('engine'):
+        if engine in retrained_at:
+            rows = rows[pd.to_datetime(rows['run_timestamp']) >= retrained_at[engine]]
+        if rows.empty:
+            continue
+        status = _drift(engine, rows, previous[previous['engine'] == engine], feature_df)
+        if status["drifted"]:
+            print(f"Forecast error drift for {engine}: MAE {status['mae']} vs expected {status['expected_mae']} ({status['basis']})")
+            retrain.extend(_RETRAIN_ENGINES.get(engine, []))
+            db.add(ForecastRetrain(engine=engine, retrained_at=datetime.utcnow(), mae=status["mae"], expected_mae=status["expected_mae"]))
+        drift.append(status)
+    db.commit()
+
+    for name in sorted(set(retrain)):
+        forecast_agent.retrain(name, feature_df)
+
+    result = {
+        "evaluated_at": datetime.utcnow(),
+        "rows_updated": updated,
+        "window_days": ACCURACY_WINDOW_DAYS,
+        "errors": rolling_errors(recent),
+        "drift": drift,
+        "retrained": sorted(set(retrain))
+    }
+    with _lock:
+        _latest = result
+    return result
+
+
+def get_accuracy(db: Session) -> Dict[str, Any]:
+    """Latest accuracy stats, evaluating now if the job has not run yet"""
+    with _lock:
+        latest = _latest
+    return latest if latest is not None else evaluate(db)
@@ -0,0 +1,239 @@
+import os
+import time
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+# Model fits run in worker processes so a hung Stan process can be killed
+# instead of blocking a request thread
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", str(min(4, os.cpu_count() or 1))))
+FORECAST_FIT_TIMEOUT_SECONDS = float(os.getenv("FORECAST_FIT_TIMEOUT_SECONDS", "30"))
+
+# Circuit breaker: after BREAKER_THRESHOLD slow or timed out fits in a row,
+# skip the slow engine for BREAKER_COOLDOWN_SECONDS, then let one fit try again
+FORECAST_SLOW_FIT_SECONDS = float(os.getenv("FORECAST_SLOW_FIT_SECONDS", "10"))
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN_SECONDS = 300
+
+# Jobs failed only because their pool was recycled for another job's timeout
+# are resubmitted up to this many times
+MAX_RESUBMITS = 2
+# How often a queued job checks whether it has started running
+_START_POLL_SECONDS = 0.2
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_closed = False
+
+# Workers report (job id, pid, start time) here when they pick up a job, so
+# timeouts run from the start of the job and only its worker is killed
+_ctx = multiprocessing.get_context("spawn")
+_events = None
+_started = {}
+_job_ids = itertools.count(1)
+
+_breaker_lock = threading.Lock()
+_slow_fits = 0
+_open_until = 0.0
+_trial_running = False
+
+_worker_events = None
+
+
+def _init_worker(events):
+    global _worker_events
+    _worker_events = events
+
+
+def _timed_call(job_id: int, fn: Callable, args: tuple):
+    start = time.perf_counter()
+    _worker_events.put((job_id, os.getpid(), time.time()))
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _collect_events(events):
+    while True:
+        job_id, pid, started_at = events.get()
+        _started[job_id] = (pid, started_at)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _events, _closed
+    with _pool_lock:
+        if _events is None:
+            _events = _ctx.Queue()
+            threading.Thread(target=_collect_events, args=(_events,), daemon=True, name="forecast-pool-events").start()
+        if _pool is None:
+            # spawn, not fork: the API process runs threads (scheduler, uvicorn)
+            _pool = ProcessPoolExecutor(max_workers=FORECAST_WORKERS, mp_context=_ctx, initializer=_init_worker, initargs=(_events,))
+            _closed = False
+        return _pool
+
+
+def _recycle_pool(pool: ProcessPoolExecutor, pid: Optional[int] = None):
+    """
+    Retire a pool with a stuck or dead worker; the next submit starts a new pool.
+
+    ProcessPoolExecutor can't cancel a running job, so the stuck worker (pid)
+    is terminated. The executor then fails the pool's other jobs, which
+    FitJob.result resubmits to the new pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    process = (getattr(pool, "_processes", None) or {}).get(pid)
+    if process is not None:
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    global _pool, _closed
+    with _pool_lock:
+        pool, _pool = _pool, None
+        _closed = True
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def allow_slow_engine() -> bool:
+    """False while the breaker is open; after the cooldown one trial fit is allowed through"""
+    global _trial_running
+    with _breaker_lock:
+        if _slow_fits < BREAKER_THRESHOLD:
+            return True
+        if time.time() < _open_until or _trial_running:
+            return False
+        _trial_running = True
+        return True
+
+
+def _record_fit(slow: bool):
+    global _slow_fits, _open_until, _trial_running
+    with _breaker_lock:
+        _trial_running = False
+        if not slow:
+            _slow_fits = 0
+            return
+        _slow_fits += 1
+        if _slow_fits >= BREAKER_THRESHOLD:
+            _open_until = time.time() + BREAKER_COOLDOWN_SECONDS
+            print(f"Forecast circuit breaker open for {BREAKER_COOLDOWN_SECONDS}s after {_slow_fits} slow fits")
+
+
+def _release_trial():
+    """A fit that ended without telling anything about the engine frees the trial slot"""
+    global _trial_running
+    with _breaker_lock:
+        _trial_running = False
+
+
+def breaker_status() -> dict:
+    with _breaker_lock:
+        return {
+            "open": _slow_fits >= BREAKER_THRESHOLD and time.time() < _open_until,
+            "slow_fits": _slow_fits,
+            "open_until": _open_until if _slow_fits >= BREAKER_THRESHOLD else None
+        }
+
+
+class FitJob:
+    """A fit running in the pool; several request threads may wait on the same job"""
+
+    def __init__(self, fn: Callable, args: tuple, timeout: float):
+        self.fn = fn
+        self.args = args
+        self.timeout = timeout
+        self.id = next(_job_ids)
+        self.resubmits = 0
+        self._lock = threading.Lock()
+        self._settled = False
+        self._failed = False
+        self._submit()
+
+    def _submit(self):
+        self.pool = _get_pool()
+        self.future = self.pool.submit(_timed_call, self.id, self.fn, self.args)
+
+    def _settle(self, slow: bool, recycle: bool = False, pid: Optional[int] = None):
+        with self._lock:
+            if self._settled:
+                return
+            self._settled = True
+        _started.pop(self.id, None)
+        if recycle:
+            _recycle_pool(self.pool, pid)
+        _record_fit(slow)
+
+    def _wait_seconds(self) -> float:
+        """Time left before the deadline, which starts when a worker picks the job up"""
+        started = _started.get(self.id)
+        if started is None:
+            return _START_POLL_SECONDS
+        return max(0.0, started[1] + self.timeout - time.time())
+
+    def _resubmit(self, future) -> bool:
+        """
+        Resubmit to the new pool after this job's pool was recycled for another
+        job. False when the job gives up (shut down, or resubmitted too often).
+        """
+        with self._lock:
+            if self.future is not future:
+                # Another waiting thread resubmitted already
+                return not self._failed
+            _started.pop(self.id, None)
+            if _closed or self.resubmits >= MAX_RESUBMITS:
+                self._failed = True
+                _release_trial()
+                return False
+            self.resubmits += 1
+            self._submit()
+            return True
+
+    def result(self):
+        """Fit result, or None if the job failed or ran past its timeout"""
+        while not self._failed:
+            future = self.future
+            try:
+                result, seconds = future.result(timeout=self._wait_seconds())
+            except FutureTimeout:
+                started = _started.get(self.id)
+                if started is None or time.time() < started[1] + self.timeout:
+                    # Still queued behind other jobs
+                    continue
+                print(f"Forecast fit timed out after {self.timeout:.0f}s; killing its worker")
+                self._failed = True
+                self._settle(slow=True, recycle=True, pid=started[0])
+                return None
+            except (BrokenProcessPool, CancelledError) as e:
+                if self._settled:
+                    return None
+                if self.pool is not _pool:
+                    # The pool was recycled for another job's timeout, or shut down:
+                    # not this fit's fault, so the breaker is left alone
+                    if self._resubmit(future):
+                        continue
+                    return None
+                print(f"Forecast worker died: {e}")
+                self._failed = True
+                self._settle(slow=True, recycle=True)
+                return None
+            except Exception as e:
+                print(f"Forecast fit failed: {e}")
+                self._failed = True
+                self._settle(slow=False)
+                return None
+
+            self._settle(slow=seconds > FORECAST_SLOW_FIT_SECONDS)
+            return result
+        return None
+
+
+def submit(fn: Callable, *args, timeout: float = FORECAST_FIT_TIMEOUT_SECONDS) -> FitJob:
+    """Run fn(*args) in a worker process; fn and args must be picklable. The timeout counts from when the job starts running."""
+    return FitJob(fn, args, timeout)
@@ -1,12 +1,16 @@
 from sqlalchemy.orm import Session
 from app.models.forecast import Forecast
-from typing import Dict, Any
+from app.models.daily_forecast import DailyForecast
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from app import models
+from app.agents import data_agent
 
-def save_forecast(db: Session, summary: Dict[str, Any], horizon: int, scenario: str):
+def save_forecast(db: Session, summary: Dict[str, Any], horizon: int, scenario: str, predictions: Optional[List[Dict[str, Any]]] = None):
+    """Store a forecast run; with predictions, also one DailyForecast row per day for accuracy tracking"""
+    run_timestamp = datetime.utcnow()
     db_forecast = Forecast(
-        run_timestamp=datetime.utcnow(),
+        run_timestamp=run_timestamp,
         horizon_days=horizon,
         scenario=scenario,
         avg_predicted_admissions=summary.get("avg_predicted_admissions"),
@@ -15,6 +19,25 @@ def save_forecast(db: Session, summary: Dict[str, Any], horizon: int, scenario:
         meta=summary
     )
     db.add(db_forecast)
+    db.flush()
+
+    if predictions:
+        engine = summary.get("model_source")
+        data_version = data_agent.get_data_version()
+        for step, prediction in enumerate(predictions, start=1):
+            db.add(DailyForecast(
+                forecast_id=db_forecast.id,
+                run_timestamp=run_timestamp,
+                engine=engine,
+                scenario=scenario,
+                horizon_step=step,
+                horizon_date=datetime.strptime(prediction["date"], "%Y-%m-%d"),
+                inflow_pred=prediction.get("predicted"),
+                inflow_ci_low=prediction.get("confidence_low"),
+                inflow_ci_high=prediction.get("confidence_high"),
+                model_version=data_version
+            ))
+
     db.commit()
     db.refresh(db_forecast)
     return db_forecast
@@ -0,0 +1,105 @@
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
+from app.models.kpi_snapshot import KPISnapshot
+from app.agents import data_agent, forecast_agent, decision_agent
+
+# Recompute at least this often even if the data files did not change
+KPI_MAX_AGE_SECONDS = int(os.getenv("KPI_MAX_AGE_SECONDS", "900"))
+
+_snapshot: Optional[Dict[str, Any]] = None
+_lock = threading.Lock()
+
+
+def compute_kpis() -> Dict[str, Any]:
+    """Compute the Command Center KPIs from the current data files"""
+    data_version = data_agent.get_data_version()
+
+    occupancy_data = data_agent.get_current_occupancy()
+    current_aqi = data_agent.get_current_aqi()
+
+    # Quick forecast for the next 24h
+    feature_df = data_agent.build_feature_frame()
+    forecast_result = forecast_agent.run_forecast(feature_df, horizon_days=1, scenario="baseline")
+    admissions_24h = int(forecast_result["predictions"][0]["predicted"]) if forecast_result["predictions"] else 0
+
+    # Risk score using shared logic
+    risk_calc = decision_agent.calculate_operational_risk_score(
+        aqi_level=current_aqi,
+        current_occupancy_pct=occupancy_data["occupancy_percentage"],
+        forecast_summary=forecast_result["summary"],
+        inventory_df=data_agent.get_current_inventory()
+    )
+
+    return {
+        "occupancy": occupancy_data["occupancy_percentage"],
+        "admissions_24h": admissions_24h,
+        "aqi": current_aqi,
+        "risk_score": risk_calc["score"],
+        "computed_at": datetime.utcnow(),
+        "data_version": data_version
+    }
+
+
+def _is_fresh(snapshot: Optional[Dict[str, Any]], data_version: str) -> bool:
+    if snapshot is None or snapshot["data_version"] != data_version:
+        return False
+    return (datetime.utcnow() - snapshot["computed_at"]).total_seconds() < KPI_MAX_AGE_SECONDS
+
+
+def _save_snapshot(db: Session, snapshot: Dict[str, Any]):
+    row = db.query(KPISnapshot).filter(KPISnapshot.id == 1).first()
+    if not row:
+        row = KPISnapshot(id=1)
+        db.add(row)
+    for key, value in snapshot.items():
+        setattr(row, key, value)
+    db.commit()
+
+
+def _load_snapshot(db: Session) -> Optional[Dict[str, Any]]:
+    row = db.query(KPISnapshot).filter(KPISnapshot.id == 1).first()
+    if not row or row.computed_at is None:
+        return None
+    return {
+        "occupancy": row.occupancy,
+        "admissions_24h": row.admissions_24h,
+        "aqi": row.aqi,
+        "risk_score": row.risk_score,
+        "computed_at": row.computed_at,
+        "data_version": row.data_version
+    }
+
+
+def refresh_snapshot(db: Session, force: bool = False) -> Dict[str, Any]:
+    """
+    Recompute the snapshot if the data changed, it is too old, or force is set.
+    The snapshot is kept in memory and persisted so restarts can reuse it.
+    """
+    global _snapshot
+
+    with _lock:
+        data_version = data_agent.get_data_version()
+        if not force and _is_fresh(_snapshot, data_version):
+            return _snapshot
+
+        if not force and _snapshot is None:
+            stored = _load_snapshot(db)
+            if _is_fresh(stored, data_version):
+                _snapshot = stored
+                return _snapshot
+
+        snapshot = compute_kpis()
+        _save_snapshot(db, snapshot)
+        _snapshot = snapshot
+        return _snapshot
+
+
+def get_snapshot(db: Session, refresh: bool = False) -> Dict[str, Any]:
+    """Current KPI snapshot; only computed here if none exists yet or refresh is requested"""
+    snapshot = _snapshot
+    if snapshot is not None and not refresh:
+        return snapshot
+    return refresh_snapshot(db, force=refresh)
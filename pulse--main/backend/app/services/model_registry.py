@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+import numpy as np
+import pandas as pd
+
+# Fitted Prophet models on disk, one directory per model config:
+#   <MODEL_REGISTRY_DIR>/<config hash>/<data fingerprint>.json  serialized model
+#   <MODEL_REGISTRY_DIR>/<config hash>/index.json               fingerprint -> training metadata
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "app/model_registry")
+
+# Models kept per config (oldest are deleted)
+MAX_MODELS_PER_CONFIG = 5
+
+# Warm start only when at most this many rows were appended since the stored fit
+WARM_START_MAX_APPEND = 60
+
+_lock = threading.Lock()
+
+
+def data_fingerprint(df_train: pd.DataFrame) -> str:
+    """Content hash of training data"""
+    return format(int(pd.util.hash_pandas_object(df_train, index=False).sum()) & (2**64 - 1), "016x")
+
+
+def config_key(config: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _config_dir(config: Dict[str, Any]) -> str:
+    return os.path.join(MODEL_REGISTRY_DIR, config_key(config))
+
+
+def _read_index(config: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(_config_dir(config), "index.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def load(config: Dict[str, Any], fingerprint: str):
+    """Fitted model for this config and training data, or None"""
+    from prophet.serialize import model_from_json
+
+    path = os.path.join(_config_dir(config), f"{fingerprint}.json")
+    try:
+        with open(path) as f:
+            return model_from_json(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable model {path}: {e}")
+        return None
+
+
+def save(config: Dict[str, Any], fingerprint: str, model, df_train: pd.DataFrame):
+    """Store a fitted model and prune old ones"""
+    from prophet.serialize import model_to_json
+
+    directory = _config_dir(config)
+    with _lock:
+        os.makedirs(directory, exist_ok=True)
+        _write_atomic(os.path.join(directory, f"{fingerprint}.json"), model_to_json(model))
+
+        index = _read_index(config)
+        index[fingerprint] = {
+            "saved_at": datetime.utcnow().isoformat(),
+            "rows": len(df_train),
+            "last_ds": str(df_train["ds"].max()),
+            "config": config
+        }
+        for old in sorted(index, key=lambda fp: index[fp]["saved_at"])[:-MAX_MODELS_PER_CONFIG]:
+            index.pop(old)
+            try:
+                os.remove(os.path.join(directory, f"{old}.json"))
+            except FileNotFoundError:
+                pass
+        _write_atomic(os.path.join(directory, "index.json"), json.dumps(index, indent=2))
+
+
+def _stan_init(model) -> Dict[str, Any]:
+    """Parameters of a fitted model in the form Prophet.fit(init=...) expects"""
+    params = {}
+    for name in ["k", "m", "sigma_obs"]:
+        params[name] = float(model.params[name][0][0]) if model.mcmc_samples == 0 else float(np.mean(model.params[name]))
+    for name in ["delta", "beta"]:
+        params[name] = model.params[name][0] if model.mcmc_samples == 0 else np.mean(model.params[name], axis=0)
+    return params
+
+
+def _prefix_model(config: Dict[str, Any], df_train: pd.DataFrame, max_append: int):
+    """Newest stored fit whose training data is a prefix of df_train with at most max_append rows appended"""
+    index = _read_index(config)
+    for fingerprint in sorted(index, key=lambda fp: index[fp]["rows"], reverse=True):
+        rows = index[fingerprint]["rows"]
+        if rows > len(df_train) or len(df_train) - rows > max_append:
+            continue
+        if data_fingerprint(df_train.iloc[:rows]) != fingerprint:
+            continue
+        model = load(config, fingerprint)
+        if model is not None:
+            return model
+    return None
+
+
+def warm_start_params(config: Dict[str, Any], df_train: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """
+    Initial parameters from the newest stored fit whose training data is a
+    prefix of df_train with at most WARM_START_MAX_APPEND rows appended.
+    """
+    model = _prefix_model(config, df_train, WARM_START_MAX_APPEND)
+    return None if model is None else _stan_init(model)
+
+
+def reusable_model(config: Dict[str, Any], df_train: pd.DataFrame, max_append: int):
+    """
+    Stored fit to keep predicting with after at most max_append rows were
+    appended to its training data, instead of refitting. None if there is none.
+    """
+    return _prefix_model(config, df_train, max_append)
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import app.models  # noqa: F401  registers every table
+from app.core.database import Base
+from app.models.daily_forecast import DailyForecast, ForecastRetrain
+from app.services import accuracy_service
+
+START = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _feature_df(days=40, admissions=50.0):
+    return pd.DataFrame({"date": [START + timedelta(days=i) for i in range(days)], "admissions_count": admissions})
+
+
+def _forecast(db, engine, origin_day, predicted, steps=7, run_timestamp=None):
+    """Forecast rows made at START + origin_day, on that day's data, for the next steps days"""
+    for step in range(1, steps + 1):
+        db.add(DailyForecast(
+            engine=engine, scenario="baseline", horizon_step=step,
+            horizon_date=START + timedelta(days=origin_day + step),
+            run_timestamp=run_timestamp or START + timedelta(days=origin_day),
+            inflow_pred=predicted, model_version=f"data-{origin_day}"
+        ))
+    db.commit()
+
+
+def test_update_actuals_is_incremental(db):
+    _forecast(db, "gbm", 35, 55.0)  # days 36-42; data ends at day 39
+    assert accuracy_service.update_actuals(db, _feature_df()) == 4
+    scored = db.query(DailyForecast).filter(DailyForecast.actual.isnot(None)).all()
+    assert {row.abs_error for row in scored} == {5.0}
+    assert db.query(DailyForecast).filter(DailyForecast.actual.is_(None)).count() == 3
+    # Nothing new arrived
+    assert accuracy_service.update_actuals(db, _feature_df()) == 0
+    assert accuracy_service.update_actuals(db, _feature_df(days=45)) == 3
+
+
+def test_rolling_errors_per_engine_and_step(db):
+    _forecast(db, "gbm", 10, 60.0, steps=2)
+    _forecast(db, "gbm", 11, 40.0, steps=2)
+    _forecast(db, "multi_series", 10, 52.0, steps=1)
+    accuracy_service.update_actuals(db, _feature_df())
+    df = accuracy_service._evaluated(db, START, START + timedelta(days=40))
+    stats = {(s["engine"], s["horizon_step"]): s for s in accuracy_service.rolling_errors(df)}
+    assert stats[("gbm", 1)] == {"engine": "gbm", "horizon_step": 1, "count": 2, "mae": 10.0, "mape": 20.0, "bias": 0.0}
+    assert stats[("multi_series", 1)]["bias"] == 2.0
+    assert accuracy_service.rolling_errors(df.iloc[:0]) == []
+
+
+def test_repeated_runs_on_the_same_data_count_once(db):
+    _forecast(db, "gbm", 10, 60.0, steps=2)
+    # Run again by hand three times on the same data, then once more on the next day's
+    for hour in range(1, 4):
+        _forecast(db, "gbm", 10, 60.0, steps=2, run_timestamp=START + timedelta(days=10, hours=hour))
+    _forecast(db, "gbm", 11, 40.0, steps=2)
+    accuracy_service.update_actuals(db, _feature_df())
+    df = accuracy_service._evaluated(db, START, START + timedelta(days=40))
+    assert len(df) == 4
+    assert df[df['model_version'] == "data-10"]['run_timestamp'].max() == START + timedelta(days=10, hours=3)
+    stats = {(s["engine"], s["horizon_step"]): s for s in accuracy_service.rolling_errors(df)}
+    assert stats[("gbm", 1)]["count"] == 2 and stats[("gbm", 1)]["bias"] == 0.0
+
+
+def _rows(errors, days):
+    return pd.DataFrame({
+        "horizon_step": 1,
+        "horizon_date": [START + timedelta(days=i % days) for i in range(len(errors))],
+        "abs_error": errors
+    })
+
+
+def test_drift_against_backtest(monkeypatch):
+    monkeypatch.setattr(accuracy_service.forecast_agent, "reference_errors", lambda engine, df: np.array([4.0, 6.0]))
+    status = accuracy_service._drift("gbm", _rows([10.0] * 7, 7), _rows([], 1), None)
+    assert status["basis"] == "backtest"
+    assert status["ratio"] == 2.5
+    assert status["drifted"]
+    # Too few evaluated days to judge
+    assert not accuracy_service._drift("gbm", _rows([10.0] * 7, 3), _rows([], 1), None)["drifted"]
+
+
+def test_drift_against_previous_window(monkeypatch):
+    monkeypatch.setattr(accuracy_service.forecast_agent, "reference_errors", lambda engine, df: None)
+    status = accuracy_service._drift("prophet", _rows([6.0] * 7, 7), _rows([5.0] * 7, 7), None)
+    assert status["basis"] == "previous_window"
+    assert not status["drifted"]
+    status = accuracy_service._drift("prophet", _rows([6.0] * 7, 7), _rows([], 1), None)
+    assert status["expected_mae"] is None and not status["drifted"]
+
+
+def test_evaluate_retrains_once_and_persists_it(db, monkeypatch):
+    retrained = []
+    monkeypatch.setattr(accuracy_service.data_agent, "build_feature_frame", lambda: _feature_df())
+    monkeypatch.setattr(accuracy_service.forecast_agent, "reference_errors", lambda engine, df: np.array([2.0]))
+    monkeypatch.setattr(accuracy_service.forecast_agent, "retrain", lambda engine, df: retrained.append(engine))
+    for origin in range(20, 30):
+        _forecast(db, "gbm", origin, 60.0)
+        _forecast(db, "multi_series", origin, 60.0)
+
+    result = accuracy_service.evaluate(db)
+    # multi_series refits with every data version, so its drift is only reported
+    assert retrained == ["gbm"] and result["retrained"] == ["gbm"]
+    assert {d["engine"] for d in result["drift"] if d["drifted"]} == {"gbm", "multi_series"}
+    assert db.query(ForecastRetrain).count() == 2
+
+    # Forecasts made before the stored retrain no longer count
+    accuracy_service.evaluate(db)
+    assert retrained == ["gbm"]
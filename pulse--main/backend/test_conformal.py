@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from app.agents import conformal
+
+
+@pytest.fixture(autouse=True)
+def window(monkeypatch):
+    # One score per origin and step keeps the quantile arithmetic readable
+    monkeypatch.setattr(conformal, "STEP_WINDOW", 0)
+    conformal._store.clear()
+
+
+def test_finite_sample_quantile():
+    # 19 origins with |residuals| 1..19 at a single step
+    conformal.record("fourier", "v1", np.arange(1, 20, dtype=float)[:, None])
+    # ceil(20 * 0.8) = 16th smallest
+    widths, achieved = conformal.half_widths("fourier", "v1", 1, 0.8)
+    assert widths[0] == 16
+    assert achieved == 0.8
+    widths, achieved = conformal.half_widths("fourier", "v1", 1, 0.9)
+    assert widths[0] == 18
+    assert achieved == 0.9
+
+
+def test_coverage_capped_with_few_scores():
+    conformal.record("fourier", "v1", np.arange(1, 20, dtype=float)[:, None])
+    # ceil(20 * 0.99) = 20 > 19 scores: largest score, which only guarantees 19/20
+    widths, achieved = conformal.half_widths("fourier", "v1", 1, 0.99)
+    assert widths[0] == 19
+    assert achieved == pytest.approx(0.95)
+
+
+def test_steps_past_backtest_reuse_last_step():
+    residuals = np.column_stack([np.full(9, 1.0), np.full(9, -3.0)])
+    conformal.record("fourier", "v1", residuals)
+    widths, _ = conformal.half_widths("fourier", "v1", 4, 0.8)
+    assert list(widths) == [1.0, 3.0, 3.0, 3.0]
+
+
+def test_bands_are_non_negative():
+    conformal.record("fourier", "v1", np.full((9, 1), 5.0))
+    low, high, _ = conformal.bands("fourier", "v1", np.array([2.0, 10.0]), 0.8)
+    assert list(low) == [0.0, 5.0]
+    assert list(high) == [7.0, 15.0]
+
+
+def test_newer_version_replaces_older():
+    conformal.record("fourier", "v1", np.ones((9, 1)))
+    conformal.record("fourier", "v2", np.ones((9, 1)))
+    assert not conformal.has("fourier", "v1")
+    assert conformal.half_widths("fourier", "v1", 1) is None
+
+
+def test_validate_coverage():
+    assert conformal.validate_coverage(None) == conformal.DEFAULT_COVERAGE
+    assert conformal.validate_coverage(1.5) == conformal.MAX_COVERAGE
+    assert conformal.validate_coverage(0.1) == conformal.MIN_COVERAGE
@@ -0,0 +1,117 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from app.agents import ensemble
+
+
+def test_weights_inverse_mae():
+    weights = ensemble._weights({"fourier": 2.0, "linear_trend": 4.0, "seasonal_naive": 4.0})
+    assert weights["fourier"] == pytest.approx(0.5)
+    assert weights["linear_trend"] == pytest.approx(0.25)
+    assert sum(weights.values()) == pytest.approx(1.0)
+
+
+def test_zero_mae_does_not_divide_by_zero():
+    weights = ensemble._weights({"fourier": 0.0, "linear_trend": 1.0})
+    assert weights["fourier"] > 0.99
+
+
+@pytest.fixture
+def members(monkeypatch):
+    """Members forecasting constants; prophet unavailable, seasonal_naive failing"""
+    forecasts = {"fourier": 10.0, "linear_trend": 20.0}
+    backtest = {"weights": {"fourier": 0.6, "linear_trend": 0.2, "seasonal_naive": 0.2}, "mae": {}, "residuals": {}, "actuals": None, "folds": 4}
+
+    def member(name, feature_df, horizon_days, projection):
+        if name == "prophet":
+            raise ensemble.MemberUnavailable("no prophet")
+        if name == "seasonal_naive":
+            raise RuntimeError("boom")
+        return np.full(horizon_days, forecasts[name])
+
+    monkeypatch.setattr(ensemble, "_production_member", member)
+    monkeypatch.setattr(ensemble, "ready_backtest", lambda feature_df: backtest)
+
+
+def test_combine_renormalizes_over_finished_members(members):
+    result = ensemble.combine(pd.DataFrame(), 3, pd.DataFrame())
+    # fourier 0.6 and linear_trend 0.2 renormalized to 0.75 / 0.25
+    assert np.allclose(result["forecast"], 0.75 * 10 + 0.25 * 20)
+    statuses = {m["engine"]: m["status"] for m in result["members"]}
+    assert statuses == {"prophet": "unavailable", "fourier": "ok", "linear_trend": "ok", "seasonal_naive": "failed"}
+
+
+def _feature_df(days=120):
+    start = datetime(2024, 1, 1)
+    return pd.DataFrame({"date": [start + timedelta(days=i) for i in range(days)], "admissions_count": 50.0})
+
+
+@pytest.fixture
+def slow_prophet(monkeypatch):
+    """Backtest state reset; Prophet's backtest blocks until released, the other members are instant"""
+    release = threading.Event()
+
+    def member_forecasts(name, data):
+        if name == "prophet":
+            release.wait(10)
+        value = {"prophet": 51.0, "fourier": 52.0, "linear_trend": 54.0, "seasonal_naive": 58.0}[name]
+        return np.full((len(data["folds"]), ensemble.BACKTEST_HORIZON), value)
+
+    monkeypatch.setattr(ensemble.regressors, "project", lambda feature_df, horizon_days: pd.DataFrame())
+    monkeypatch.setattr(ensemble, "_member_forecasts", member_forecasts)
+    monkeypatch.setattr(ensemble, "_production_member", lambda name, feature_df, horizon_days, projection: np.full(horizon_days, 10.0))
+    monkeypatch.setattr(ensemble, "_backtests", {})
+    monkeypatch.setattr(ensemble, "_prior_weights", {})
+    yield release
+    release.set()
+
+
+def test_combine_does_not_wait_for_the_backtest(slow_prophet):
+    feature_df = _feature_df()
+    started = time.monotonic()
+    result = ensemble.combine(feature_df, 3, pd.DataFrame())
+    assert time.monotonic() - started < 2
+    assert result["backtest"] is None and result["weighting"] == "equal"
+    assert {m["weight"] for m in result["members"]} == {0.25}
+
+    slow_prophet.set()
+    backtest = ensemble.get_backtest(feature_df)
+    result = ensemble.combine(feature_df, 3, pd.DataFrame())
+    assert result["weighting"] == "backtest" and result["backtest"] is backtest
+    weights = {m["engine"]: m["weight"] for m in result["members"]}
+    assert weights["prophet"] > weights["fourier"] > weights["seasonal_naive"]
+
+
+def test_combine_uses_prior_weights_while_a_new_backtest_runs(slow_prophet):
+    slow_prophet.set()
+    ensemble.get_backtest(_feature_df())
+    slow_prophet.clear()
+
+    result = ensemble.combine(_feature_df(121), 3, pd.DataFrame())
+    assert result["weighting"] == "prior"
+    weights = {m["engine"]: m["weight"] for m in result["members"]}
+    assert weights["prophet"] > weights["seasonal_naive"]
+
+    # Let the background backtest of the new version finish
+    slow_prophet.set()
+    assert ensemble.get_backtest(_feature_df(121))["folds"] == ensemble.BACKTEST_FOLDS
+
+
+def test_cheap_member_residuals_do_not_wait_for_prophet(slow_prophet):
+    feature_df = _feature_df()
+    prophet = threading.Thread(target=ensemble.member_residuals, args=(feature_df, "prophet"))
+    prophet.start()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    residuals = ensemble.member_residuals(feature_df, "fourier")
+    assert time.monotonic() - started < 2
+    assert np.allclose(residuals, -2.0)
+    assert ensemble.member_residuals(feature_df, "prophet", compute=False) is None
+
+    slow_prophet.set()
+    prophet.join()
+    assert np.allclose(ensemble.member_residuals(feature_df, "prophet", compute=False), -1.0)
@@ -0,0 +1,56 @@
+import time
+import pytest
+from app.services import forecast_pool
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def _fail():
+    raise ValueError("bad data")
+
+
+@pytest.fixture(autouse=True)
+def pool(monkeypatch):
+    monkeypatch.setattr(forecast_pool, "FORECAST_WORKERS", 4)
+    monkeypatch.setattr(forecast_pool, "_slow_fits", 0)
+    monkeypatch.setattr(forecast_pool, "_open_until", 0.0)
+    monkeypatch.setattr(forecast_pool, "_trial_running", False)
+    yield
+    forecast_pool.shutdown()
+
+
+def test_result():
+    assert forecast_pool.submit(_sleep, 0.1).result() == 0.1
+
+
+def test_timeout_spares_other_jobs():
+    stuck = forecast_pool.submit(_sleep, 5, timeout=1)
+    healthy = [forecast_pool.submit(_sleep, 2, timeout=10) for _ in range(3)]
+    assert stuck.result() is None
+    assert [job.result() for job in healthy] == [2, 2, 2]
+    # Only the stuck job counts towards the breaker
+    assert forecast_pool.breaker_status()["slow_fits"] == 0
+
+
+def test_timeout_counts_from_start(monkeypatch):
+    monkeypatch.setattr(forecast_pool, "FORECAST_WORKERS", 1)
+    first = forecast_pool.submit(_sleep, 1.5, timeout=5)
+    # Queued for 1.5s behind the first job, then runs well within its own timeout
+    queued = forecast_pool.submit(_sleep, 0.5, timeout=1)
+    assert first.result() == 1.5
+    assert queued.result() == 0.5
+
+
+def test_breaker_opens_after_repeated_timeouts():
+    for _ in range(forecast_pool.BREAKER_THRESHOLD):
+        assert forecast_pool.submit(_sleep, 5, timeout=0.5).result() is None
+    assert forecast_pool.breaker_status()["open"]
+    assert not forecast_pool.allow_slow_engine()
+
+
+def test_failed_fit_is_not_slow():
+    assert forecast_pool.submit(_fail).result() is None
+    assert forecast_pool.breaker_status()["slow_fits"] == 0
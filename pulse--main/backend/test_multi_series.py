@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.agents import multi_series
+
+
+def _feature_df(festival_effect=8.0, aqi_effect=10.0, days=400, seed=0):
+    """Synthetic daily components with a known AQI effect on respiratory and festival effect on trauma"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2024-01-01", periods=days, freq="D")
+    aqi = rng.uniform(50, 350, days)
+    festival = rng.random(days) < 0.1
+    excess = np.maximum(0.0, aqi - multi_series.AQI_THRESHOLD) / 100.0
+    respiratory = 20 + aqi_effect * excess + rng.normal(0, 1, days)
+    trauma = 10 + festival_effect * festival + rng.normal(0, 1, days)
+    other = 30 + rng.normal(0, 1, days)
+    return pd.DataFrame({
+        "date": dates,
+        "admissions_count": respiratory + trauma + other,
+        "respiratory_cases": respiratory,
+        "trauma_cases": trauma,
+        "aqi": aqi,
+        "temperature": 25 + rng.normal(0, 3, days),
+        "humidity": 60 + rng.normal(0, 5, days),
+        "is_holiday": festival,
+        "event_name": np.where(festival, "Festival", "None"),
+    })
+
+
+def _coef(model, column, target):
+    return model["coef"][model["columns"].index(column), multi_series.TARGETS.index(target)]
+
+
+def test_effects_only_on_their_component():
+    model = multi_series.fit(_feature_df())
+    assert model["effects"]["aqi_excess"] == pytest.approx(10.0, abs=1.0)
+    assert model["effects"]["festival"] == pytest.approx(8.0, abs=1.0)
+    for target in ["trauma_cases", "other_cases"]:
+        assert _coef(model, "aqi_excess", target) == pytest.approx(0.0, abs=1e-6)
+    for target in ["respiratory_cases", "other_cases"]:
+        assert _coef(model, "festival", target) == pytest.approx(0.0, abs=1e-6)
+
+
+def test_negative_effect_is_dropped():
+    model = multi_series.fit(_feature_df(festival_effect=-5.0))
+    assert model["effects"]["festival"] == 0.0
+    assert model["effects"]["aqi_excess"] > 0
+
+
+def test_predict_scenarios():
+    model = multi_series.fit(_feature_df())
+    clean = multi_series.predict(model, 7, aqi=100.0, festival=0.0)
+    polluted = multi_series.predict(model, 7, aqi=350.0, festival=1.0)
+    assert np.allclose(polluted["respiratory_cases"] - clean["respiratory_cases"], 2.0 * model["effects"]["aqi_excess"])
+    assert np.allclose(polluted["trauma_cases"] - clean["trauma_cases"], model["effects"]["festival"])
+    assert np.allclose(polluted["other_cases"], clean["other_cases"])
+    assert np.allclose(clean["total"], clean["respiratory_cases"] + clean["trauma_cases"] + clean["other_cases"])
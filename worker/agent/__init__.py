@@ -2,6 +2,13 @@
 LangGraph Agent for Predictive Hospital Management
 """
 
-from .graph import create_agent_graph
-
 __all__ = ["create_agent_graph"]
+
+
+def __getattr__(name):
+    # Import the graph (and langgraph) only when it is actually used, so
+    # lightweight modules such as agent.llm stay cheap to import.
+    if name == "create_agent_graph":
+        from .graph import create_agent_graph
+        return create_agent_graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
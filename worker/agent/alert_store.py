@@ -0,0 +1,227 @@
+"""
+Bulk alert persistence with deduplication
+
+All alerts of a run are written with one bulk upsert and one bulk UPDATE.
+An alert whose stable key (hospital, type, subject, horizon) matches an open
+alert updates that alert instead of adding a new row. If its severity is
+unchanged and the open alert was seen within the suppression window, only the
+alert's ``ts`` is refreshed, so ``ts`` is when the condition was last seen
+and a persisting condition stays suppressed. Volatile numbers live in the
+message and ``action_json``, not in the title or severity.
+
+The alerts table has a unique index on ``dedup_key`` over open alerts, and
+new alerts are inserted with ``ON CONFLICT DO UPDATE``: concurrent runs for
+the same hospital end up with a single open alert per key. The run's recommendations are stored once in a content-addressed
+RecommendationSet that the alerts reference.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_SUPPRESSION_SECONDS = float(os.getenv("WORKER_ALERT_SUPPRESSION", str(12 * 3600)))
+
+SEVERITY_RANK = {"LOW": 0, "MEDIUM": 1, "HIGH": 2, "CRITICAL": 3}
+
+# Predicate of the unique partial index on alerts.dedup_key
+OPEN_ALERT_PREDICATE = "status = 'open'"
+
+
+def alert_key(hospital_id: int, alert: Dict[str, Any]) -> str:
+    """
+    Stable identity of an alert across runs
+
+    The subject distinguishes alerts of the same type (department, festival
+    or disease); volatile parts such as timestamps and percentages are left
+    out so the same condition maps to the same key every run.
+    """
+    metrics = alert.get("metrics", {})
+    subject = (
+        metrics.get("department_id")
+        or metrics.get("festival_name")
+        or metrics.get("disease")
+        or ""
+    )
+    return f"{hospital_id}:{alert.get('type', 'alert')}:{subject}:{alert.get('horizon_days', '')}"
+
+
+def _upsert(db, models, rows: List[Dict[str, Any]]) -> None:
+    """Insert new open alerts, updating the open alert with the same key if one appeared meanwhile"""
+    from sqlalchemy import insert, text
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        db.execute(insert(models.Alert), rows)
+        return
+
+    statement = insert(models.Alert)
+    statement = statement.on_conflict_do_update(
+        index_elements=["dedup_key"],
+        index_where=text(OPEN_ALERT_PREDICATE),
+        set_={
+            column: statement.excluded[column]
+            for column in ("severity", "title", "message", "action_json", "ts", "recommendation_set_id")
+        }
+    )
+    db.execute(statement, rows)
+
+
+def _store_recommendations(db, models, hospital_id: int, recommendations: List[Dict[str, Any]]) -> Optional[int]:
+    """Insert the recommendation set unless an identical one exists; return its id"""
+    from sqlalchemy import select, insert
+    from sqlalchemy.exc import IntegrityError
+
+    if not recommendations:
+        return None
+
+    payload = json.dumps(recommendations, sort_keys=True, default=str)
+    digest = hashlib.sha256(f"{hospital_id}:{payload}".encode("utf-8")).hexdigest()
+
+    existing = db.execute(
+        select(models.RecommendationSet.id).where(models.RecommendationSet.digest == digest)
+    ).scalar()
+    if existing is not None:
+        return existing
+
+    try:
+        with db.begin_nested():
+            return db.execute(
+                insert(models.RecommendationSet)
+                .values(
+                    hospital_id=hospital_id,
+                    digest=digest,
+                    recommendations_json=json.loads(payload),
+                    ts=datetime.utcnow()
+                )
+                .returning(models.RecommendationSet.id)
+            ).scalar()
+    except IntegrityError:
+        # Stored concurrently by another run
+        return db.execute(
+            select(models.RecommendationSet.id).where(models.RecommendationSet.digest == digest)
+        ).scalar()
+
+
+def persist_alerts(
+    db,
+    models,
+    hospital_id: int,
+    alerts: List[Dict[str, Any]],
+    recommendations: List[Dict[str, Any]],
+    suppression_seconds: float = DEFAULT_SUPPRESSION_SECONDS
+) -> Dict[str, Any]:
+    """
+    Write the alerts of one run (caller commits)
+
+    Args:
+        db: Open SQLAlchemy session
+        models: Module with the ORM models (app.app.models)
+        hospital_id: Hospital the run was for
+        alerts: Alerts from the agent state
+        recommendations: Recommendations from the agent state
+        suppression_seconds: How long after it was last seen an open alert absorbs repeats
+
+    Returns:
+        Counts of inserted/updated/suppressed alerts and the alerts that are
+        new or escalated (the ones worth notifying about)
+    """
+    from sqlalchemy import select, update
+
+    now = datetime.utcnow()
+    recommendation_set_id = _store_recommendations(db, models, hospital_id, recommendations)
+
+    # Collapse duplicates within the run, keeping the most severe
+    by_key: Dict[str, Dict[str, Any]] = {}
+    for alert in alerts:
+        key = alert_key(hospital_id, alert)
+        severity = alert.get("severity", "medium").upper()
+        current = by_key.get(key)
+        if current is None or SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(current["severity"].upper(), 0):
+            by_key[key] = alert
+
+    # One query for all matching open alerts
+    open_alerts = {}
+    if by_key:
+        Alert = models.Alert
+        rows = db.execute(
+            select(Alert.id, Alert.dedup_key, Alert.severity, Alert.ts)
+            .where(
+                Alert.hospital_id == hospital_id,
+                Alert.status == "open",
+                Alert.dedup_key.in_(list(by_key))
+            )
+            .order_by(Alert.ts.desc())
+        ).all()
+        for alert_id, key, severity, ts in rows:
+            open_alerts.setdefault(key, (alert_id, severity, ts))
+    window_start = now - timedelta(seconds=suppression_seconds)
+
+    inserts, updates, seen, notify = [], [], [], []
+    for key, alert in by_key.items():
+        severity = alert.get("severity", "medium").upper()
+        title = alert.get("title", "Alert")
+        action_json = {
+            "metrics": alert.get("metrics", {}),
+            "type": alert.get("type"),
+            "horizon_days": alert.get("horizon_days"),
+            "recommendation_set_id": recommendation_set_id
+        }
+
+        existing = open_alerts.get(key)
+        if existing is None:
+            inserts.append({
+                "hospital_id": hospital_id,
+                "severity": severity,
+                "title": title,
+                "message": alert.get("message", ""),
+                "action_json": action_json,
+                "status": "open",
+                "ts": now,
+                "dedup_key": key,
+                "recommendation_set_id": recommendation_set_id
+            })
+            notify.append(alert)
+            continue
+
+        alert_id, old_severity, last_seen = existing
+        old_severity = (old_severity or "").upper()
+        recent = last_seen is not None and last_seen >= window_start
+        if severity == old_severity and recent:
+            seen.append({"id": alert_id, "ts": now})
+            continue
+
+        updates.append({
+            "id": alert_id,
+            "severity": severity,
+            "title": title,
+            "message": alert.get("message", ""),
+            "action_json": action_json,
+            "ts": now,
+            "recommendation_set_id": recommendation_set_id
+        })
+        # Escalated, or back after going quiet for the whole window
+        if not recent or SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(old_severity, 0):
+            notify.append(alert)
+
+    if inserts:
+        _upsert(db, models, inserts)
+    if updates:
+        # ORM bulk UPDATE by primary key: one executemany statement
+        db.execute(update(models.Alert), updates)
+    if seen:
+        db.execute(update(models.Alert), seen)
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "suppressed": len(seen) + (len(alerts) - len(by_key)),
+        "recommendation_set_id": recommendation_set_id,
+        "notify": notify
+    }
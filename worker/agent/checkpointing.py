@@ -0,0 +1,147 @@
+"""
+Checkpointing for resumable agent runs
+
+Every node's output is checkpointed to a local SQLite database keyed by
+thread id ``"<hospital_id>:<run_id>"``. A run that crashed or timed out is
+resumed from its last completed node instead of repeating the LLM nodes,
+and a finished run can be replayed from any node after an input changed.
+
+Set WORKER_CHECKPOINT_DB to a path (default: output/checkpoints.sqlite), or
+to ``off`` to disable checkpointing.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Tuple
+
+
+DEFAULT_CHECKPOINT_DB = os.path.join(os.path.dirname(__file__), "..", "output", "checkpoints.sqlite")
+DEFAULT_RETENTION_SECONDS = float(os.getenv("WORKER_CHECKPOINT_RETENTION", str(48 * 3600)))
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class PickleSerializer:
+    """Checkpoint serializer for state values JSON can't express (NumPy series, datetimes)"""
+
+    def dumps(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return "pickle", self.dumps(obj)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self.loads(data[1])
+
+
+def thread_id_for(hospital_id: Any, run_id: str) -> str:
+    """Checkpoint thread id of a run"""
+    return f"{hospital_id}:{run_id}"
+
+
+def _make_saver(saver_cls, conn):
+    class WorkerSqliteSaver(saver_cls):
+        """SqliteSaver that keeps only node names in the checkpoint metadata
+
+        LangGraph records each step's writes (here: the full state) in the
+        JSON metadata, which can't hold InflowSeries and would duplicate the
+        pickled checkpoint anyway.
+        """
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            writes = metadata.get("writes")
+            if isinstance(writes, dict):
+                metadata = {**metadata, "writes": {node: None for node in writes}}
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    return WorkerSqliteSaver(conn, serde=PickleSerializer())
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def get_checkpointer():
+    """
+    Get the process-wide SQLite checkpointer
+
+    Returns:
+        SqliteSaver, or None when checkpointing is disabled or unavailable
+    """
+    global _checkpointer
+
+    path = os.getenv("WORKER_CHECKPOINT_DB", DEFAULT_CHECKPOINT_DB)
+    if path.lower() in ("", "off", "none", "0"):
+        return None
+
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                try:
+                    from langgraph.checkpoint.sqlite import SqliteSaver
+                except ImportError:
+                    print("⚠️ langgraph-checkpoint-sqlite not installed, runs are not resumable")
+                    return None
+
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                conn = sqlite3.connect(path, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS run_threads (thread_id TEXT PRIMARY KEY, created REAL NOT NULL)"
+                )
+                conn.commit()
+                saver = _make_saver(SqliteSaver, conn)
+                saver.setup()
+                _checkpointer = saver
+
+    return _checkpointer
+
+
+def register_thread(thread_id: str) -> None:
+    """Record when a run thread was first used (for pruning)"""
+    saver = get_checkpointer()
+    if saver is None:
+        return
+    with saver.lock:
+        saver.conn.execute(
+            "INSERT OR IGNORE INTO run_threads (thread_id, created) VALUES (?, ?)",
+            (thread_id, time.time())
+        )
+        saver.conn.commit()
+
+
+def prune_checkpoints(retention_seconds: float = DEFAULT_RETENTION_SECONDS, force: bool = False) -> int:
+    """
+    Delete checkpoints of runs older than ``retention_seconds``
+
+    Runs at most once per PRUNE_INTERVAL_SECONDS unless ``force`` is set.
+
+    Returns:
+        Number of run threads removed
+    """
+    global _last_prune
+
+    saver = get_checkpointer()
+    if saver is None:
+        return 0
+
+    now = time.time()
+    if not force and now - _last_prune < PRUNE_INTERVAL_SECONDS:
+        return 0
+    _last_prune = now
+
+    cutoff = now - retention_seconds
+    with saver.lock:
+        conn = saver.conn
+        old = "SELECT thread_id FROM run_threads WHERE created < ?"
+        conn.execute(f"DELETE FROM checkpoints WHERE thread_id IN ({old})", (cutoff,))
+        conn.execute(f"DELETE FROM writes WHERE thread_id IN ({old})", (cutoff,))
+        removed = conn.execute("DELETE FROM run_threads WHERE created < ?", (cutoff,)).rowcount
+        conn.commit()
+    return removed
@@ -0,0 +1,391 @@
+"""
+JSON-constrained decoding for the local LLM
+
+Provides a character-level JSON prefix validator that can be driven by a
+simple per-node schema, plus a logits processor and stopping criterion that
+plug into ``model.generate``. The processor only lets through tokens that
+keep the answer a valid JSON prefix, and the stopping criterion ends
+generation as soon as the top-level value closes.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+
+# Parser modes
+_VALUE = 0          # expecting the start of a value
+_OBJ_KEY_OR_END = 1  # just after '{'
+_OBJ_KEY = 2         # after ',' inside an object
+_COLON = 3           # after an object key
+_OBJ_NEXT = 4        # after a value inside an object
+_ARR_VALUE_OR_END = 5  # just after '['
+_ARR_NEXT = 6        # after a value inside an array
+_STRING = 7
+_NUMBER = 8
+_LITERAL = 9
+_DONE = 10
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789+-.eE"
+_ESCAPE_CHARS = '"\\/bfnrtu'
+_HEX_CHARS = "0123456789abcdefABCDEF"
+# Text that can still grow into a JSON number, and a finished one
+_NUMBER_PREFIX = re.compile(r"-?(?:0|[1-9][0-9]*)?(?:(?<=[0-9])\.[0-9]*)?(?:(?<=[0-9])[eE][+-]?[0-9]*)?")
+_NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+_LITERALS = ("true", "false", "null")
+
+# First characters allowed for each schema type
+_TYPE_START_CHARS = {
+    "boolean": "tf",
+    "integer": "-0123456789",
+    "number": "-0123456789",
+    "float": "-0123456789",
+    "string": '"',
+    "null": "n",
+    "array": "[",
+    "object": "{",
+}
+
+
+def _allowed_start_chars(type_spec: Optional[str]) -> Optional[str]:
+    """Return the characters a value of ``type_spec`` may start with (None = any)"""
+    if not type_spec:
+        return None
+    chars = ""
+    for part in type_spec.split("|"):
+        part_chars = _TYPE_START_CHARS.get(part.strip())
+        if part_chars is None:
+            return None
+        chars += part_chars
+    return chars
+
+
+class JSONPrefixValidator:
+    """
+    Incremental validator for JSON text
+
+    Feed characters with ``feed``; it returns False as soon as the text can
+    no longer be completed into valid JSON (or violates the schema). The
+    optional schema maps top-level keys to type names such as ``"boolean"``,
+    ``"float"`` or ``"string|null"``: only those keys may be emitted, each
+    value must start like its declared type and the object may only close
+    once every key is present.
+    """
+
+    __slots__ = (
+        "schema", "mode", "stack", "key_chars", "is_key",
+        "escape", "hex_left", "number", "literal", "literal_pos", "seen_keys", "value_type",
+    )
+
+    def __init__(self, schema: Optional[Dict[str, str]] = None):
+        self.schema = schema
+        self.mode = _VALUE
+        self.stack: List[str] = []
+        self.key_chars: List[str] = []
+        self.is_key = False
+        self.escape = False
+        self.hex_left = 0
+        self.number = ""
+        self.literal = ""
+        self.literal_pos = 0
+        self.seen_keys: set = set()
+        self.value_type: Optional[str] = None
+
+    def copy(self) -> "JSONPrefixValidator":
+        """Cheap copy used to test candidate continuations"""
+        clone = JSONPrefixValidator.__new__(JSONPrefixValidator)
+        clone.schema = self.schema
+        clone.mode = self.mode
+        clone.stack = list(self.stack)
+        clone.key_chars = list(self.key_chars)
+        clone.is_key = self.is_key
+        clone.escape = self.escape
+        clone.hex_left = self.hex_left
+        clone.number = self.number
+        clone.literal = self.literal
+        clone.literal_pos = self.literal_pos
+        clone.seen_keys = set(self.seen_keys)
+        clone.value_type = self.value_type
+        return clone
+
+    @property
+    def complete(self) -> bool:
+        """True once the top-level value has been closed"""
+        return self.mode == _DONE
+
+    @property
+    def _at_top_object(self) -> bool:
+        return self.schema is not None and len(self.stack) == 1 and self.stack[0] == "{"
+
+    def feed(self, text: str) -> bool:
+        """Consume ``text``; return False if it breaks the JSON prefix"""
+        for char in text:
+            if not self._feed_char(char):
+                return False
+        return True
+
+    def _after_value(self) -> None:
+        if not self.stack:
+            self.mode = _DONE
+        elif self.stack[-1] == "{":
+            self.mode = _OBJ_NEXT
+        else:
+            self.mode = _ARR_NEXT
+
+    def _start_value(self, char: str) -> bool:
+        # The top-level value must be an object or array
+        if not self.stack:
+            if char not in "{[" or (self.schema is not None and char != "{"):
+                return False
+        elif self._at_top_object and self.value_type:
+            allowed = _allowed_start_chars(self.value_type)
+            if allowed is not None and char not in allowed:
+                return False
+
+        if char == "{":
+            self.stack.append("{")
+            self.mode = _OBJ_KEY_OR_END
+        elif char == "[":
+            self.stack.append("[")
+            self.mode = _ARR_VALUE_OR_END
+        elif char == '"':
+            self.mode = _STRING
+            self.is_key = False
+        elif char in "-0123456789":
+            self.mode = _NUMBER
+            self.number = char
+        elif char in "tfn":
+            self.literal = next(lit for lit in _LITERALS if lit[0] == char)
+            self.literal_pos = 1
+            self.mode = _LITERAL
+        else:
+            return False
+        return True
+
+    def _close_object(self) -> bool:
+        if self._at_top_object and set(self.schema) - self.seen_keys:
+            return False
+        self.stack.pop()
+        self._after_value()
+        return True
+
+    def _feed_char(self, char: str) -> bool:
+        mode = self.mode
+
+        if mode == _DONE:
+            return char in _WHITESPACE
+
+        if mode == _STRING:
+            if self.hex_left:
+                self.hex_left -= 1
+                return char in _HEX_CHARS
+            if self.escape:
+                self.escape = False
+                if char == "u":
+                    self.hex_left = 4
+                return char in _ESCAPE_CHARS
+            if char == "\\":
+                self.escape = True
+                return True
+            if char == '"':
+                if self.is_key:
+                    return self._finish_key()
+                self._after_value()
+                return True
+            if char < " ":
+                return False
+            if self.is_key:
+                self.key_chars.append(char)
+                if self._at_top_object:
+                    prefix = "".join(self.key_chars)
+                    remaining = set(self.schema) - self.seen_keys
+                    if not any(key.startswith(prefix) for key in remaining):
+                        return False
+            return True
+
+        if mode == _NUMBER:
+            if char in _NUMBER_CHARS:
+                self.number += char
+                return _NUMBER_PREFIX.fullmatch(self.number) is not None
+            # Number ended; it must be complete before the delimiter is re-processed
+            if _NUMBER.fullmatch(self.number) is None:
+                return False
+            self._after_value()
+            return self._feed_char(char)
+
+        if mode == _LITERAL:
+            if self.literal_pos < len(self.literal) and char == self.literal[self.literal_pos]:
+                self.literal_pos += 1
+                if self.literal_pos == len(self.literal):
+                    self._after_value()
+                return True
+            return False
+
+        if char in _WHITESPACE:
+            return True
+
+        if mode == _VALUE:
+            return self._start_value(char)
+
+        if mode == _OBJ_KEY_OR_END:
+            if char == "}":
+                return self._close_object()
+            return self._start_key(char)
+
+        if mode == _OBJ_KEY:
+            return self._start_key(char)
+
+        if mode == _COLON:
+            if char == ":":
+                self.mode = _VALUE
+                return True
+            return False
+
+        if mode == _OBJ_NEXT:
+            if char == ",":
+                self.mode = _OBJ_KEY
+                return True
+            if char == "}":
+                return self._close_object()
+            return False
+
+        if mode == _ARR_VALUE_OR_END:
+            if char == "]":
+                self.stack.pop()
+                self._after_value()
+                return True
+            return self._start_value(char)
+
+        if mode == _ARR_NEXT:
+            if char == ",":
+                self.mode = _VALUE
+                return True
+            if char == "]":
+                self.stack.pop()
+                self._after_value()
+                return True
+            return False
+
+        return False
+
+    def _start_key(self, char: str) -> bool:
+        if char != '"':
+            return False
+        self.mode = _STRING
+        self.is_key = True
+        self.key_chars = []
+        return True
+
+    def _finish_key(self) -> bool:
+        key = "".join(self.key_chars)
+        self.is_key = False
+        self.mode = _COLON
+        if self._at_top_object:
+            if key not in self.schema or key in self.seen_keys:
+                return False
+            self.seen_keys.add(key)
+            self.value_type = self.schema[key]
+        return True
+
+
+class JSONConstraint:
+    """
+    Shared decoding state for one constrained generation
+
+    Tracks the generated tokens, skipping the thinking section when
+    ``think_end_token_id`` is given, and keeps a ``JSONPrefixValidator`` in
+    sync with the answer text.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        prompt_length: int,
+        schema: Optional[Dict[str, str]] = None,
+        think_end_token_id: Optional[int] = None,
+        top_k: int = 64
+    ):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.think_end_token_id = think_end_token_id
+        self.top_k = top_k
+        self.validator = JSONPrefixValidator(schema)
+        self.active = think_end_token_id is None
+        self.violated = False
+        self._consumed = prompt_length
+        self._token_text: Dict[int, str] = {}
+
+    def token_text(self, token_id: int) -> str:
+        """Decode a single token (memoized)"""
+        text = self._token_text.get(token_id)
+        if text is None:
+            text = self.tokenizer.decode([token_id], skip_special_tokens=True)
+            self._token_text[token_id] = text
+        return text
+
+    def sync(self, input_ids: torch.LongTensor) -> None:
+        """Advance the validator over tokens generated since the last call"""
+        sequence = input_ids[0].tolist()
+        for token_id in sequence[self._consumed:]:
+            if not self.active:
+                if token_id == self.think_end_token_id:
+                    self.active = True
+                continue
+            if not self.validator.feed(self.token_text(token_id)):
+                self.violated = True
+        self._consumed = len(sequence)
+
+
+class JSONLogitsProcessor(LogitsProcessor):
+    """Masks every candidate token that would break the JSON prefix"""
+
+    def __init__(self, constraint: JSONConstraint, eos_token_id: Optional[Any] = None):
+        self.constraint = constraint
+        if eos_token_id is None:
+            self.eos_token_ids = set()
+        elif isinstance(eos_token_id, (list, tuple, set)):
+            self.eos_token_ids = set(eos_token_id)
+        else:
+            self.eos_token_ids = {eos_token_id}
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        constraint = self.constraint
+        constraint.sync(input_ids)
+        if not constraint.active or constraint.violated:
+            return scores
+
+        k = min(constraint.top_k, scores.shape[-1])
+        candidates = torch.topk(scores[0], k).indices.tolist()
+
+        allowed = []
+        for token_id in candidates:
+            if token_id in self.eos_token_ids:
+                if constraint.validator.complete:
+                    allowed.append(token_id)
+                continue
+            text = constraint.token_text(token_id)
+            if text and constraint.validator.copy().feed(text):
+                allowed.append(token_id)
+
+        # Nothing in the top-k keeps the JSON valid; leave the model alone
+        if not allowed:
+            return scores
+
+        masked = torch.full_like(scores, float("-inf"))
+        masked[0, allowed] = scores[0, allowed]
+        return masked
+
+
+class JSONStoppingCriteria(StoppingCriteria):
+    """Stops generation the moment the top-level JSON value closes"""
+
+    def __init__(self, constraint: JSONConstraint):
+        self.constraint = constraint
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> Any:
+        self.constraint.sync(input_ids)
+        done = self.constraint.validator.complete
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
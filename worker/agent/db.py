@@ -0,0 +1,186 @@
+"""
+Database access for the worker
+
+One pooled engine per process, shared by every agent run, and a bulk loader
+that fetches the context of many hospitals in a fixed number of set-based
+queries (instead of five queries per hospital).
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Make the API package (app.app) importable when running from the worker dir
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+
+DB_POOL_SIZE = int(os.getenv("WORKER_DB_POOL_SIZE", os.getenv("WORKER_MAX_PARALLEL", "4")))
+DB_MAX_OVERFLOW = int(os.getenv("WORKER_DB_MAX_OVERFLOW", "4"))
+
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Get the process-wide SQLAlchemy engine, creating it on first use
+
+    Returns:
+        Engine with a connection pool sized for the fleet executor
+    """
+    global _engine, _session_factory
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+                from sqlalchemy.orm import sessionmaker
+                from app.app.config import settings
+
+                options = {"future": True, "pool_pre_ping": True}
+                if not settings.DATABASE_URL.startswith("sqlite"):
+                    options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+                engine = create_engine(settings.DATABASE_URL, **options)
+                _session_factory = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+                _engine = engine
+
+    return _engine
+
+
+def get_session_factory():
+    """
+    Get the sessionmaker bound to the shared engine
+
+    Returns:
+        SQLAlchemy session factory
+    """
+    get_engine()
+    return _session_factory
+
+
+def _latest_per_hospital(db, model, columns: list, hospital_ids: List[int]):
+    """Select ``columns`` from the newest row of ``model`` for each hospital"""
+    from sqlalchemy import select, func
+
+    order = (model.ts.desc(), model.id.desc())
+
+    if db.bind.dialect.name == "postgresql":
+        query = (
+            select(model.hospital_id, *columns)
+            .where(model.hospital_id.in_(hospital_ids))
+            .order_by(model.hospital_id, *order)
+            .distinct(model.hospital_id)
+        )
+        return db.execute(query).all()
+
+    rank = func.row_number().over(partition_by=model.hospital_id, order_by=order).label("rank")
+    ranked = (
+        select(model.hospital_id, *columns, rank)
+        .where(model.hospital_id.in_(hospital_ids))
+        .subquery()
+    )
+    query = select(*[c for c in ranked.c if c.name != "rank"]).where(ranked.c.rank == 1)
+    return db.execute(query).all()
+
+
+def load_fleet_context(
+    hospital_ids: List[int],
+    current_date: Optional[datetime] = None,
+    inflow_window_days: int = 60
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Load the agent context for many hospitals at once
+
+    A fixed number of queries, whatever the number of hospitals: hospitals,
+    departments, inflow (new rows only, see agent.inflow_cache), latest
+    resource snapshot and latest context signals. Only the needed columns
+    are selected.
+
+    Args:
+        hospital_ids: Hospitals to load
+        current_date: End of the inflow window (default: now)
+        inflow_window_days: Days of patient inflow history
+
+    Returns:
+        Mapping hospital_id -> {hospital_name, departments, historical_inflow,
+        current_resources, context_signals}; resources/signals are None when
+        the hospital has no rows yet
+    """
+    from sqlalchemy import select
+    from app.app import models as m
+    from .inflow_cache import get_inflow_cache
+    from .timeseries import InflowSeries
+
+    hospital_ids = list(hospital_ids)
+    current_date = current_date or datetime.now()
+
+    contexts = {
+        hospital_id: {
+            "hospital_name": f"Hospital {hospital_id}",
+            "departments": [],
+            "historical_inflow": InflowSeries.empty(),
+            "current_resources": None,
+            "context_signals": None
+        }
+        for hospital_id in hospital_ids
+    }
+    if not hospital_ids:
+        return contexts
+
+    db = get_session_factory()()
+    try:
+        for hospital_id, name in db.execute(
+            select(m.Hospital.id, m.Hospital.name).where(m.Hospital.id.in_(hospital_ids))
+        ):
+            contexts[hospital_id]["hospital_name"] = name
+
+        for hospital_id, department_id, name in db.execute(
+            select(m.Department.hospital_id, m.Department.id, m.Department.name)
+            .where(m.Department.hospital_id.in_(hospital_ids))
+            .order_by(m.Department.hospital_id, m.Department.id)
+        ):
+            contexts[hospital_id]["departments"].append({"id": department_id, "name": name})
+
+        # Inflow comes from the incremental window cache (only new rows are queried)
+        windows = get_inflow_cache().load(db, m, hospital_ids, current_date, inflow_window_days)
+        for hospital_id, window in windows.items():
+            contexts[hospital_id]["historical_inflow"] = InflowSeries.from_window(window)
+
+        resource = m.ResourceSnapshot
+        for hospital_id, beds_total, beds_occupied, icu_total, icu_occupied, staff, supplies in _latest_per_hospital(
+            db, resource,
+            [resource.beds_total, resource.beds_occupied, resource.icu_total,
+             resource.icu_occupied, resource.staff_on_shift, resource.supplies_json],
+            hospital_ids
+        ):
+            contexts[hospital_id]["current_resources"] = {
+                "beds_total": beds_total,
+                "beds_occupied": beds_occupied,
+                "beds_available": beds_total - beds_occupied,
+                "icu_total": icu_total,
+                "icu_occupied": icu_occupied,
+                "icu_available": icu_total - icu_occupied,
+                "staff_on_shift": staff,
+                "supplies": supplies
+            }
+
+        signals = m.ContextSignals
+        for hospital_id, aqi, festival_flag, epidemic_tag, weather in _latest_per_hospital(
+            db, signals,
+            [signals.aqi, signals.festival_flag, signals.epidemic_tag, signals.weather_json],
+            hospital_ids
+        ):
+            contexts[hospital_id]["context_signals"] = {
+                "aqi": aqi,
+                "festival_flag": festival_flag,
+                "epidemic_tag": epidemic_tag,
+                "weather": weather
+            }
+    finally:
+        db.close()
+
+    return contexts
@@ -0,0 +1,159 @@
+"""
+Run and node deadlines for the agent graph
+
+A run carries an absolute deadline in its state (``state["deadline"]``,
+epoch seconds, so it survives checkpoints). Each LLM node gets a share of
+the time that is left, and generation stops when that share runs out or
+the run is cancelled by the fleet executor. The node then raises
+DeadlineExceeded, takes its existing fallback heuristics and is listed in
+``state["degraded_nodes"]``.
+"""
+
+import os
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Optional
+
+
+DEFAULT_RUN_SECONDS = float(os.getenv("WORKER_HOSPITAL_TIMEOUT", "900"))
+
+# Relative share of the remaining time for each LLM node, in graph order
+LLM_NODE_WEIGHTS = [
+    ("analyze_festivals", 1.0),
+    ("analyze_pollution", 1.0),
+    ("analyze_epidemics", 1.0),
+    ("predict_surge", 2.0),
+]
+# Kept back for the nodes after the last LLM call (alerts, recommendations, save)
+TAIL_RESERVE_SECONDS = 5.0
+# Don't start a generation with less time than this
+MIN_GENERATION_SECONDS = 2.0
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a node's time budget runs out before the LLM answered"""
+
+
+class Deadline:
+    """Absolute deadline plus an optional cancellation event"""
+
+    __slots__ = ("at", "cancel_event")
+
+    def __init__(self, at: Optional[float], cancel_event: Optional[threading.Event] = None):
+        self.at = at
+        self.cancel_event = cancel_event
+
+    def remaining(self) -> Optional[float]:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return 0.0
+        return None if self.at is None else self.at - time.time()
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+_run_cancel: ContextVar[Optional[threading.Event]] = ContextVar("pulse_run_cancel", default=None)
+_node_deadline: ContextVar[Optional[Deadline]] = ContextVar("pulse_node_deadline", default=None)
+
+
+def set_run_cancel_event(event: Optional[threading.Event]) -> None:
+    """Attach the executor's cancellation event to the run in this context"""
+    _run_cancel.set(event)
+
+
+def current_deadline() -> Deadline:
+    """Deadline of the running node (unbounded outside the graph)"""
+    return _node_deadline.get() or Deadline(None, _run_cancel.get())
+
+
+def remaining_seconds() -> Optional[float]:
+    """Time left for the running node, or None without a deadline"""
+    return current_deadline().remaining()
+
+
+def check_deadline(minimum: float = MIN_GENERATION_SECONDS) -> Deadline:
+    """
+    Raise DeadlineExceeded unless at least ``minimum`` seconds are left
+
+    Returns:
+        The running node's deadline
+    """
+    deadline = current_deadline()
+    remaining = deadline.remaining()
+    if remaining is not None and remaining < minimum:
+        raise DeadlineExceeded(f"only {max(0.0, remaining):.1f}s left in the node budget")
+    return deadline
+
+
+def node_deadline(name: str, run_deadline: Optional[float], now: Optional[float] = None) -> Optional[float]:
+    """
+    Deadline of one node given the run deadline
+
+    An LLM node gets its weight's share of the time left after the tail
+    reserve, relative to itself and the LLM nodes after it. Other nodes may
+    use whatever is left of the run.
+    """
+    if run_deadline is None:
+        return None
+    now = time.time() if now is None else now
+    names = [node for node, _ in LLM_NODE_WEIGHTS]
+    if name not in names:
+        return run_deadline
+
+    upcoming = LLM_NODE_WEIGHTS[names.index(name):]
+    share = upcoming[0][1] / sum(weight for _, weight in upcoming)
+    available = max(0.0, run_deadline - now - TAIL_RESERVE_SECONDS)
+    return min(run_deadline, now + available * share)
+
+
+def with_deadline(name: str, fn: Callable) -> Callable:
+    """
+    Wrap a graph node so it runs under its share of the run deadline
+
+    Nodes that used their fallback (any ``record_fallback``, including a
+    DeadlineExceeded caught by the node) are appended to
+    ``degraded_nodes`` in the node's output.
+    """
+    from .tracing import current_node_status
+
+    @wraps(fn)
+    def wrapper(state):
+        deadline = Deadline(node_deadline(name, state.get("deadline")), _run_cancel.get())
+        token = _node_deadline.set(deadline)
+        try:
+            result = fn(state)
+        finally:
+            _node_deadline.reset(token)
+
+        if current_node_status() == "fallback":
+            degraded = list(state.get("degraded_nodes") or [])
+            if name not in degraded:
+                degraded.append(name)
+            result["degraded_nodes"] = degraded
+            print(f"⏱️ {name} degraded to its fallback")
+        return result
+
+    return wrapper
+
+
+class DeadlineStoppingCriteria:
+    """
+    ``model.generate`` stopping criterion for a Deadline
+
+    Stops all sequences once the deadline passes or the run is cancelled;
+    ``fired`` tells the caller the answer was cut off.
+    """
+
+    def __init__(self, deadline: Deadline):
+        self.deadline = deadline
+        self.fired = False
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        if not self.fired and self.deadline.expired():
+            self.fired = True
+        return torch.full((input_ids.shape[0],), self.fired, dtype=torch.bool, device=input_ids.device)
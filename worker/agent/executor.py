@@ -0,0 +1,242 @@
+"""
+Fleet Executor - runs the agent for many hospitals with bounded parallelism
+
+The compiled graph is shared by every run, hospitals are processed on a
+long-lived thread pool, and each hospital gets its own deadline so a single
+slow run cannot hold up the whole sweep.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .graph import get_compiled_graph, run_agent, run_id_for
+
+
+DEFAULT_MAX_PARALLEL = int(os.getenv("WORKER_MAX_PARALLEL", "4"))
+DEFAULT_HOSPITAL_TIMEOUT = float(os.getenv("WORKER_HOSPITAL_TIMEOUT", "900"))
+
+# Upper bound on how long the collector sleeps between deadline checks
+_POLL_INTERVAL = 5.0
+
+# Time between a run's graph deadline and the executor's hard deadline
+_GRACE_SECONDS = 30.0
+
+
+class FleetExecutor:
+    """Long-lived executor that runs per-hospital agent workflows concurrently"""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_PARALLEL,
+        hospital_timeout: float = DEFAULT_HOSPITAL_TIMEOUT
+    ):
+        """
+        Initialize the executor
+
+        Args:
+            max_workers: Maximum number of hospitals processed at once
+            hospital_timeout: Per-hospital deadline in seconds
+        """
+        self.max_workers = max(1, max_workers)
+        self.hospital_timeout = hospital_timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pulse-agent")
+
+        # Compile once up front so the first sweep doesn't pay for it
+        get_compiled_graph()
+
+    def _prefetch(self, hospital_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Bulk-load the context of every hospital in the sweep (a fixed number of queries)"""
+        try:
+            from .db import load_fleet_context
+            return load_fleet_context(hospital_ids)
+        except Exception as e:
+            print(f"⚠️ Bulk context load failed ({e}), hospitals will load individually")
+            return {}
+
+    def _run_one(
+        self,
+        hospital_id: int,
+        started: Dict[int, float],
+        context: Optional[Dict[str, Any]],
+        cancel_event: threading.Event,
+        sweep_deadline: Optional[float],
+        fingerprint: Optional[str]
+    ) -> Dict[str, Any]:
+        started[hospital_id] = time.monotonic()
+
+        # The graph's own deadline ends a little before the executor gives up,
+        # so slow nodes degrade to their fallbacks and the run still completes
+        budget = self.hospital_timeout
+        if sweep_deadline is not None:
+            budget = min(budget, sweep_deadline - time.monotonic())
+        budget -= min(_GRACE_SECONDS, 0.1 * self.hospital_timeout)
+
+        return run_agent(
+            hospital_id=hospital_id,
+            prefetched_context=context,
+            run_id=run_id_for(fingerprint),
+            deadline=time.time() + max(0.0, budget),
+            cancel_event=cancel_event
+        )
+
+    def run(
+        self,
+        hospital_ids: Iterable[int],
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        deadline_seconds: Optional[float] = None,
+        fingerprints: Optional[Dict[int, str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Run the agent for every hospital
+
+        Args:
+            hospital_ids: Hospitals to process
+            on_result: Called in the calling thread for every finished hospital
+                (successful or not) as soon as it completes
+            deadline_seconds: Optional overall deadline for the sweep
+            fingerprints: Input fingerprint of each hospital (from the
+                scheduler); part of the run id, so a checkpoint is only
+                resumed on the inputs it was started with
+
+        Returns:
+            (per-hospital outcomes, throughput stats)
+        """
+        hospital_ids = list(hospital_ids)
+        fingerprints = fingerprints or {}
+        sweep_start = time.monotonic()
+        sweep_deadline = sweep_start + deadline_seconds if deadline_seconds else None
+
+        contexts = self._prefetch(hospital_ids)
+
+        started: Dict[int, float] = {}
+        cancel_events = {hospital_id: threading.Event() for hospital_id in hospital_ids}
+        pending = {
+            self._pool.submit(
+                self._run_one, hospital_id, started, contexts.get(hospital_id),
+                cancel_events[hospital_id], sweep_deadline, fingerprints.get(hospital_id)
+            ): hospital_id
+            for hospital_id in hospital_ids
+        }
+        outcomes: List[Dict[str, Any]] = []
+
+        def finish(outcome: Dict[str, Any]) -> None:
+            outcomes.append(outcome)
+            if on_result is not None:
+                try:
+                    on_result(outcome)
+                except Exception as e:
+                    print(f"⚠️ Result handler failed for hospital {outcome['hospital_id']}: {e}")
+
+        while pending:
+            now = time.monotonic()
+
+            # Wake up in time for the nearest per-hospital or sweep deadline
+            wake_times = [started[h] + self.hospital_timeout for h in pending.values() if h in started]
+            if sweep_deadline is not None:
+                wake_times.append(sweep_deadline)
+            timeout = min(wake_times) - now if wake_times else _POLL_INTERVAL
+            timeout = min(max(0.0, timeout), _POLL_INTERVAL)
+
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                hospital_id = pending.pop(future)
+                duration = time.monotonic() - started.get(hospital_id, sweep_start)
+                try:
+                    finish({
+                        "hospital_id": hospital_id,
+                        "status": "ok",
+                        "duration": duration,
+                        "results": future.result(),
+                        "error": None
+                    })
+                except Exception as e:
+                    finish({
+                        "hospital_id": hospital_id,
+                        "status": "error",
+                        "duration": duration,
+                        "results": None,
+                        "error": str(e)
+                    })
+
+            # Abandon runs that are past their deadline
+            now = time.monotonic()
+            sweep_expired = sweep_deadline is not None and now >= sweep_deadline
+            for future, hospital_id in list(pending.items()):
+                run_start = started.get(hospital_id)
+                hospital_expired = run_start is not None and now - run_start >= self.hospital_timeout
+                if hospital_expired or sweep_expired:
+                    # Stops a running generation at the next token and frees the model
+                    cancel_events[hospital_id].set()
+                    future.cancel()
+                    pending.pop(future)
+                    finish({
+                        "hospital_id": hospital_id,
+                        "status": "timeout",
+                        "duration": now - (run_start or now),
+                        "results": None,
+                        "error": "sweep deadline exceeded" if sweep_expired and not hospital_expired else
+                                 f"exceeded {self.hospital_timeout:.0f}s hospital deadline"
+                    })
+
+        stats = self._build_stats(outcomes, time.monotonic() - sweep_start)
+        return outcomes, stats
+
+    def _build_stats(self, outcomes: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+        succeeded = [o for o in outcomes if o["status"] == "ok"]
+        durations = sorted(o["duration"] for o in succeeded)
+        throughput = len(succeeded) / wall_seconds * 3600 if wall_seconds > 0 else 0.0
+
+        return {
+            "hospitals": len(outcomes),
+            "succeeded": len(succeeded),
+            "failed": len([o for o in outcomes if o["status"] == "error"]),
+            "timed_out": len([o for o in outcomes if o["status"] == "timeout"]),
+            "wall_seconds": round(wall_seconds, 2),
+            "avg_run_seconds": round(sum(durations) / len(durations), 2) if durations else 0.0,
+            "p95_run_seconds": round(durations[int(0.95 * (len(durations) - 1))], 2) if durations else 0.0,
+            "hospitals_per_hour": round(throughput, 1),
+            "max_workers": self.max_workers
+        }
+
+    def shutdown(self, wait_for_runs: bool = False) -> None:
+        """Stop the worker threads"""
+        self._pool.shutdown(wait=wait_for_runs, cancel_futures=True)
+
+
+def print_fleet_stats(stats: Dict[str, Any]) -> None:
+    """Print a throughput summary for a fleet sweep"""
+    print("\n" + "="*60)
+    print("📊 FLEET SWEEP SUMMARY")
+    print("="*60)
+    print(f"Hospitals: {stats['hospitals']} "
+          f"(✅ {stats['succeeded']}  ⚠️ {stats['failed']} failed  ⏱️ {stats['timed_out']} timed out)")
+    print(f"Wall time: {stats['wall_seconds']:.1f}s with {stats['max_workers']} workers")
+    print(f"Per hospital: avg {stats['avg_run_seconds']:.1f}s, p95 {stats['p95_run_seconds']:.1f}s")
+    print(f"Throughput: {stats['hospitals_per_hour']:.0f} hospitals/hour")
+    print("="*60)
+
+
+# Shared executor for the long-lived worker process
+_executor: Optional[FleetExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> FleetExecutor:
+    """
+    Get or create the process-wide fleet executor
+
+    Returns:
+        FleetExecutor instance
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = FleetExecutor()
+
+    return _executor
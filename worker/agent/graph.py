@@ -3,9 +3,13 @@ LangGraph Agent Graph Definition
 Orchestrates the predictive analysis workflow
 """
 
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, Optional
 from langgraph.graph import StateGraph, END
 from .state import AgentState
+from .tracing import traced_node, start_run, finish_run
+from .deadline import with_deadline, set_run_cancel_event, DEFAULT_RUN_SECONDS
 from .nodes import (
     load_context_data,
     analyze_festivals,
@@ -18,25 +22,32 @@ from .nodes import (
 )
 
 
-def create_agent_graph():
+def create_agent_graph(checkpointer=None):
     """
     Create the LangGraph agent workflow
     
+    Args:
+        checkpointer: Optional LangGraph checkpointer; with one, every node's
+            output is saved and runs can be resumed or replayed
+    
     Returns:
         Compiled StateGraph
     """
     # Create the graph
     workflow = StateGraph(AgentState)
     
-    # Add nodes
-    workflow.add_node("load_data", load_context_data)
-    workflow.add_node("analyze_festivals", analyze_festivals)
-    workflow.add_node("analyze_pollution", analyze_pollution)
-    workflow.add_node("analyze_epidemics", analyze_epidemics)
-    workflow.add_node("predict_surge", predict_surge)
-    workflow.add_node("generate_alerts", generate_alerts)
-    workflow.add_node("generate_recommendations", generate_recommendations)
-    workflow.add_node("save_results", save_results)
+    # Add nodes (each one traced and run under its share of the deadline)
+    def add_node(name, fn):
+        workflow.add_node(name, traced_node(name, with_deadline(name, fn)))
+    
+    add_node("load_data", load_context_data)
+    add_node("analyze_festivals", analyze_festivals)
+    add_node("analyze_pollution", analyze_pollution)
+    add_node("analyze_epidemics", analyze_epidemics)
+    add_node("predict_surge", predict_surge)
+    add_node("generate_alerts", generate_alerts)
+    add_node("generate_recommendations", generate_recommendations)
+    add_node("save_results", save_results)
     
     # Define the workflow
     workflow.set_entry_point("load_data")
@@ -52,26 +63,135 @@ def create_agent_graph():
     workflow.add_edge("save_results", END)
     
     # Compile the graph
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=checkpointer)
     
     return app
 
 
-def run_agent(hospital_id: int = None, department_id: int = None) -> Dict[str, Any]:
+# Compiled graph shared by every run in this process
+_compiled_graph = None
+_compiled_graph_lock = threading.Lock()
+
+
+def get_compiled_graph():
+    """
+    Get the process-wide compiled graph, compiling it on first use
+    
+    Compiled LangGraph apps are stateless between invocations, so a single
+    instance can serve many (concurrent) runs. Run state lives in the
+    checkpointer (see agent.checkpointing), keyed by thread id.
+    
+    Returns:
+        Compiled StateGraph
+    """
+    global _compiled_graph
+    
+    if _compiled_graph is None:
+        with _compiled_graph_lock:
+            if _compiled_graph is None:
+                from .checkpointing import get_checkpointer
+                _compiled_graph = create_agent_graph(checkpointer=get_checkpointer())
+    
+    return _compiled_graph
+
+
+def _run_config(hospital_id: Any, run_id: str) -> Dict[str, Any]:
+    from .checkpointing import thread_id_for
+    return {"configurable": {"thread_id": thread_id_for(hospital_id, run_id)}}
+
+
+def default_run_id(when=None) -> str:
+    """
+    Run id used when the caller doesn't supply one: the current hour
+
+    A run that crashed is resumed by the next attempt within the same hour;
+    later attempts start over with fresh inputs.
+    """
+    from datetime import datetime
+    return (when or datetime.now()).strftime("%Y%m%d%H")
+
+
+def run_id_for(fingerprint: Optional[str], when=None) -> str:
+    """
+    Run id of a scheduled run: the current hour plus the input fingerprint
+
+    A crashed run is only resumed by an attempt on the same inputs; once the
+    hospital's inputs change, the next run starts over instead of finishing
+    the old checkpoint with stale context.
+    """
+    hour = default_run_id(when)
+    return f"{hour}-{fingerprint[:12]}" if fingerprint else hour
+
+
+# Checkpoint threads with an attempt still running in this process
+_live_threads = set()
+_live_threads_lock = threading.Lock()
+
+
+def _claim_run_id(hospital_id: Any, run_id: str) -> str:
+    """
+    Reserve the run's checkpoint thread, or a fresh one if it is still in use
+
+    A timed-out run can't be killed and keeps writing to its thread, so a
+    retry while it is alive gets its own thread (``<run_id>-2``, ...).
+    """
+    from .checkpointing import thread_id_for
+
+    with _live_threads_lock:
+        candidate, attempt = run_id, 1
+        while thread_id_for(hospital_id, candidate) in _live_threads:
+            attempt += 1
+            candidate = f"{run_id}-{attempt}"
+        _live_threads.add(thread_id_for(hospital_id, candidate))
+    if candidate != run_id:
+        print(f"⚠️ Run {run_id} is still in progress, starting {candidate}")
+    return candidate
+
+
+def _release_run_id(hospital_id: Any, run_id: str) -> None:
+    from .checkpointing import thread_id_for
+
+    with _live_threads_lock:
+        _live_threads.discard(thread_id_for(hospital_id, run_id))
+
+
+def run_agent(
+    hospital_id: int = None,
+    department_id: int = None,
+    prefetched_context: Optional[Dict[str, Any]] = None,
+    run_id: Optional[str] = None,
+    resume: bool = True,
+    deadline: Optional[float] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Dict[str, Any]:
     """
     Run the agent workflow
     
+    With checkpointing enabled, an unfinished run with the same
+    (hospital_id, run_id) is resumed from its last completed node instead
+    of starting over, unless an attempt with that id is still running in
+    this process (then the run gets a fresh id, see ``_claim_run_id``).
+    
     Args:
         hospital_id: Optional hospital ID
         department_id: Optional department ID
+        prefetched_context: Context already loaded by agent.db.load_fleet_context
+            (skips the per-run database queries)
+        run_id: Identifies the run for checkpointing (default: current hour;
+            scheduled runs pass ``run_id_for(fingerprint)``)
+        resume: Resume an unfinished run with the same id if there is one
+        deadline: Epoch seconds by which the run must finish (default: now +
+            WORKER_HOSPITAL_TIMEOUT); nodes out of time use their fallbacks
+        cancel_event: Set by the caller to stop generation immediately
         
     Returns:
         Final state with all results
     """
     from datetime import datetime
     
-    # Create the graph
-    app = create_agent_graph()
+    # Reuse the compiled graph
+    app = get_compiled_graph()
+    deadline = deadline or time.time() + DEFAULT_RUN_SECONDS
     
     # Initial state
     initial_state = {
@@ -80,9 +200,12 @@ def run_agent(hospital_id: int = None, department_id: int = None) -> Dict[str, A
         "current_date": datetime.now(),
         "context_signals": {},
         "historical_inflow": [],
+        "prefetched_context": prefetched_context,
         "festivals": [],
         "pollution": {},
-        "epidemics": []
+        "epidemics": [],
+        "deadline": deadline,
+        "degraded_nodes": []
     }
     
     # Run the workflow
@@ -90,10 +213,90 @@ def run_agent(hospital_id: int = None, department_id: int = None) -> Dict[str, A
     print("🏥 PULSE PREDICTIVE AGENT")
     print("="*60)
     
-    final_state = app.invoke(initial_state)
+    run_id = _claim_run_id(hospital_id, run_id or default_run_id())
+    trace = start_run(hospital_id, run_id)
+    set_run_cancel_event(cancel_event)
+    try:
+        if app.checkpointer is None:
+            final_state = app.invoke(initial_state)
+        else:
+            from .checkpointing import register_thread, prune_checkpoints
+            
+            config = _run_config(hospital_id, run_id)
+            register_thread(config["configurable"]["thread_id"])
+            
+            pending = app.get_state(config).next if resume else ()
+            if pending:
+                print(f"⏯️ Resuming run {run_id} at {', '.join(pending)}")
+                app.update_state(config, {"deadline": deadline})
+                final_state = app.invoke(None, config)
+            else:
+                final_state = app.invoke(initial_state, config)
+            
+            prune_checkpoints()
+    except Exception:
+        finish_run(trace, status="error")
+        raise
+    finally:
+        _release_run_id(hospital_id, run_id)
+    
+    trace_path = finish_run(trace)
+    final_state["trace"] = {**trace.summary(), "path": trace_path}
     
     print("\n" + "="*60)
     print("✅ AGENT WORKFLOW COMPLETE")
     print("="*60)
     
     return final_state
+
+
+def replay_agent(
+    hospital_id: int,
+    run_id: str,
+    updates: Dict[str, Any],
+    as_node: str
+) -> Dict[str, Any]:
+    """
+    Re-run only the nodes downstream of ``as_node`` with changed inputs
+    
+    The checkpointed state of the run is patched with ``updates`` as if
+    ``as_node`` had produced them; the nodes after it are executed again
+    and everything upstream is reused. For example, new context signals
+    applied as "load_data" re-run every analysis, while a corrected surge
+    prediction applied as "predict_surge" only regenerates alerts,
+    recommendations and saved results.
+    
+    Args:
+        hospital_id: Hospital of the run
+        run_id: Id of the checkpointed run
+        updates: State keys to replace
+        as_node: Node whose output the updates stand for
+        
+    Returns:
+        Final state with all results
+    
+    Raises:
+        ValueError: If checkpointing is disabled or the run doesn't exist
+    """
+    app = get_compiled_graph()
+    if app.checkpointer is None:
+        raise ValueError("Replay needs checkpointing (WORKER_CHECKPOINT_DB)")
+    
+    config = _run_config(hospital_id, run_id)
+    if not app.get_state(config).values:
+        raise ValueError(f"No checkpointed run {run_id} for hospital {hospital_id}")
+    
+    print(f"\n🔁 Replaying run {run_id} of hospital {hospital_id} after {as_node}")
+    updates = {"deadline": time.time() + DEFAULT_RUN_SECONDS, **updates}
+    app.update_state(config, updates, as_node=as_node)
+    
+    trace = start_run(hospital_id, run_id)
+    try:
+        final_state = app.invoke(None, config)
+    except Exception:
+        finish_run(trace, status="error")
+        raise
+    
+    trace_path = finish_run(trace)
+    final_state["trace"] = {**trace.summary(), "path": trace_path}
+    return final_state
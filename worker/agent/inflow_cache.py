@@ -0,0 +1,220 @@
+"""
+Incremental patient inflow window cache
+
+The long-lived worker keeps each hospital's inflow window in memory as
+compact NumPy arrays (timestamp, department, count). Later runs only fetch
+rows newer than the last one seen and trim rows that fell out of the window,
+so loading costs are proportional to new data instead of history length.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .tracing import record_cache
+
+
+DEFAULT_WINDOW_DAYS = 60
+# Reload a hospital's full window this often to pick up back-dated rows
+DEFAULT_FULL_REFRESH = float(os.getenv("WORKER_INFLOW_FULL_REFRESH", str(6 * 3600)))
+
+_TS_DTYPE = "datetime64[us]"
+
+
+def _empty_window() -> Dict[str, np.ndarray]:
+    return {
+        "ts": np.empty(0, dtype=_TS_DTYPE),
+        "department_id": np.empty(0, dtype=np.int64),
+        "count": np.empty(0, dtype=np.int64)
+    }
+
+
+def _unseen(window: Dict[str, np.ndarray], new: Dict[str, np.ndarray], last_seen: np.datetime64) -> np.ndarray:
+    """
+    Mask of fetched rows not in the window yet: everything after last_seen,
+    plus rows at last_seen beyond those already cached (counted as a multiset
+    of (department, count), so late rows sharing the timestamp are kept)
+    """
+    keep = new["ts"] > last_seen
+    at_last = np.flatnonzero(new["ts"] == last_seen)
+    if len(at_last):
+        cached = window["ts"] == last_seen
+        seen = Counter(zip(window["department_id"][cached].tolist(), window["count"][cached].tolist()))
+        for i in at_last:
+            row = (int(new["department_id"][i]), int(new["count"][i]))
+            if seen[row]:
+                seen[row] -= 1
+            else:
+                keep[i] = True
+    return keep
+
+
+class InflowWindowCache:
+    """Per-hospital rolling inflow windows, topped up incrementally"""
+
+    def __init__(self, full_refresh_seconds: float = DEFAULT_FULL_REFRESH):
+        """
+        Args:
+            full_refresh_seconds: Age after which a hospital's window is reloaded
+        """
+        self.full_refresh_seconds = full_refresh_seconds
+        self._windows: Dict[int, Dict[str, np.ndarray]] = {}
+        self._window_start: Dict[int, np.datetime64] = {}
+        self._loaded_at: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {"full_loads": 0, "top_ups": 0, "rows_fetched": 0}
+
+    def load(
+        self,
+        db,
+        models,
+        hospital_ids: List[int],
+        current_date: Optional[datetime] = None,
+        window_days: int = DEFAULT_WINDOW_DAYS
+    ) -> Dict[int, Dict[str, np.ndarray]]:
+        """
+        Bring the windows of ``hospital_ids`` up to date and return them
+
+        Hospitals seen before are topped up with a single query for rows at
+        or after each hospital's own last timestamp; new (or expired)
+        hospitals get one full-window query.
+
+        Args:
+            db: Open SQLAlchemy session
+            models: Module with the ORM models (app.app.models)
+            hospital_ids: Hospitals to load
+            current_date: End of the window (default: now)
+            window_days: Window length in days
+
+        Returns:
+            Mapping hospital_id -> {"ts", "department_id", "count"} arrays in
+            ascending time order (shared with the cache; do not modify)
+        """
+        current_date = current_date or datetime.now()
+        start = np.datetime64(current_date - timedelta(days=window_days), "us")
+        now = time.monotonic()
+
+        with self._lock:
+            cold, warm = [], []
+            for hospital_id in hospital_ids:
+                fresh = (
+                    hospital_id in self._windows
+                    and now - self._loaded_at[hospital_id] < self.full_refresh_seconds
+                    and self._window_start[hospital_id] <= start
+                )
+                (warm if fresh else cold).append(hospital_id)
+            record_cache("inflow_window", hits=len(warm), misses=len(cold))
+
+            if cold:
+                fetched = self._fetch(db, models, {hospital_id: start for hospital_id in cold})
+                for hospital_id in cold:
+                    self._windows[hospital_id] = fetched.get(hospital_id, _empty_window())
+                    self._window_start[hospital_id] = start
+                    self._loaded_at[hospital_id] = now
+                self.stats["full_loads"] += len(cold)
+
+            if warm:
+                last_seen = {
+                    hospital_id: self._windows[hospital_id]["ts"][-1]
+                    if len(self._windows[hospital_id]["ts"]) else self._window_start[hospital_id]
+                    for hospital_id in warm
+                }
+                fetched = self._fetch(db, models, last_seen)
+                for hospital_id, new in fetched.items():
+                    window = self._windows[hospital_id]
+                    keep = _unseen(window, new, last_seen[hospital_id])
+                    self._windows[hospital_id] = {
+                        key: np.concatenate([window[key], new[key][keep]]) for key in window
+                    }
+                self.stats["top_ups"] += len(warm)
+
+            result = {}
+            for hospital_id in hospital_ids:
+                window = self._windows[hospital_id]
+                cut = int(np.searchsorted(window["ts"], start, side="left"))
+                if cut:
+                    window = {key: values[cut:] for key, values in window.items()}
+                    self._windows[hospital_id] = window
+                self._window_start[hospital_id] = max(self._window_start[hospital_id], start)
+                result[hospital_id] = window
+
+        return result
+
+    def _fetch(
+        self,
+        db,
+        models,
+        since: Dict[int, np.datetime64]
+    ) -> Dict[int, Dict[str, np.ndarray]]:
+        """Fetch inflow rows at or after each hospital's ``since`` in one query, split per hospital"""
+        from sqlalchemy import and_, or_, select
+
+        inflow = models.PatientInflow
+        # One (hospital_id IN ..., ts >= ...) predicate per distinct start time
+        groups = defaultdict(list)
+        for hospital_id, start in since.items():
+            groups[start].append(hospital_id)
+        ts_filter = or_(*(
+            and_(inflow.hospital_id.in_(ids), inflow.ts >= start.astype(datetime))
+            for start, ids in groups.items()
+        ))
+        rows = db.execute(
+            select(inflow.hospital_id, inflow.ts, inflow.department_id, inflow.count)
+            .where(ts_filter)
+            .order_by(inflow.hospital_id, inflow.ts)
+        ).all()
+        self.stats["rows_fetched"] += len(rows)
+        if not rows:
+            return {}
+
+        hospital_col, ts_col, department_col, count_col = zip(*rows)
+        hospitals = np.array(hospital_col, dtype=np.int64)
+        ts = np.array(ts_col, dtype=_TS_DTYPE)
+        departments = np.array(department_col, dtype=np.int64)
+        counts = np.array(count_col, dtype=np.int64)
+
+        # Rows are sorted by hospital, so each hospital is a contiguous slice
+        ids, starts = np.unique(hospitals, return_index=True)
+        ends = np.append(starts[1:], len(hospitals))
+        return {
+            int(hospital_id): {
+                "ts": ts[lo:hi],
+                "department_id": departments[lo:hi],
+                "count": counts[lo:hi]
+            }
+            for hospital_id, lo, hi in zip(ids, starts, ends)
+        }
+
+    def clear(self) -> None:
+        """Drop all cached windows"""
+        with self._lock:
+            self._windows.clear()
+            self._window_start.clear()
+            self._loaded_at.clear()
+
+
+# Process-wide cache for the long-lived worker
+_cache: Optional[InflowWindowCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_inflow_cache() -> InflowWindowCache:
+    """
+    Get or create the process-wide inflow window cache
+
+    Returns:
+        InflowWindowCache instance
+    """
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = InflowWindowCache()
+
+    return _cache
@@ -0,0 +1,445 @@
+"""
+Distributed job queue for per-hospital agent runs
+
+A producer enqueues one analysis job per hospital; any number of worker
+processes reserve jobs, run the agent and acknowledge them. Reserved jobs
+carry a visibility timeout: if a worker dies, the job becomes visible again
+and is retried, and after ``max_attempts`` it is moved to a dead-letter list.
+Long runs keep their reservation alive with ``heartbeat``.
+A hospital has at most one pending job: a retry is dropped if a newer job
+for the same hospital is already waiting.
+
+Backends:
+- ``RedisJobQueue``: shared Redis (works with any redis-py compatible client,
+  e.g. ``fakeredis.FakeStrictRedis`` for tests)
+- ``InMemoryJobQueue``: in-process stand-in with the same semantics
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", "1200"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+def _new_job(hospital_id: int, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "id": uuid.uuid4().hex,
+        "hospital_id": hospital_id,
+        "payload": payload or {},
+        "enqueued_at": time.time(),
+        "attempts": 0,
+        "last_error": None
+    }
+
+
+class InMemoryJobQueue:
+    """In-process job queue with visibility timeouts, retries and dead-lettering"""
+
+    def __init__(
+        self,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ):
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._pending: deque = deque()
+        self._processing: Dict[str, float] = {}
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._queued_hospitals: set = set()
+        self._dead: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+
+    def enqueue(self, hospital_id: int, payload: Optional[Dict[str, Any]] = None, dedup: bool = True) -> Optional[str]:
+        """
+        Add a job for ``hospital_id``
+
+        Args:
+            hospital_id: Hospital to analyse
+            payload: Extra job parameters
+            dedup: Skip if the hospital already has a job waiting
+
+        Returns:
+            Job id, or None if skipped as a duplicate
+        """
+        with self._cond:
+            if dedup and hospital_id in self._queued_hospitals:
+                return None
+            job = _new_job(hospital_id, payload)
+            self._jobs[job["id"]] = job
+            self._pending.append(job["id"])
+            self._queued_hospitals.add(hospital_id)
+            self._cond.notify()
+            return job["id"]
+
+    def reserve(self, timeout: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        Take the next job, hiding it from other consumers for the visibility timeout
+
+        Args:
+            timeout: Seconds to wait for a job (0 = don't wait)
+
+        Returns:
+            Job dictionary or None
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._requeue_expired_locked()
+                if self._pending:
+                    job_id = self._pending.popleft()
+                    job = self._jobs[job_id]
+                    job["attempts"] += 1
+                    self._queued_hospitals.discard(job["hospital_id"])
+                    self._processing[job_id] = time.time() + self.visibility_timeout
+                    return dict(job)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(min(remaining, 1.0))
+
+    def extend(self, job: Dict[str, Any], seconds: Optional[float] = None) -> bool:
+        """
+        Push back the visibility deadline of a reserved job
+
+        Args:
+            job: Job returned by ``reserve``
+            seconds: New timeout from now (default: the visibility timeout)
+
+        Returns:
+            False if the reservation was already lost (expired, acked or failed)
+        """
+        with self._cond:
+            if job["id"] not in self._processing:
+                return False
+            self._processing[job["id"]] = time.time() + (self.visibility_timeout if seconds is None else seconds)
+            return True
+
+    def ack(self, job: Dict[str, Any]) -> None:
+        """Mark a job as done"""
+        with self._cond:
+            self._processing.pop(job["id"], None)
+            self._jobs.pop(job["id"], None)
+
+    def fail(self, job: Dict[str, Any], error: str) -> None:
+        """Mark a job as failed; it is retried or dead-lettered"""
+        with self._cond:
+            if self._processing.pop(job["id"], None) is None:
+                return
+            stored = self._jobs[job["id"]]
+            stored["last_error"] = error
+            self._retry_or_bury_locked(job["id"])
+
+    def requeue_expired(self) -> int:
+        """Make jobs whose visibility timeout passed available again"""
+        with self._cond:
+            return self._requeue_expired_locked()
+
+    def _requeue_expired_locked(self) -> int:
+        now = time.time()
+        expired = [job_id for job_id, deadline in self._processing.items() if deadline <= now]
+        for job_id in expired:
+            del self._processing[job_id]
+            self._jobs[job_id]["last_error"] = "visibility timeout expired"
+            self._retry_or_bury_locked(job_id)
+        return len(expired)
+
+    def _retry_or_bury_locked(self, job_id: str) -> None:
+        job = self._jobs[job_id]
+        if job["attempts"] >= self.max_attempts:
+            self._dead.append(self._jobs.pop(job_id))
+        elif job["hospital_id"] in self._queued_hospitals:
+            # A newer job for this hospital is already waiting
+            del self._jobs[job_id]
+        else:
+            self._pending.append(job_id)
+            self._queued_hospitals.add(job["hospital_id"])
+            self._cond.notify()
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Jobs that exhausted their attempts (most recent last)"""
+        with self._cond:
+            return [dict(job) for job in self._dead[-limit:]]
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth counters"""
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "processing": len(self._processing),
+                "dead": len(self._dead)
+            }
+
+
+# Claim the hospital's dedup slot and add the job in one step (a dedup'd
+# enqueue returns 0 and writes nothing)
+_ENQUEUE_SCRIPT = """
+if redis.call('SADD', KEYS[1], ARGV[1]) == 0 and ARGV[4] == '1' then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+redis.call('HSET', KEYS[3], ARGV[2], ARGV[1])
+redis.call('LPUSH', KEYS[4], ARGV[2])
+return 1
+"""
+
+# Atomically pop the oldest pending job, register its visibility deadline and
+# free its hospital's dedup slot
+_RESERVE_SCRIPT = """
+local job_id = redis.call('RPOP', KEYS[1])
+if not job_id then return nil end
+redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+local attempts = redis.call('HINCRBY', KEYS[4], job_id, 1)
+local data = redis.call('HGET', KEYS[3], job_id)
+local hospital_id = redis.call('HGET', KEYS[5], job_id)
+if hospital_id then
+    redis.call('SREM', KEYS[6], hospital_id)
+end
+return {job_id, data, attempts}
+"""
+
+# Retry or dead-letter a failed reservation; the retry is dropped if the
+# hospital already has a pending job. Returns 0 if the reservation was lost.
+_FAIL_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then return 0 end
+local hospital_id = redis.call('HGET', KEYS[5], ARGV[1])
+if tonumber(redis.call('HGET', KEYS[4], ARGV[1]) or '0') >= tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+    redis.call('LPUSH', KEYS[7], ARGV[1])
+elseif hospital_id and redis.call('SADD', KEYS[2], hospital_id) == 0 then
+    redis.call('HDEL', KEYS[3], ARGV[1])
+    redis.call('HDEL', KEYS[4], ARGV[1])
+    redis.call('HDEL', KEYS[5], ARGV[1])
+else
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+    redis.call('LPUSH', KEYS[6], ARGV[1])
+end
+return 1
+"""
+
+# Push back a reservation's visibility deadline if it is still held
+_EXTEND_SCRIPT = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then return 0 end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+return 1
+"""
+
+# Move expired reservations back to pending (unless the hospital already has
+# a pending job, in which case the retry is dropped), or to the dead-letter list
+_REQUEUE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, job_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], job_id)
+    local attempts = tonumber(redis.call('HGET', KEYS[4], job_id) or '0')
+    local hospital_id = redis.call('HGET', KEYS[5], job_id)
+    if attempts >= tonumber(ARGV[2]) then
+        redis.call('LPUSH', KEYS[3], job_id)
+    elseif hospital_id and redis.call('SADD', KEYS[6], hospital_id) == 0 then
+        redis.call('HDEL', KEYS[7], job_id)
+        redis.call('HDEL', KEYS[4], job_id)
+        redis.call('HDEL', KEYS[5], job_id)
+    else
+        redis.call('LPUSH', KEYS[2], job_id)
+    end
+end
+return #expired
+"""
+
+
+class RedisJobQueue:
+    """
+    Redis-backed job queue shared by all worker processes
+
+    Keys (under ``namespace``):
+        pending     list of job ids (LPUSH / RPOP, FIFO)
+        processing  sorted set job id -> visibility deadline
+        data        hash job id -> job JSON
+        attempts    hash job id -> reservation count
+        hospitals   hash job id -> hospital id
+        queued      set of hospital ids with a pending job (dedup)
+        dead        list of dead-lettered job ids
+    """
+
+    def __init__(
+        self,
+        client,
+        namespace: str = "pulse:jobs",
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        poll_interval: float = 0.5
+    ):
+        self.client = client
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.keys = {
+            name: f"{namespace}:{name}"
+            for name in ("pending", "processing", "data", "attempts", "hospitals", "queued", "dead")
+        }
+        self._enqueue = client.register_script(_ENQUEUE_SCRIPT)
+        self._reserve = client.register_script(_RESERVE_SCRIPT)
+        self._fail = client.register_script(_FAIL_SCRIPT)
+        self._extend = client.register_script(_EXTEND_SCRIPT)
+        self._requeue = client.register_script(_REQUEUE_SCRIPT)
+
+    @staticmethod
+    def _decode(value) -> Optional[str]:
+        if value is None:
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+    def enqueue(self, hospital_id: int, payload: Optional[Dict[str, Any]] = None, dedup: bool = True) -> Optional[str]:
+        """Add a job for ``hospital_id`` (see InMemoryJobQueue.enqueue)"""
+        job = _new_job(hospital_id, payload)
+        added = self._enqueue(
+            keys=[self.keys["queued"], self.keys["data"], self.keys["hospitals"], self.keys["pending"]],
+            args=[hospital_id, job["id"], json.dumps(job), int(dedup)]
+        )
+        return job["id"] if int(added) else None
+
+    def reserve(self, timeout: float = 0.0) -> Optional[Dict[str, Any]]:
+        """Take the next job (see InMemoryJobQueue.reserve)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self.requeue_expired()
+            result = self._reserve(
+                keys=[
+                    self.keys["pending"], self.keys["processing"], self.keys["data"], self.keys["attempts"],
+                    self.keys["hospitals"], self.keys["queued"]
+                ],
+                args=[time.time() + self.visibility_timeout]
+            )
+            if result:
+                job_id, data, attempts = self._decode(result[0]), self._decode(result[1]), int(result[2])
+                if data is None:
+                    # Acked elsewhere after a redelivery; drop the stale id
+                    self._forget(job_id)
+                    continue
+                job = json.loads(data)
+                job["attempts"] = attempts
+                return job
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def _forget(self, job_id: str) -> None:
+        pipe = self.client.pipeline()
+        pipe.zrem(self.keys["processing"], job_id)
+        pipe.hdel(self.keys["data"], job_id)
+        pipe.hdel(self.keys["attempts"], job_id)
+        pipe.hdel(self.keys["hospitals"], job_id)
+        pipe.execute()
+
+    def extend(self, job: Dict[str, Any], seconds: Optional[float] = None) -> bool:
+        """Push back the visibility deadline of a reserved job (see InMemoryJobQueue.extend)"""
+        timeout = self.visibility_timeout if seconds is None else seconds
+        return bool(int(self._extend(keys=[self.keys["processing"]], args=[job["id"], time.time() + timeout])))
+
+    def ack(self, job: Dict[str, Any]) -> None:
+        """Mark a job as done"""
+        self._forget(job["id"])
+
+    def fail(self, job: Dict[str, Any], error: str) -> None:
+        """Mark a job as failed; it is retried or dead-lettered"""
+        self._fail(
+            keys=[
+                self.keys["processing"], self.keys["queued"], self.keys["data"], self.keys["attempts"],
+                self.keys["hospitals"], self.keys["pending"], self.keys["dead"]
+            ],
+            args=[job["id"], json.dumps(dict(job, last_error=error)), self.max_attempts]
+        )
+
+    def requeue_expired(self) -> int:
+        """Make jobs whose visibility timeout passed available again"""
+        return int(self._requeue(
+            keys=[
+                self.keys["processing"], self.keys["pending"], self.keys["dead"], self.keys["attempts"],
+                self.keys["hospitals"], self.keys["queued"], self.keys["data"]
+            ],
+            args=[time.time(), self.max_attempts]
+        ))
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Jobs that exhausted their attempts (most recent last)"""
+        job_ids = [self._decode(j) for j in self.client.lrange(self.keys["dead"], 0, limit - 1)]
+        if not job_ids:
+            return []
+        jobs = []
+        for job_id, data in zip(reversed(job_ids), self.client.hmget(self.keys["data"], list(reversed(job_ids)))):
+            if data is not None:
+                jobs.append(json.loads(self._decode(data)))
+        return jobs
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth counters"""
+        pipe = self.client.pipeline()
+        pipe.llen(self.keys["pending"])
+        pipe.zcard(self.keys["processing"])
+        pipe.llen(self.keys["dead"])
+        pending, processing, dead = pipe.execute()
+        return {"pending": pending, "processing": processing, "dead": dead}
+
+
+@contextmanager
+def heartbeat(queue, job: Dict[str, Any], interval: Optional[float] = None):
+    """
+    Keep a reserved job invisible to other consumers while the block runs
+
+    Extends the reservation every ``interval`` seconds (a third of the
+    visibility timeout by default) so long runs aren't redelivered while
+    still in progress; a consumer that dies stops extending and the job
+    becomes visible again as usual.
+    """
+    interval = queue.visibility_timeout / 3 if interval is None else interval
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            if not queue.extend(job):
+                print(f"⚠️ Job {job['id'][:8]} lost its reservation")
+                return
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job['id'][:8]}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+# Process-wide queue instance
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    Get or create the job queue selected by JOB_QUEUE_BACKEND
+
+    ``redis`` (default) connects to REDIS_URL; ``memory`` uses the
+    in-process stand-in (single process only).
+    """
+    global _queue
+
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                backend = os.getenv("JOB_QUEUE_BACKEND", "redis").lower()
+                if backend == "memory":
+                    _queue = InMemoryJobQueue()
+                elif backend == "redis":
+                    import redis
+                    client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+                    _queue = RedisJobQueue(client)
+                else:
+                    raise ValueError(f"Unknown JOB_QUEUE_BACKEND '{backend}'")
+
+    return _queue
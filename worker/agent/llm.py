@@ -1,17 +1,154 @@
 """
 LLM Integration using Qwen3-32B with thinking mode
+
+Backends are pluggable through a small registry:
+
+- ``hf``: local HuggingFace model (Qwen3-32B by default)
+- ``openai``: any OpenAI-compatible chat completions endpoint (vLLM, TGI, ...)
+- ``stub``: deterministic, dependency-free backend for tests and mock runs
+
+The ML stack (``torch``/``transformers``) is only imported when the ``hf``
+backend is actually instantiated, so importing the agent stays cheap.
 """
 
 import os
 import json
-from typing import Dict, Any, Optional
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
+import time
+import threading
+import importlib.util
+from typing import Dict, Any, Optional, Callable
+
+from .tracing import record_generation, record_event
+from .deadline import DeadlineExceeded, DeadlineStoppingCriteria, check_deadline
+
+
+# Qwen3 token that closes the <think> section
+THINK_END_TOKEN_ID = 151668
+
+# Registered LLM backends (name -> factory)
+_BACKENDS: Dict[str, Callable[..., "BaseLLM"]] = {}
+
+
+def register_backend(name: str):
+    """
+    Register an LLM backend class under ``name``
+    
+    Args:
+        name: Value selected through the LLM_BACKEND environment variable
+    """
+    def decorator(cls):
+        _BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def available_backends() -> list:
+    """Names of the registered LLM backends"""
+    return sorted(_BACKENDS)
+
+
+class BaseLLM:
+    """Common interface shared by all LLM backends"""
+    
+    backend_name = "base"
+    
+    def generate(
+        self,
+        prompt: str,
+        max_new_tokens: int = 4096,
+        enable_thinking: bool = True,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        return_thinking: bool = False,
+        json_schema: Optional[Dict[str, str]] = None,
+        constrain_json: bool = False
+    ) -> Dict[str, str]:
+        """Generate a response; returns 'content' and optionally 'thinking'"""
+        raise NotImplementedError
+    
+    def generate_json(
+        self,
+        prompt: str,
+        max_new_tokens: int = 4096,
+        enable_thinking: bool = True,
+        return_thinking: bool = False,
+        schema: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate JSON response from the LLM
+        
+        Decoding is constrained to valid JSON (shaped by ``schema`` when
+        given) and stops as soon as the top-level value is closed.
+        
+        Args:
+            prompt: The input prompt (should request JSON output)
+            max_new_tokens: Maximum tokens to generate
+            enable_thinking: Whether to enable thinking mode
+            return_thinking: Whether to return thinking content
+            schema: Expected top-level keys and their types (see prompts.py)
+            
+        Returns:
+            Dictionary with parsed JSON in 'data' key and optionally 'thinking'
+        """
+        response = self.generate(
+            prompt=prompt,
+            max_new_tokens=max_new_tokens,
+            enable_thinking=enable_thinking,
+            temperature=0.3,  # Lower temperature for structured output
+            return_thinking=return_thinking,
+            json_schema=schema,
+            constrain_json=True
+        )
+        
+        content = response["content"]
+        
+        # Parse JSON from content
+        parsed_data = self._parse_json_response(content)
+        
+        result = {"data": parsed_data}
+        if "thinking" in response:
+            result["thinking"] = response["thinking"]
+        
+        return result
+    
+    def _parse_json_response(self, response: str) -> Dict[str, Any]:
+        """
+        Parse JSON from LLM response, handling markdown code blocks
+        
+        Args:
+            response: Raw LLM response
+            
+        Returns:
+            Parsed JSON dictionary
+        """
+        # Remove markdown code blocks if present
+        response = response.strip()
+        
+        if response.startswith("```json"):
+            response = response[7:]
+        elif response.startswith("```"):
+            response = response[3:]
+        
+        if response.endswith("```"):
+            response = response[:-3]
+        
+        response = response.strip()
+        
+        try:
+            return json.loads(response)
+        except json.JSONDecodeError as e:
+            record_event("llm_json_parse_failure")
+            print(f"⚠️ Failed to parse JSON response: {e}")
+            print(f"Response was: {response[:200]}...")
+            return {}
 
 
-class QwenLLM:
+@register_backend("hf")
+class QwenLLM(BaseLLM):
     """Qwen3-32B LLM wrapper with thinking mode support"""
     
+    backend_name = "hf"
+    
     def __init__(self, model_name: str = "Qwen/Qwen3-32B"):
         """
         Initialize the Qwen LLM
@@ -19,6 +156,8 @@ class QwenLLM:
         Args:
             model_name: HuggingFace model identifier
         """
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        
         print(f"🤖 Loading {model_name}...")
         self.model_name = model_name
         
@@ -33,6 +172,9 @@ class QwenLLM:
         )
         
         print(f"✅ Model loaded successfully on device: {self.model.device}")
+        
+        # A single local model serves one generation at a time
+        self._generate_lock = threading.Lock()
     
     def generate(
         self,
@@ -41,7 +183,9 @@ class QwenLLM:
         enable_thinking: bool = True,
         temperature: float = 0.7,
         top_p: float = 0.9,
-        return_thinking: bool = False
+        return_thinking: bool = False,
+        json_schema: Optional[Dict[str, str]] = None,
+        constrain_json: bool = False
     ) -> Dict[str, str]:
         """
         Generate response from the LLM
@@ -53,10 +197,17 @@ class QwenLLM:
             temperature: Sampling temperature
             top_p: Nucleus sampling parameter
             return_thinking: Whether to return thinking content separately
+            json_schema: Optional top-level key -> type map for constrained output
+            constrain_json: Constrain the answer to valid JSON and stop as soon
+                as the top-level value closes
             
         Returns:
             Dictionary with 'content' and optionally 'thinking' keys
         """
+        import torch
+        from transformers import LogitsProcessorList, StoppingCriteriaList
+        from .constrained_decoding import JSONConstraint, JSONLogitsProcessor, JSONStoppingCriteria
+        
         # Prepare messages in chat format
         messages = [
             {"role": "user", "content": prompt}
@@ -73,15 +224,37 @@ class QwenLLM:
         # Tokenize input
         model_inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
         
-        # Generate response
-        with torch.no_grad():
+        # Stop when the node's time budget runs out or the run is cancelled
+        deadline_criteria = DeadlineStoppingCriteria(check_deadline())
+        stopping_criteria = StoppingCriteriaList([deadline_criteria])
+        
+        # JSON constraint: only active after </think> when thinking is on
+        generate_kwargs = {"stopping_criteria": stopping_criteria}
+        if constrain_json or json_schema is not None:
+            constraint = JSONConstraint(
+                self.tokenizer,
+                prompt_length=model_inputs.input_ids.shape[1],
+                schema=json_schema,
+                think_end_token_id=THINK_END_TOKEN_ID if enable_thinking else None
+            )
+            generate_kwargs["logits_processor"] = LogitsProcessorList([
+                JSONLogitsProcessor(constraint, eos_token_id=self.tokenizer.eos_token_id)
+            ])
+            stopping_criteria.append(JSONStoppingCriteria(constraint))
+        
+        # Generate response (timed without the wait for the model lock)
+        with self._generate_lock, torch.no_grad():
+            check_deadline()  # the wait for the lock may have used up the budget
+            started = time.perf_counter()
             generated_ids = self.model.generate(
                 **model_inputs,
                 max_new_tokens=max_new_tokens,
                 temperature=temperature,
                 top_p=top_p,
-                do_sample=True if temperature > 0 else False
+                do_sample=True if temperature > 0 else False,
+                **generate_kwargs
             )
+            seconds = time.perf_counter() - started
         
         # Extract only the new tokens (remove input)
         output_ids = generated_ids[0][len(model_inputs.input_ids[0]):].tolist()
@@ -89,11 +262,13 @@ class QwenLLM:
         # Parse thinking content if enabled
         thinking_content = ""
         content = ""
+        thinking_tokens = 0
         
         if enable_thinking:
             try:
-                # Find the </think> token (151668)
-                index = len(output_ids) - output_ids[::-1].index(151668)
+                # Find the </think> token
+                index = len(output_ids) - output_ids[::-1].index(THINK_END_TOKEN_ID)
+                thinking_tokens = index
                 
                 # Decode thinking and content separately
                 thinking_content = self.tokenizer.decode(
@@ -118,97 +293,210 @@ class QwenLLM:
                 skip_special_tokens=True
             ).strip("\n")
         
+        record_generation(
+            backend=self.backend_name,
+            seconds=seconds,
+            prompt_tokens=int(model_inputs.input_ids.shape[1]),
+            generated_tokens=len(output_ids),
+            thinking_tokens=thinking_tokens,
+            enable_thinking=enable_thinking,
+            max_new_tokens=max_new_tokens
+        )
+        
+        if deadline_criteria.fired:
+            raise DeadlineExceeded(f"generation stopped after {len(output_ids)} tokens ({seconds:.1f}s)")
+        
         result = {"content": content}
         if return_thinking and thinking_content:
             result["thinking"] = thinking_content
         
         return result
+
+
+@register_backend("openai")
+class OpenAICompatibleLLM(BaseLLM):
+    """Client for an OpenAI-compatible chat completions endpoint (e.g. vLLM)"""
     
-    def generate_json(
+    backend_name = "openai"
+    
+    def __init__(
         self,
-        prompt: str,
-        max_new_tokens: int = 4096,
-        enable_thinking: bool = True,
-        return_thinking: bool = False
-    ) -> Dict[str, Any]:
+        model_name: str = "Qwen/Qwen3-32B",
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        timeout: float = 300.0
+    ):
         """
-        Generate JSON response from the LLM
+        Initialize the HTTP client
         
         Args:
-            prompt: The input prompt (should request JSON output)
-            max_new_tokens: Maximum tokens to generate
-            enable_thinking: Whether to enable thinking mode
-            return_thinking: Whether to return thinking content
-            
-        Returns:
-            Dictionary with parsed JSON in 'data' key and optionally 'thinking'
+            model_name: Model identifier served by the endpoint
+            base_url: API base URL (defaults to LLM_API_BASE)
+            api_key: Bearer token (defaults to LLM_API_KEY / OPENAI_API_KEY)
+            timeout: Request timeout in seconds
         """
-        response = self.generate(
-            prompt=prompt,
-            max_new_tokens=max_new_tokens,
-            enable_thinking=enable_thinking,
-            temperature=0.3,  # Lower temperature for structured output
-            return_thinking=return_thinking
-        )
-        
-        content = response["content"]
-        
-        # Parse JSON from content
-        parsed_data = self._parse_json_response(content)
-        
-        result = {"data": parsed_data}
-        if "thinking" in response:
-            result["thinking"] = response["thinking"]
+        import httpx
         
-        return result
+        self.model_name = model_name
+        self.timeout = timeout
+        self.base_url = (base_url or os.getenv("LLM_API_BASE", "http://localhost:8001/v1")).rstrip("/")
+        api_key = api_key or os.getenv("LLM_API_KEY") or os.getenv("OPENAI_API_KEY", "")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.Client(base_url=self.base_url, headers=headers, timeout=timeout)
+        print(f"🤖 Using {model_name} via {self.base_url}")
     
-    def _parse_json_response(self, response: str) -> Dict[str, Any]:
-        """
-        Parse JSON from LLM response, handling markdown code blocks
+    def generate(
+        self,
+        prompt: str,
+        max_new_tokens: int = 4096,
+        enable_thinking: bool = True,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        return_thinking: bool = False,
+        json_schema: Optional[Dict[str, str]] = None,
+        constrain_json: bool = False
+    ) -> Dict[str, str]:
+        """Generate a response through the chat completions API"""
+        import httpx
         
-        Args:
-            response: Raw LLM response
-            
-        Returns:
-            Parsed JSON dictionary
-        """
-        # Remove markdown code blocks if present
-        response = response.strip()
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_new_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+            # Honoured by vLLM/SGLang for Qwen3 chat templates
+            "chat_template_kwargs": {"enable_thinking": enable_thinking}
+        }
+        if json_schema is not None:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "node_output", "schema": _to_json_schema(json_schema)}
+            }
+        elif constrain_json:
+            payload["response_format"] = {"type": "json_object"}
         
-        if response.startswith("```json"):
-            response = response[7:]
-        elif response.startswith("```"):
-            response = response[3:]
+        # The request may take at most the node's remaining time budget
+        remaining = check_deadline().remaining()
+        timeout = self.timeout if remaining is None else min(remaining, self.timeout)
         
-        if response.endswith("```"):
-            response = response[:-3]
+        started = time.perf_counter()
+        try:
+            response = self.client.post("/chat/completions", json=payload, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise DeadlineExceeded(f"request timed out after {time.perf_counter() - started:.1f}s") from e
+        response.raise_for_status()
+        body = response.json()
+        message = body["choices"][0]["message"]
         
-        response = response.strip()
+        # Reasoning and cached-prompt details are reported by vLLM/OpenAI when available
+        usage = body.get("usage") or {}
+        record_generation(
+            backend=self.backend_name,
+            seconds=time.perf_counter() - started,
+            prompt_tokens=usage.get("prompt_tokens") or 0,
+            generated_tokens=usage.get("completion_tokens") or 0,
+            thinking_tokens=(usage.get("completion_tokens_details") or {}).get("reasoning_tokens") or 0,
+            cached_prompt_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens"),
+            enable_thinking=enable_thinking,
+            max_new_tokens=max_new_tokens
+        )
         
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError as e:
-            print(f"⚠️ Failed to parse JSON response: {e}")
-            print(f"Response was: {response[:200]}...")
-            return {}
+        result = {"content": (message.get("content") or "").strip("\n")}
+        thinking = message.get("reasoning_content")
+        if return_thinking and thinking:
+            result["thinking"] = thinking
+        return result
+
+
+@register_backend("stub")
+class StubLLM(BaseLLM):
+    """
+    Deterministic offline backend
+    
+    Returns empty payloads so every node falls back to its built-in
+    defaults. Used for tests, mock-data runs and machines without a model.
+    """
+    
+    backend_name = "stub"
+    
+    def __init__(self, model_name: str = "stub"):
+        self.model_name = model_name
+    
+    def generate(self, prompt: str, return_thinking: bool = False, **kwargs) -> Dict[str, str]:
+        result = {"content": ""}
+        if return_thinking:
+            result["thinking"] = ""
+        return result
+    
+    def generate_json(self, prompt: str, return_thinking: bool = False, **kwargs) -> Dict[str, Any]:
+        result = {"data": {}}
+        if return_thinking:
+            result["thinking"] = ""
+        return result
+
+
+_JSON_SCHEMA_TYPES = {
+    "boolean": "boolean",
+    "integer": "integer",
+    "number": "number",
+    "float": "number",
+    "string": "string",
+    "null": "null",
+    "array": "array",
+    "object": "object",
+}
+
+
+def _to_json_schema(schema: Dict[str, str]) -> Dict[str, Any]:
+    """Convert a prompts.py key -> type map into a JSON Schema object"""
+    properties = {}
+    for key, type_spec in schema.items():
+        types = [_JSON_SCHEMA_TYPES.get(t.strip(), "string") for t in type_spec.split("|")]
+        properties[key] = {"type": types[0] if len(types) == 1 else types}
+    return {"type": "object", "properties": properties, "required": list(schema)}
+
+
+def default_backend() -> str:
+    """
+    Pick the LLM backend from the environment
+    
+    LLM_BACKEND wins when set. Otherwise an OpenAI-compatible endpoint is used
+    if LLM_API_BASE is configured, the local HF model if torch/transformers
+    are installed, and the stub as a last resort.
+    """
+    backend = os.getenv("LLM_BACKEND", "").strip().lower()
+    if backend:
+        return backend
+    if os.getenv("LLM_API_BASE"):
+        return "openai"
+    if importlib.util.find_spec("transformers") and importlib.util.find_spec("torch"):
+        return "hf"
+    return "stub"
 
 
 # Global LLM instance (singleton pattern)
-_llm_instance: Optional[QwenLLM] = None
+_llm_instance: Optional[BaseLLM] = None
+_llm_lock = threading.Lock()
 
 
-def get_llm() -> QwenLLM:
+def get_llm() -> BaseLLM:
     """
     Get or create the global LLM instance
     
     Returns:
-        QwenLLM instance
+        Instance of the backend selected by ``default_backend``
     """
     global _llm_instance
     
     if _llm_instance is None:
-        model_name = os.getenv("LLM_MODEL_NAME", "Qwen/Qwen3-32B")
-        _llm_instance = QwenLLM(model_name=model_name)
+        with _llm_lock:
+            if _llm_instance is None:
+                backend = default_backend()
+                if backend not in _BACKENDS:
+                    raise ValueError(f"Unknown LLM_BACKEND '{backend}' (available: {', '.join(available_backends())})")
+                model_name = os.getenv("LLM_MODEL_NAME", "Qwen/Qwen3-32B")
+                _llm_instance = _BACKENDS[backend](model_name=model_name)
     
     return _llm_instance
 
@@ -0,0 +1,279 @@
+"""
+Adaptive thinking-mode and token-budget policy for the LLM nodes
+
+Thinking tokens dominate generation time, but most runs ask the same
+low-stakes questions as the previous hour. Before each call a node asks the
+policy whether to think and how many tokens to allow:
+
+- stakes: how much the node's answer moves the final prediction
+- risk: how unusual the node's inputs are (high AQI, active festival, ...)
+- novelty: whether this input combination was answered successfully before
+- deadline: how much of the node's time budget is left
+
+After the call the node reports whether the answer parsed and was
+plausible. The policy keeps per-node success rates, token usage and decode
+speed, turns thinking back on for nodes whose non-thinking answers fail, and
+sizes budgets from the tokens the node actually needs.
+
+WORKER_LLM_POLICY=fixed restores the previous behaviour (always thinking,
+2048 tokens).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .deadline import remaining_seconds as node_remaining_seconds
+from .tracing import last_generation, record_event
+
+
+THINKING_BUDGET = 2048
+NON_THINKING_BUDGET = 512
+MIN_BUDGET = 128
+MAX_BUDGET = 4096
+
+# How much each node's answer matters (0 low, 1 medium, 2 high)
+NODE_STAKES = {
+    "analyze_festivals": 0,
+    "analyze_pollution": 0,
+    "analyze_epidemics": 1,
+    "predict_surge": 2,
+}
+RISK_SCORES = {"low": 0, "medium": 1, "high": 2}
+
+# Think when stakes + risk + novelty (+2 for a poor non-thinking record) reach this
+THINKING_THRESHOLD = 3
+# Non-thinking answers must succeed this often to stay non-thinking
+MIN_SUCCESS_RATE = 0.8
+MIN_SAMPLES = 5
+EWMA_ALPHA = 0.2
+NOVELTY_MEMORY = 512
+
+
+class Decision:
+    """Generation settings chosen for one LLM call"""
+
+    __slots__ = ("node", "key", "enable_thinking", "max_new_tokens", "reason")
+
+    def __init__(self, node: str, key: Tuple, enable_thinking: bool, max_new_tokens: int, reason: str):
+        self.node = node
+        self.key = key
+        self.enable_thinking = enable_thinking
+        self.max_new_tokens = max_new_tokens
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        mode = "thinking" if self.enable_thinking else "non-thinking"
+        return f"Decision({self.node}: {mode}, {self.max_new_tokens} tokens - {self.reason})"
+
+
+class _ModeStats:
+    """Running statistics of one node in one mode"""
+
+    def __init__(self):
+        self.samples = 0
+        self.success_rate = 1.0
+        self.tokens_per_second: Optional[float] = None
+        self.token_usage = []  # recent generated token counts
+
+    def update(self, success: bool, generated_tokens: Optional[int], tokens_per_second: Optional[float]) -> None:
+        self.samples += 1
+        self.success_rate += EWMA_ALPHA * (float(success) - self.success_rate)
+        if tokens_per_second:
+            self.tokens_per_second = tokens_per_second if self.tokens_per_second is None else \
+                self.tokens_per_second + EWMA_ALPHA * (tokens_per_second - self.tokens_per_second)
+        if generated_tokens:
+            self.token_usage = (self.token_usage + [generated_tokens])[-50:]
+
+    def budget(self, default: int) -> int:
+        """Budget covering ~90% of recent generations, with headroom"""
+        if len(self.token_usage) < MIN_SAMPLES:
+            return default
+        usage = sorted(self.token_usage)
+        p90 = usage[int(0.9 * (len(usage) - 1))]
+        return int(min(MAX_BUDGET, max(MIN_BUDGET, p90 * 1.25)))
+
+
+class LLMPolicy:
+    """Chooses thinking mode and token budget per node call, learning from outcomes"""
+
+    def __init__(self, mode: str = "adaptive"):
+        """
+        Args:
+            mode: "adaptive", or "fixed" for thinking with THINKING_BUDGET always
+        """
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, bool], _ModeStats] = {}
+        self._seen: "OrderedDict[Tuple, bool]" = OrderedDict()
+        self._truncated: Dict[Tuple[str, bool], bool] = {}
+
+    def _mode_stats(self, node: str, thinking: bool) -> _ModeStats:
+        key = (node, thinking)
+        if key not in self._stats:
+            self._stats[key] = _ModeStats()
+        return self._stats[key]
+
+    def decide(
+        self,
+        node: str,
+        features: Dict[str, Any],
+        risk: str = "low",
+        remaining_seconds: Optional[float] = None
+    ) -> Decision:
+        """
+        Choose generation settings for a node call
+
+        Args:
+            node: Node name (see NODE_STAKES)
+            features: Coarse description of the node's inputs (used for novelty)
+            risk: "low", "medium" or "high"
+            remaining_seconds: Time left for the call (default: the node's deadline)
+
+        Returns:
+            Decision to pass to query_llm and back to ``feedback``
+        """
+        key = (node,) + tuple(sorted(features.items()))
+
+        if self.mode == "fixed":
+            return Decision(node, key, True, THINKING_BUDGET, "fixed policy")
+
+        if remaining_seconds is None:
+            remaining_seconds = node_remaining_seconds()
+
+        with self._lock:
+            novel = not self._seen.get(key, False)
+            non_thinking = self._mode_stats(node, False)
+            struggling = non_thinking.samples >= MIN_SAMPLES and non_thinking.success_rate < MIN_SUCCESS_RATE
+
+            score = NODE_STAKES.get(node, 1) + RISK_SCORES.get(risk, 0) + int(novel) + 2 * int(struggling)
+            thinking = score >= THINKING_THRESHOLD
+            reasons = [f"stakes {NODE_STAKES.get(node, 1)}", f"risk {risk}"]
+            if novel:
+                reasons.append("novel input")
+            if struggling:
+                reasons.append(f"non-thinking success {non_thinking.success_rate:.0%}")
+
+            stats = self._mode_stats(node, thinking)
+            budget = stats.budget(THINKING_BUDGET if thinking else NON_THINKING_BUDGET)
+            if self._truncated.get((node, thinking)):
+                budget = min(MAX_BUDGET, budget * 2)
+                reasons.append("last answer truncated")
+
+            # Fit the budget into the time that's left, dropping thinking first
+            if remaining_seconds is not None and stats.tokens_per_second:
+                affordable = int(remaining_seconds * stats.tokens_per_second * 0.8)
+                if thinking and affordable < budget:
+                    fallback_stats = self._mode_stats(node, False)
+                    thinking = False
+                    budget = fallback_stats.budget(NON_THINKING_BUDGET)
+                    affordable = int(remaining_seconds * (fallback_stats.tokens_per_second or stats.tokens_per_second) * 0.8)
+                    reasons.append("deadline: thinking off")
+                if affordable < budget:
+                    budget = max(MIN_BUDGET, affordable)
+                    reasons.append("deadline: budget cut")
+
+        decision = Decision(node, key, thinking, budget, ", ".join(reasons))
+        record_event("llm_policy_decision", node=node, thinking="on" if thinking else "off")
+        return decision
+
+    def feedback(self, decision: Decision, parsed: bool, plausible: bool = True) -> None:
+        """
+        Report the outcome of a call made with ``decision``
+
+        Token usage and decode speed are taken from the run trace.
+
+        Args:
+            decision: Decision returned by ``decide``
+            parsed: The answer was valid JSON with the expected keys
+            plausible: The values passed the node's sanity checks
+        """
+        if self.mode == "fixed":
+            return
+
+        generation = last_generation(decision.node)
+        generated_tokens = generation["generated_tokens"] if generation else None
+        tokens_per_second = generation["tokens_per_second"] if generation else None
+        success = parsed and plausible
+
+        with self._lock:
+            self._mode_stats(decision.node, decision.enable_thinking).update(
+                success, generated_tokens, tokens_per_second
+            )
+            self._truncated[(decision.node, decision.enable_thinking)] = bool(
+                generation and generation.get("hit_token_limit") and not parsed
+            )
+            self._seen[decision.key] = success
+            self._seen.move_to_end(decision.key)
+            while len(self._seen) > NOVELTY_MEMORY:
+                self._seen.popitem(last=False)
+
+        record_event("llm_policy_outcome", node=decision.node,
+                     thinking="on" if decision.enable_thinking else "off",
+                     outcome="ok" if success else ("implausible" if parsed else "unparsed"))
+
+    def timed_out(self, decision: Decision) -> None:
+        """
+        Report that a call made with ``decision`` ran out of its deadline
+
+        A timeout says nothing about whether the mode answers well, so the
+        mode statistics are left alone and only the outcome is recorded.
+        """
+        if self.mode == "fixed":
+            return
+        record_event("llm_policy_outcome", node=decision.node,
+                     thinking="on" if decision.enable_thinking else "off",
+                     outcome="deadline")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current per-node statistics (for logs and debugging)"""
+        with self._lock:
+            return {
+                f"{node}:{'thinking' if thinking else 'non-thinking'}": {
+                    "samples": stats.samples,
+                    "success_rate": round(stats.success_rate, 3),
+                    "tokens_per_second": round(stats.tokens_per_second, 1) if stats.tokens_per_second else None,
+                    "budget": stats.budget(THINKING_BUDGET if thinking else NON_THINKING_BUDGET)
+                }
+                for (node, thinking), stats in self._stats.items()
+            }
+
+
+def risk_from_multiplier(multiplier: float) -> str:
+    """Risk level of an expected surge multiplier"""
+    if multiplier >= 1.3:
+        return "high"
+    if multiplier >= 1.1:
+        return "medium"
+    return "low"
+
+
+def plausible_multiplier(value: Any) -> bool:
+    """Sanity check for surge multipliers returned by the LLM"""
+    try:
+        return 0.5 <= float(value) <= 3.0
+    except (TypeError, ValueError):
+        return False
+
+
+# Process-wide policy, so statistics accumulate across runs
+_policy: Optional[LLMPolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_llm_policy() -> LLMPolicy:
+    """
+    Get or create the process-wide LLM policy
+
+    Returns:
+        LLMPolicy in the mode selected by WORKER_LLM_POLICY
+    """
+    global _policy
+
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = LLMPolicy(os.getenv("WORKER_LLM_POLICY", "adaptive").strip().lower())
+
+    return _policy
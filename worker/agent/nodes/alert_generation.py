@@ -38,10 +38,11 @@ def generate_alerts(state: AgentState) -> Dict[str, Any]:
             "id": f"SURGE_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
             "type": "patient_surge",
             "severity": severity,
-            "title": f"Patient Surge Alert: {predicted_surge:.1f}% Increase Expected",
+            "title": "Patient Surge Alert: Increase Expected",
             "message": f"Predicted patient surge of {predicted_surge:.1f}% in the next 7 days. Risk level: {risk_level.upper()}",
             "timestamp": datetime.now().isoformat(),
             "expiry": (datetime.now() + timedelta(days=7)).isoformat(),
+            "horizon_days": 7,
             "actionable": True,
             "metrics": {
                 "surge_percentage": predicted_surge,
@@ -50,6 +51,35 @@ def generate_alerts(state: AgentState) -> Dict[str, Any]:
             }
         })
     
+    # Department-level surge alerts (from the per-department forecasts)
+    for forecast in surge_prediction.get("department_forecasts", []):
+        dept_surge = forecast.get("surge_percentage", 0)
+        if dept_surge <= 20:
+            continue
+        severity = "critical" if dept_surge > 50 else "high" if dept_surge > 35 else "medium"
+        peak_day = max(forecast["forecast_7days"], key=lambda day: day["predicted_inflow"])
+        alerts.append({
+            "id": f"DEPT_SURGE_{forecast['department_id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "type": "department_surge",
+            "severity": severity,
+            "title": f"{forecast['department_name']} Surge: Increase Expected",
+            "message": f"{forecast['department_name']} expected to rise from {forecast['baseline_inflow']:.1f} "
+                       f"to {forecast['predicted_inflow']:.1f} patients/day, peaking at "
+                       f"{peak_day['predicted_inflow']:.1f} on {peak_day['date'][:10]}",
+            "timestamp": datetime.now().isoformat(),
+            "expiry": (datetime.now() + timedelta(days=7)).isoformat(),
+            "horizon_days": 7,
+            "actionable": True,
+            "metrics": {
+                "department_id": forecast["department_id"],
+                "department_name": forecast["department_name"],
+                "surge_percentage": dept_surge,
+                "baseline_inflow": forecast["baseline_inflow"],
+                "peak_inflow": peak_day["predicted_inflow"],
+                "peak_date": peak_day["date"]
+            }
+        })
+    
     # Generate festival-related alerts
     upcoming_festivals = festival_analysis.get("upcoming_festivals", [])
     if upcoming_festivals:
@@ -63,6 +93,7 @@ def generate_alerts(state: AgentState) -> Dict[str, Any]:
                     "message": f"{festival['name']} on {festival['date']} may cause {festival['expected_impact']:.1f}% increase in patient load",
                     "timestamp": datetime.now().isoformat(),
                     "expiry": festival.get("date", (datetime.now() + timedelta(days=30)).isoformat()),
+                    "horizon_days": 30,
                     "actionable": True,
                     "metrics": {
                         "festival_name": festival['name'],
@@ -83,6 +114,7 @@ def generate_alerts(state: AgentState) -> Dict[str, Any]:
             "message": f"Pollution risk score: {pollution_risk:.1f}/100. Expect increase in respiratory cases",
             "timestamp": datetime.now().isoformat(),
             "expiry": (datetime.now() + timedelta(days=3)).isoformat(),
+            "horizon_days": 3,
             "actionable": True,
             "metrics": {
                 "risk_score": pollution_risk,
@@ -104,6 +136,7 @@ def generate_alerts(state: AgentState) -> Dict[str, Any]:
                     "message": f"{epidemic['disease']} outbreak detected. {epidemic.get('cases', 0)} cases reported. Trend: {epidemic.get('trend', 'unknown')}",
                     "timestamp": datetime.now().isoformat(),
                     "expiry": (datetime.now() + timedelta(days=14)).isoformat(),
+                    "horizon_days": 14,
                     "actionable": True,
                     "metrics": {
                         "disease": epidemic['disease'],
@@ -4,9 +4,10 @@ Data Loader Node - Loads context data from database or mock data
 
 from datetime import datetime, timedelta
 from typing import Dict, Any
-import os
 
 from ..state import AgentState
+from ..timeseries import InflowSeries
+from ..tracing import record_fallback
 
 
 def load_context_data(state: AgentState) -> AgentState:
@@ -19,87 +20,18 @@ def load_context_data(state: AgentState) -> AgentState:
     department_id = state.get("department_id")
     current_date = state.get("current_date", datetime.now())
     
-    # Try to load from database
+    # Use the context prefetched for the whole sweep, or load it now
     try:
-        from sqlalchemy.orm import Session
-        from sqlalchemy import create_engine
-        from sqlalchemy.orm import sessionmaker
-        import sys
-        sys.path.append(os.path.join(os.path.dirname(__file__), '../../..'))
-        from app.app import models
-        from app.app.config import settings
+        context = state.get("prefetched_context")
+        if context is None:
+            from ..db import load_fleet_context
+            context = load_fleet_context([hospital_id], current_date)[hospital_id]
         
-        engine = create_engine(settings.DATABASE_URL, future=True)
-        SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
-        
-        db = SessionLocal()
-        
-        # Get hospital info
-        hospital = db.query(models.Hospital).filter(models.Hospital.id == hospital_id).first()
-        if hospital:
-            state["hospital_name"] = hospital.name
-        else:
-            state["hospital_name"] = f"Hospital {hospital_id}"
-        
-        # Get departments
-        departments = db.query(models.Department).filter(
-            models.Department.hospital_id == hospital_id
-        ).all()
-        state["departments"] = [
-            {"id": d.id, "name": d.name} for d in departments
-        ]
-        
-        # Get historical patient inflow (last 60 days)
-        start_date = current_date - timedelta(days=60)
-        inflow_records = db.query(models.PatientInflow).filter(
-            models.PatientInflow.hospital_id == hospital_id,
-            models.PatientInflow.ts >= start_date
-        ).order_by(models.PatientInflow.ts.desc()).all()
-        
-        state["historical_inflow"] = [
-            {
-                "ts": record.ts,
-                "department_id": record.department_id,
-                "count": record.count
-            }
-            for record in inflow_records
-        ]
-        
-        # Get latest resource snapshot
-        latest_resource = db.query(models.ResourceSnapshot).filter(
-            models.ResourceSnapshot.hospital_id == hospital_id
-        ).order_by(models.ResourceSnapshot.ts.desc()).first()
-        
-        if latest_resource:
-            state["current_resources"] = {
-                "beds_total": latest_resource.beds_total,
-                "beds_occupied": latest_resource.beds_occupied,
-                "beds_available": latest_resource.beds_total - latest_resource.beds_occupied,
-                "icu_total": latest_resource.icu_total,
-                "icu_occupied": latest_resource.icu_occupied,
-                "icu_available": latest_resource.icu_total - latest_resource.icu_occupied,
-                "staff_on_shift": latest_resource.staff_on_shift,
-                "supplies": latest_resource.supplies_json
-            }
-        else:
-            state["current_resources"] = _get_mock_resources()
-        
-        # Get latest context signals
-        latest_signal = db.query(models.ContextSignals).filter(
-            models.ContextSignals.hospital_id == hospital_id
-        ).order_by(models.ContextSignals.ts.desc()).first()
-        
-        if latest_signal:
-            state["context_signals"] = {
-                "aqi": latest_signal.aqi,
-                "festival_flag": latest_signal.festival_flag,
-                "epidemic_tag": latest_signal.epidemic_tag,
-                "weather": latest_signal.weather_json
-            }
-        else:
-            state["context_signals"] = _get_mock_context_signals(current_date)
-        
-        db.close()
+        state["hospital_name"] = context["hospital_name"]
+        state["departments"] = context["departments"]
+        state["historical_inflow"] = context["historical_inflow"]
+        state["current_resources"] = context["current_resources"] or _get_mock_resources()
+        state["context_signals"] = context["context_signals"] or _get_mock_context_signals(current_date)
         
         print(f"✅ Loaded data from database for {state['hospital_name']}")
         print(f"  - Historical records: {len(state['historical_inflow'])}")
@@ -107,11 +39,12 @@ def load_context_data(state: AgentState) -> AgentState:
         
     except Exception as e:
         print(f"⚠️ Database not available ({e}), using mock data")
+        record_fallback(str(e))
         
         # Use mock data
         state["hospital_name"] = f"Mock Hospital {hospital_id}"
         state["departments"] = _get_mock_departments()
-        state["historical_inflow"] = _get_mock_historical_data(current_date)
+        state["historical_inflow"] = InflowSeries.from_records(_get_mock_historical_data(current_date))
         state["current_resources"] = _get_mock_resources()
         state["context_signals"] = _get_mock_context_signals(current_date)
         
@@ -119,6 +52,9 @@ def load_context_data(state: AgentState) -> AgentState:
         print(f"  - Historical records: {len(state['historical_inflow'])}")
         print(f"  - Departments: {len(state['departments'])}")
     
+    # Not needed past this node; don't carry it through the rest of the graph
+    state["prefetched_context"] = None
+    
     print(f"  - Current AQI: {state['context_signals']['aqi']}")
     print(f"  - Festival Flag: {state['context_signals']['festival_flag']}")
     print(f"  - Epidemic Tag: {state['context_signals'].get('epidemic_tag', 'None')}")
@@ -6,9 +6,12 @@ from typing import Dict, Any
 from datetime import datetime
 
 from ..state import AgentState
-from ..prompts import EPIDEMIC_ANALYSIS_PROMPT
+from ..prompts import EPIDEMIC_ANALYSIS_PROMPT, EPIDEMIC_ANALYSIS_SCHEMA
 from ..utils import get_season, format_date
+from ..deadline import DeadlineExceeded
 from ..llm import query_llm
+from ..llm_policy import get_llm_policy, plausible_multiplier
+from ..tracing import record_fallback
 
 
 def analyze_epidemics(state: AgentState) -> AgentState:
@@ -38,16 +41,30 @@ def analyze_epidemics(state: AgentState) -> AgentState:
         city=city
     )
     
-    # Call Qwen LLM with thinking mode
+    # Thinking mode and token budget from the adaptive policy
+    policy = get_llm_policy()
+    decision = policy.decide(
+        "analyze_epidemics",
+        features={"season": season, "epidemic_tag": epidemic_tag},
+        risk="high" if epidemic_tag else ("medium" if season in ("monsoon", "winter") else "low")
+    )
+    
+    # Call Qwen LLM
     try:
         response = query_llm(
             prompt=prompt,
             return_json=True,
-            enable_thinking=True,
-            max_new_tokens=2048
+            enable_thinking=decision.enable_thinking,
+            max_new_tokens=decision.max_new_tokens,
+            schema=EPIDEMIC_ANALYSIS_SCHEMA
         )
         
         analysis = response.get("data", {})
+        policy.feedback(
+            decision,
+            parsed=bool(analysis),
+            plausible=plausible_multiplier(analysis.get("surge_multiplier", 1.0))
+        )
         
         state["epidemic_analysis"] = {
             "season": analysis.get("season", season),
@@ -64,6 +81,11 @@ def analyze_epidemics(state: AgentState) -> AgentState:
         
     except Exception as e:
         print(f"⚠️ Epidemic analysis failed: {e}")
+        record_fallback(str(e))
+        if isinstance(e, DeadlineExceeded):
+            policy.timed_out(decision)
+        else:
+            policy.feedback(decision, parsed=False)
         # Fallback logic based on season
         if season == "monsoon":
             active = ["dengue", "malaria"]
@@ -6,9 +6,12 @@ from typing import Dict, Any
 from datetime import datetime
 
 from ..state import AgentState
-from ..prompts import FESTIVAL_ANALYSIS_PROMPT
+from ..prompts import FESTIVAL_ANALYSIS_PROMPT, FESTIVAL_ANALYSIS_SCHEMA
 from ..utils import get_season, format_date
+from ..deadline import DeadlineExceeded
 from ..llm import query_llm
+from ..llm_policy import get_llm_policy, plausible_multiplier
+from ..tracing import record_fallback
 
 
 def analyze_festivals(state: AgentState) -> AgentState:
@@ -35,16 +38,31 @@ def analyze_festivals(state: AgentState) -> AgentState:
         city=city
     )
     
-    # Call Qwen LLM with thinking mode
+    # Thinking mode and token budget from the adaptive policy
+    policy = get_llm_policy()
+    festival_flag = context_signals.get("festival_flag", 0)
+    decision = policy.decide(
+        "analyze_festivals",
+        features={"season": season, "festival_flag": festival_flag, "month": current_date.month},
+        risk="high" if festival_flag == 1 else "low"
+    )
+    
+    # Call Qwen LLM
     try:
         response = query_llm(
             prompt=prompt,
             return_json=True,
-            enable_thinking=True,
-            max_new_tokens=2048
+            enable_thinking=decision.enable_thinking,
+            max_new_tokens=decision.max_new_tokens,
+            schema=FESTIVAL_ANALYSIS_SCHEMA
         )
         
         analysis = response.get("data", {})
+        policy.feedback(
+            decision,
+            parsed=bool(analysis),
+            plausible=plausible_multiplier(analysis.get("surge_multiplier", 1.0))
+        )
         
         # Validate and set defaults
         state["festival_analysis"] = {
@@ -62,6 +80,11 @@ def analyze_festivals(state: AgentState) -> AgentState:
         
     except Exception as e:
         print(f"✗ Festival analysis failed: {e}")
+        record_fallback(str(e))
+        if isinstance(e, DeadlineExceeded):
+            policy.timed_out(decision)
+        else:
+            policy.feedback(decision, parsed=False)
         # Fallback to simple logic
         state["festival_analysis"] = {
             "is_festival_period": context_signals.get("festival_flag", 0) == 1,
@@ -6,9 +6,12 @@ from typing import Dict, Any
 from datetime import datetime
 
 from ..state import AgentState
-from ..prompts import POLLUTION_ANALYSIS_PROMPT
+from ..prompts import POLLUTION_ANALYSIS_PROMPT, POLLUTION_ANALYSIS_SCHEMA
 from ..utils import get_season, format_date
+from ..deadline import DeadlineExceeded
 from ..llm import query_llm
+from ..llm_policy import get_llm_policy, plausible_multiplier
+from ..tracing import record_fallback
 
 
 def analyze_pollution(state: AgentState) -> AgentState:
@@ -38,16 +41,30 @@ def analyze_pollution(state: AgentState) -> AgentState:
         city=city
     )
     
-    # Call Qwen LLM with thinking mode
+    # Thinking mode and token budget from the adaptive policy
+    policy = get_llm_policy()
+    decision = policy.decide(
+        "analyze_pollution",
+        features={"season": season, "aqi_band": int(aqi) // 50},
+        risk="high" if aqi > 200 else ("medium" if aqi > 100 else "low")
+    )
+    
+    # Call Qwen LLM
     try:
         response = query_llm(
             prompt=prompt,
             return_json=True,
-            enable_thinking=True,
-            max_new_tokens=2048
+            enable_thinking=decision.enable_thinking,
+            max_new_tokens=decision.max_new_tokens,
+            schema=POLLUTION_ANALYSIS_SCHEMA
         )
         
         analysis = response.get("data", {})
+        policy.feedback(
+            decision,
+            parsed=bool(analysis),
+            plausible=plausible_multiplier(analysis.get("surge_multiplier", 1.0))
+        )
         
         state["pollution_analysis"] = {
             "aqi_level": analysis.get("aqi_level", aqi),
@@ -64,6 +81,11 @@ def analyze_pollution(state: AgentState) -> AgentState:
         
     except Exception as e:
         print(f"⚠️ Pollution analysis failed: {e}")
+        record_fallback(str(e))
+        if isinstance(e, DeadlineExceeded):
+            policy.timed_out(decision)
+        else:
+            policy.feedback(decision, parsed=False)
         # Fallback logic
         if aqi > 250:
             multiplier = 1.4
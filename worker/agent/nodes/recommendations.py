@@ -77,6 +77,36 @@ def generate_recommendations(state: AgentState) -> Dict[str, Any]:
             }
         })
     
+    # Department-specific staffing for the departments with the largest surges
+    surging_departments = [
+        f for f in surge_prediction.get("department_forecasts", [])
+        if f.get("surge_percentage", 0) > 20
+    ]
+    for forecast in surging_departments[:3]:
+        dept_surge = forecast["surge_percentage"]
+        extra_per_day = forecast["predicted_inflow"] - forecast["baseline_inflow"]
+        recommendations.append({
+            "id": f"DEPT_STAFF_{forecast['department_id']}_{datetime.now().strftime('%Y%m%d')}",
+            "category": "staffing",
+            "priority": "high" if dept_surge > 35 else "medium",
+            "title": f"Reinforce {forecast['department_name']}",
+            "description": f"Prepare {forecast['department_name']} for about {extra_per_day:.0f} "
+                           f"additional patients/day ({dept_surge:.1f}% surge)",
+            "actions": [
+                f"Add {min(int(dept_surge * 0.8), 50)}% staff to {forecast['department_name']} shifts",
+                f"Reassign beds and equipment to {forecast['department_name']} ahead of the peak",
+                "Review the department's day-by-day forecast with the shift lead"
+            ],
+            "impact": "high",
+            "effort": "medium",
+            "timeline": "within 48 hours",
+            "metrics": {
+                "department_id": forecast["department_id"],
+                "surge_percentage": dept_surge,
+                "predicted_inflow": forecast["predicted_inflow"]
+            }
+        })
+    
     # Festival-specific recommendations
     upcoming_festivals = festival_analysis.get("upcoming_festivals", [])
     if upcoming_festivals:
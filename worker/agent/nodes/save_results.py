@@ -5,14 +5,13 @@ Saves analysis results, predictions, alerts, and recommendations
 
 from typing import Dict, Any
 from datetime import datetime
-import json
-import os
 from ..state import AgentState
+from ..run_store import get_run_store
 
 
 def save_results(state: AgentState) -> Dict[str, Any]:
     """
-    Save all results to output files and prepare for API response
+    Save all results to the run store and prepare for API response
     
     Args:
         state: Current agent state with all analysis results
@@ -22,18 +21,17 @@ def save_results(state: AgentState) -> Dict[str, Any]:
     """
     print("\n💾 Saving Results...")
     
-    # Create output directory if it doesn't exist
-    output_dir = os.path.join(os.path.dirname(__file__), "..", "..", "output")
-    os.makedirs(output_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    hospital_id = state.get("hospital_id")
+    timestamp = f"h{hospital_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
     # Prepare comprehensive results
     results = {
         "metadata": {
             "timestamp": datetime.now().isoformat(),
             "analysis_id": f"PULSE_{timestamp}",
-            "version": "1.0.0"
+            "hospital_id": hospital_id,
+            "version": "1.0.0",
+            "degraded_nodes": state.get("degraded_nodes", [])
         },
         "context_data": {
             "festivals": state.get("festivals", []),
@@ -65,53 +63,25 @@ def save_results(state: AgentState) -> Dict[str, Any]:
         }
     }
     
-    # Save full results to JSON
-    full_results_path = os.path.join(output_dir, f"analysis_{timestamp}.json")
-    try:
-        with open(full_results_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
-        print(f"✅ Saved full results to: {full_results_path}")
-    except Exception as e:
-        print(f"⚠️ Error saving full results: {e}")
-        full_results_path = None
-    
-    # Save alerts separately for quick access
-    alerts_path = os.path.join(output_dir, f"alerts_{timestamp}.json")
+    # Append the run to the run store and move the hospital's latest pointer
+    store = get_run_store()
+    run_record_path = None
     try:
-        with open(alerts_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                "timestamp": datetime.now().isoformat(),
-                "alerts": state.get("alerts", []),
-                "count": state.get("alert_count", 0)
-            }, f, indent=2, ensure_ascii=False)
-        print(f"✅ Saved alerts to: {alerts_path}")
+        pointer = store.append(hospital_id, results)
+        run_record_path = f"{pointer['path']}@{pointer['offset']}"
+        print(f"✅ Saved run to: {run_record_path}")
     except Exception as e:
-        print(f"⚠️ Error saving alerts: {e}")
-        alerts_path = None
+        print(f"⚠️ Error saving run: {e}")
     
-    # Save recommendations separately
-    recommendations_path = os.path.join(output_dir, f"recommendations_{timestamp}.json")
+    # Latest results of any hospital, read by the web frontend
+    latest_results_path = None
     try:
-        with open(recommendations_path, 'w', encoding='utf-8') as f:
-            json.dump({
-                "timestamp": datetime.now().isoformat(),
-                "recommendations": state.get("recommendations", []),
-                "count": state.get("recommendation_count", 0)
-            }, f, indent=2, ensure_ascii=False)
-        print(f"✅ Saved recommendations to: {recommendations_path}")
-    except Exception as e:
-        print(f"⚠️ Error saving recommendations: {e}")
-        recommendations_path = None
-    
-    # Save latest results (overwrite) for API to read
-    latest_results_path = os.path.join(output_dir, "latest_results.json")
-    try:
-        with open(latest_results_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
+        latest_results_path = store.write_latest_results(results)
         print(f"✅ Saved latest results to: {latest_results_path}")
     except Exception as e:
         print(f"⚠️ Error saving latest results: {e}")
-        latest_results_path = None
+    
+    store.maybe_compact()
     
     # Prepare summary for console output
     print("\n" + "="*60)
@@ -131,9 +101,7 @@ def save_results(state: AgentState) -> Dict[str, Any]:
     return {
         "save_status": "success",
         "output_files": {
-            "full_results": full_results_path,
-            "alerts": alerts_path,
-            "recommendations": recommendations_path,
+            "run": run_record_path,
             "latest": latest_results_path
         },
         "results": results,
@@ -6,9 +6,14 @@ from typing import Dict, Any
 from datetime import datetime, timedelta
 
 from ..state import AgentState
-from ..prompts import SURGE_PREDICTION_PROMPT
-from ..utils import calculate_baseline, format_date
+from ..prompts import SURGE_PREDICTION_PROMPT, SURGE_PREDICTION_SCHEMA
+from ..utils import format_date
+from ..deadline import DeadlineExceeded
 from ..llm import query_llm
+from ..llm_policy import get_llm_policy, plausible_multiplier, risk_from_multiplier
+from ..surge_engine import forecast_departments, hospital_baseline, POLLUTION_DEPARTMENTS
+from ..timeseries import InflowSeries
+from ..tracing import record_fallback
 
 
 def predict_surge(state: AgentState) -> AgentState:
@@ -19,14 +24,16 @@ def predict_surge(state: AgentState) -> AgentState:
     
     current_date = state.get("current_date", datetime.now())
     historical_inflow = state.get("historical_inflow", [])
+    if not isinstance(historical_inflow, InflowSeries):
+        historical_inflow = InflowSeries.from_records(historical_inflow or [])
     
     # Get analysis results
     festival = state.get("festival_analysis", {})
     pollution = state.get("pollution_analysis", {})
     epidemic = state.get("epidemic_analysis", {})
     
-    # Calculate baseline
-    baseline = calculate_baseline(historical_inflow)
+    # Hospital baseline from the per-department daily load
+    baseline = hospital_baseline(historical_inflow)
     historical_avg = baseline
     
     # Get multipliers
@@ -46,16 +53,35 @@ def predict_surge(state: AgentState) -> AgentState:
         epidemic_reasoning=epidemic.get("reasoning", "No epidemic")
     )
     
-    # Call Qwen LLM with thinking mode
+    # Thinking mode and token budget from the adaptive policy
+    policy = get_llm_policy()
+    expected_mult = festival_mult * pollution_mult * epidemic_mult
+    decision = policy.decide(
+        "predict_surge",
+        features={
+            "festival": round(festival_mult, 1),
+            "pollution": round(pollution_mult, 1),
+            "epidemic": round(epidemic_mult, 1)
+        },
+        risk=risk_from_multiplier(expected_mult)
+    )
+    
+    # Call Qwen LLM
     try:
         response = query_llm(
             prompt=prompt,
             return_json=True,
-            enable_thinking=True,
-            max_new_tokens=2048
+            enable_thinking=decision.enable_thinking,
+            max_new_tokens=decision.max_new_tokens,
+            schema=SURGE_PREDICTION_SCHEMA
         )
         
         prediction = response.get("data", {})
+        policy.feedback(
+            decision,
+            parsed=bool(prediction),
+            plausible=plausible_multiplier(prediction.get("combined_multiplier", 1.0))
+        )
         
         combined_mult = prediction.get("combined_multiplier", festival_mult * pollution_mult * epidemic_mult)
         surge_pct = prediction.get("surge_percentage", (combined_mult - 1.0) * 100)
@@ -64,6 +90,11 @@ def predict_surge(state: AgentState) -> AgentState:
         
     except Exception as e:
         print(f"⚠️ Surge prediction LLM failed: {e}")
+        record_fallback(str(e))
+        if isinstance(e, DeadlineExceeded):
+            policy.timed_out(decision)
+        else:
+            policy.feedback(decision, parsed=False)
         # Fallback: simple multiplication with dampening
         combined_mult = 1.0 + ((festival_mult - 1.0) + (pollution_mult - 1.0) + (epidemic_mult - 1.0)) * 0.8
         surge_pct = (combined_mult - 1.0) * 100
@@ -71,8 +102,6 @@ def predict_surge(state: AgentState) -> AgentState:
         peak_offset = 3
         prediction = {"reasoning": "Fallback calculation: additive model with dampening"}
     
-    # Calculate predicted inflow
-    predicted_inflow = baseline * combined_mult
     peak_date = current_date + timedelta(days=peak_offset)
     
     # Determine risk level
@@ -83,7 +112,22 @@ def predict_surge(state: AgentState) -> AgentState:
     else:
         risk_level = "high"
     
-    # Generate 7-day forecast
+    # Per-department forecasts from the same analyses (no extra LLM calls)
+    factors = [
+        {"multiplier": festival_mult, "departments": festival.get("affected_departments", [])},
+        {"multiplier": pollution_mult, "departments": POLLUTION_DEPARTMENTS},
+        {"multiplier": epidemic_mult, "departments": epidemic.get("affected_departments", [])}
+    ]
+    department_forecasts = forecast_departments(
+        historical_inflow,
+        state.get("departments", []),
+        current_date,
+        factors,
+        combined_mult,
+        peak_offset
+    )
+    
+    # Hospital-wide inflow and 7-day curve are the sums over departments
     forecast_7days = []
     for i in range(1, 8):
         forecast_date = current_date + timedelta(days=i)
@@ -91,7 +135,10 @@ def predict_surge(state: AgentState) -> AgentState:
         days_from_peak = abs((forecast_date - peak_date).days)
         decay_factor = max(0.5, 1.0 - (days_from_peak * 0.1))
         day_multiplier = 1.0 + ((combined_mult - 1.0) * decay_factor)
-        day_prediction = baseline * day_multiplier
+        if department_forecasts:
+            day_prediction = sum(f["forecast_7days"][i - 1]["predicted_inflow"] for f in department_forecasts)
+        else:
+            day_prediction = baseline * day_multiplier
         
         forecast_7days.append({
             "date": forecast_date.isoformat(),
@@ -99,6 +146,11 @@ def predict_surge(state: AgentState) -> AgentState:
             "multiplier": round(day_multiplier, 2)
         })
     
+    if department_forecasts:
+        predicted_inflow = sum(f["predicted_inflow"] for f in department_forecasts)
+    else:
+        predicted_inflow = baseline * combined_mult
+    
     state["surge_prediction"] = {
         "baseline_inflow": round(baseline, 1),
         "predicted_inflow": round(predicted_inflow, 1),
@@ -109,6 +161,7 @@ def predict_surge(state: AgentState) -> AgentState:
         "risk_level": risk_level,
         "peak_date": peak_date.isoformat(),
         "forecast_7days": forecast_7days,
+        "department_forecasts": department_forecasts,
         "reasoning": prediction.get("reasoning", "Combined analysis of festival, pollution, and epidemic factors")
     }
     
@@ -119,5 +172,8 @@ def predict_surge(state: AgentState) -> AgentState:
     print(f"  - Risk Level: {risk_level.upper()}")
     print(f"  - Peak: {format_date(peak_date)}")
     print(f"  - Confidence: {confidence}")
+    for forecast in department_forecasts[:3]:
+        print(f"  - {forecast['department_name']}: {forecast['baseline_inflow']:.1f} → "
+              f"{forecast['predicted_inflow']:.1f}/day ({forecast['surge_percentage']:+.1f}%)")
     
     return state
@@ -1,5 +1,8 @@
 """
 LLM Prompt Templates for Agent Nodes
+
+Each JSON prompt has a matching ``*_SCHEMA`` (top-level key -> type) that
+drives constrained decoding in ``QwenLLM.generate_json``.
 """
 
 FESTIVAL_ANALYSIS_PROMPT = """You are a healthcare analytics expert analyzing festival impact in India.
@@ -38,6 +41,15 @@ Respond in JSON format:
 }}
 """
 
+FESTIVAL_ANALYSIS_SCHEMA = {
+    "is_festival_period": "boolean",
+    "festival_name": "string|null",
+    "days_until_peak": "integer",
+    "surge_multiplier": "float",
+    "affected_departments": "array",
+    "reasoning": "string",
+}
+
 POLLUTION_ANALYSIS_PROMPT = """You are an air quality and public health expert analyzing pollution impact on healthcare in India.
 
 Current Information:
@@ -78,6 +90,15 @@ Respond in JSON format:
 }}
 """
 
+POLLUTION_ANALYSIS_SCHEMA = {
+    "aqi_level": "float",
+    "pollution_category": "string",
+    "is_pollution_season": "boolean",
+    "surge_multiplier": "float",
+    "affected_conditions": "array",
+    "reasoning": "string",
+}
+
 EPIDEMIC_ANALYSIS_PROMPT = """You are an epidemiologist analyzing seasonal disease patterns in India.
 
 Current Information:
@@ -113,6 +134,14 @@ Respond in JSON format:
 }}
 """
 
+EPIDEMIC_ANALYSIS_SCHEMA = {
+    "season": "string",
+    "active_epidemics": "array",
+    "surge_multiplier": "float",
+    "affected_departments": "array",
+    "reasoning": "string",
+}
+
 SURGE_PREDICTION_PROMPT = """You are a hospital capacity planning expert synthesizing multiple factors to predict patient surges.
 
 Current Information:
@@ -144,6 +173,14 @@ Respond in JSON format:
 }}
 """
 
+SURGE_PREDICTION_SCHEMA = {
+    "combined_multiplier": "float",
+    "surge_percentage": "float",
+    "confidence": "string",
+    "peak_date_offset_days": "integer",
+    "reasoning": "string",
+}
+
 ALERT_GENERATION_PROMPT = """You are a hospital operations manager crafting urgent alerts for healthcare staff.
 
 Prediction:
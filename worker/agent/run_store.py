@@ -0,0 +1,251 @@
+"""
+Append-only run store for agent results
+
+Layout under the output directory:
+
+    runs/<YYYY-MM-DD>/hospital_<id>.jsonl   one compact JSON line per run
+    latest/hospital_<id>.json               pointer (file, offset, length) to
+                                            the hospital's latest run
+    latest_results.json                     latest run of any hospital (web UI)
+
+Appends are serialized with a file lock, pointers are replaced atomically,
+and "latest run for a hospital" is one small read plus one seek. Old
+partitions are compacted to the last run per hospital per day and deleted
+after the retention period.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "output")
+DEFAULT_RETENTION_DAYS = int(os.getenv("WORKER_RUN_RETENTION_DAYS", "90"))
+DEFAULT_FULL_DAYS = int(os.getenv("WORKER_RUN_FULL_DAYS", "7"))
+COMPACT_INTERVAL_SECONDS = 3600
+
+_COMPACTED_MARKER = ".compacted"
+
+
+def _dumps(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class RunStore:
+    """Date/hospital partitioned JSONL store with O(1) latest lookups"""
+
+    def __init__(
+        self,
+        root: str = DEFAULT_OUTPUT_DIR,
+        retention_days: int = DEFAULT_RETENTION_DAYS,
+        full_days: int = DEFAULT_FULL_DAYS
+    ):
+        """
+        Args:
+            root: Output directory
+            retention_days: Partitions older than this are deleted
+            full_days: Partitions older than this keep only the last run per
+                hospital
+        """
+        self.root = os.path.abspath(root)
+        self.retention_days = retention_days
+        self.full_days = full_days
+        self._lock = threading.Lock()
+        self._last_compaction = 0.0
+        os.makedirs(os.path.join(self.root, "runs"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "latest"), exist_ok=True)
+
+    def _partition_path(self, day: str, hospital_id: Any) -> str:
+        return os.path.join(self.root, "runs", day, f"hospital_{hospital_id}.jsonl")
+
+    def _pointer_path(self, hospital_id: Any) -> str:
+        return os.path.join(self.root, "latest", f"hospital_{hospital_id}.json")
+
+    def append(self, hospital_id: Any, record: Dict[str, Any], when: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Append a run and move the hospital's latest pointer to it
+
+        Args:
+            hospital_id: Hospital the run belongs to
+            record: Run results (JSON-serializable; other values become strings)
+            when: Run time, selects the date partition (default: now)
+
+        Returns:
+            Pointer {"path", "offset", "length", "ts"} (path relative to root)
+        """
+        when = when or datetime.now()
+        day = when.strftime("%Y-%m-%d")
+        path = self._partition_path(day, hospital_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        line = _dumps(record) + b"\n"
+
+        with self._lock:
+            with open(path, "ab") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0, os.SEEK_END)
+                    offset = f.tell()
+                    f.write(line)
+                    f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+            pointer = {
+                "path": os.path.relpath(path, self.root),
+                "offset": offset,
+                "length": len(line) - 1,
+                "ts": when.isoformat()
+            }
+            _write_atomic(self._pointer_path(hospital_id), _dumps(pointer))
+
+        return pointer
+
+    def write_latest_results(self, record: Dict[str, Any]) -> str:
+        """Atomically replace latest_results.json (read by the web frontend)"""
+        path = os.path.join(self.root, "latest_results.json")
+        _write_atomic(path, _dumps(record))
+        return path
+
+    def _read(self, pointer: Dict[str, Any]) -> Dict[str, Any]:
+        with open(os.path.join(self.root, pointer["path"]), "rb") as f:
+            f.seek(pointer["offset"])
+            return json.loads(f.read(pointer["length"]))
+
+    def latest(self, hospital_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Latest run of a hospital
+
+        Returns:
+            Run record, or None if the hospital has no runs
+        """
+        try:
+            with open(self._pointer_path(hospital_id), "rb") as f:
+                pointer = json.loads(f.read())
+            return self._read(pointer)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def latest_all(self) -> Dict[str, Dict[str, Any]]:
+        """Latest run of every hospital, keyed by hospital id (as string)"""
+        results = {}
+        for name in os.listdir(os.path.join(self.root, "latest")):
+            if name.startswith("hospital_") and name.endswith(".json"):
+                hospital_id = name[len("hospital_"):-len(".json")]
+                record = self.latest(hospital_id)
+                if record is not None:
+                    results[hospital_id] = record
+        return results
+
+    def iter_runs(self, hospital_id: Any, day: str) -> Iterator[Dict[str, Any]]:
+        """Runs of a hospital on a given day (YYYY-MM-DD), oldest first"""
+        try:
+            with open(self._partition_path(day, hospital_id), "rb") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def maybe_compact(self) -> None:
+        """Run ``compact`` at most once per COMPACT_INTERVAL_SECONDS"""
+        now = time.monotonic()
+        if now - self._last_compaction < COMPACT_INTERVAL_SECONDS:
+            return
+        self._last_compaction = now
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"⚠️ Run store compaction failed: {e}")
+
+    def compact(self, today: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Apply retention to old partitions
+
+        - Older than ``retention_days``: deleted
+        - Older than ``full_days``: only the last run per hospital is kept
+
+        Returns:
+            Counts of deleted and compacted partitions
+        """
+        today = (today or datetime.now()).date()
+        delete_before = (today - timedelta(days=self.retention_days)).isoformat()
+        compact_before = (today - timedelta(days=self.full_days)).isoformat()
+        runs_dir = os.path.join(self.root, "runs")
+        stats = {"deleted": 0, "compacted": 0}
+
+        for day in sorted(os.listdir(runs_dir)):
+            day_dir = os.path.join(runs_dir, day)
+            if not os.path.isdir(day_dir):
+                continue
+            if day < delete_before:
+                shutil.rmtree(day_dir, ignore_errors=True)
+                stats["deleted"] += 1
+            elif day < compact_before and not os.path.exists(os.path.join(day_dir, _COMPACTED_MARKER)):
+                for name in os.listdir(day_dir):
+                    if name.endswith(".jsonl"):
+                        self._compact_partition(os.path.join(day_dir, name))
+                open(os.path.join(day_dir, _COMPACTED_MARKER), "w").close()
+                stats["compacted"] += 1
+
+        return stats
+
+    def _compact_partition(self, path: str) -> None:
+        """Rewrite a partition with only its last run, fixing the pointer if needed"""
+        with self._lock:
+            with open(path, "rb") as f:
+                lines = [line for line in f if line.strip()]
+            if len(lines) <= 1:
+                return
+            last = lines[-1].rstrip(b"\n")
+            _write_atomic(path, last + b"\n")
+
+            hospital_id = os.path.basename(path)[len("hospital_"):-len(".jsonl")]
+            pointer_path = self._pointer_path(hospital_id)
+            try:
+                with open(pointer_path, "rb") as f:
+                    pointer = json.loads(f.read())
+            except (FileNotFoundError, ValueError):
+                return
+            if os.path.join(self.root, pointer["path"]) == path:
+                pointer.update(offset=0, length=len(last))
+                _write_atomic(pointer_path, _dumps(pointer))
+
+
+# Process-wide store for the default output directory
+_store: Optional[RunStore] = None
+_store_lock = threading.Lock()
+
+
+def get_run_store() -> RunStore:
+    """
+    Get or create the run store for the worker output directory
+
+    Returns:
+        RunStore instance
+    """
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RunStore(os.getenv("WORKER_OUTPUT_DIR", DEFAULT_OUTPUT_DIR))
+
+    return _store
@@ -0,0 +1,206 @@
+"""
+Change-driven scheduling for the worker
+
+Instead of re-running every hospital every hour, the worker fingerprints each
+hospital's inputs (latest context signals, latest resource snapshot, recent
+patient inflow) and only schedules a run when the fingerprint changed or the
+last run is older than a maximum staleness. Bursts of updates are coalesced
+into one run by waiting for the inputs to settle.
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+
+DEFAULT_MAX_STALENESS = float(os.getenv("WORKER_MAX_STALENESS", str(6 * 3600)))
+DEFAULT_DEBOUNCE = float(os.getenv("WORKER_DEBOUNCE", "120"))
+DEFAULT_MAX_COALESCE = float(os.getenv("WORKER_MAX_COALESCE", "900"))
+DEFAULT_RETRY_BACKOFF = float(os.getenv("WORKER_RETRY_BACKOFF", "600"))
+
+
+def _digest(parts: Any) -> str:
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+class InputFingerprinter:
+    """
+    Computes per-hospital input fingerprints with a fixed number of queries
+
+    Three grouped aggregate queries cover the whole fleet, however many
+    hospitals there are: new or changed rows show up as a different
+    max(id)/max(ts)/count per hospital.
+    """
+
+    def __init__(self, session_factory, models, inflow_window_days: int = 60):
+        """
+        Args:
+            session_factory: SQLAlchemy session factory
+            models: Module with the ORM models (app.app.models)
+            inflow_window_days: Patient inflow window considered by the agent
+        """
+        self.session_factory = session_factory
+        self.models = models
+        self.inflow_window_days = inflow_window_days
+
+    def __call__(self, hospital_ids: Optional[List[int]] = None) -> Dict[int, str]:
+        """
+        Fingerprint the inputs of the given hospitals (all when None)
+
+        Returns:
+            Mapping hospital_id -> fingerprint
+        """
+        from sqlalchemy import select, func
+
+        m = self.models
+        window_start = datetime.utcnow() - timedelta(days=self.inflow_window_days)
+        parts: Dict[int, list] = {}
+
+        db = self.session_factory()
+        try:
+            hospitals = select(m.Hospital.id)
+            if hospital_ids is not None:
+                hospitals = hospitals.where(m.Hospital.id.in_(hospital_ids))
+            for (hospital_id,) in db.execute(hospitals):
+                parts[hospital_id] = []
+
+            queries = [
+                select(
+                    m.ContextSignals.hospital_id,
+                    func.max(m.ContextSignals.id),
+                    func.max(m.ContextSignals.ts),
+                    func.count()
+                ).group_by(m.ContextSignals.hospital_id),
+                select(
+                    m.ResourceSnapshot.hospital_id,
+                    func.max(m.ResourceSnapshot.id),
+                    func.max(m.ResourceSnapshot.ts),
+                    func.count()
+                ).group_by(m.ResourceSnapshot.hospital_id),
+                select(
+                    m.PatientInflow.hospital_id,
+                    func.max(m.PatientInflow.id),
+                    func.max(m.PatientInflow.ts)
+                ).where(m.PatientInflow.ts >= window_start).group_by(m.PatientInflow.hospital_id),
+            ]
+            for index, query in enumerate(queries):
+                for row in db.execute(query):
+                    hospital_id, values = row[0], tuple(row[1:])
+                    if hospital_id in parts:
+                        parts[hospital_id].append((index, values))
+        finally:
+            db.close()
+
+        return {hospital_id: _digest(values) for hospital_id, values in parts.items()}
+
+
+class ChangeDrivenScheduler:
+    """
+    Decides which hospitals need an agent run
+
+    A hospital is due when:
+    - it has never run in this process, or
+    - its fingerprint differs from the last successful run and has been
+      stable for ``debounce`` seconds (or has been pending for longer than
+      ``max_coalesce``), or
+    - its last successful run is older than ``max_staleness``.
+
+    Failed runs are retried after ``retry_backoff`` seconds.
+    """
+
+    def __init__(
+        self,
+        fingerprint_fn: Callable[[], Dict[int, str]],
+        max_staleness: float = DEFAULT_MAX_STALENESS,
+        debounce: float = DEFAULT_DEBOUNCE,
+        max_coalesce: float = DEFAULT_MAX_COALESCE,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+        clock: Callable[[], float] = time.time
+    ):
+        self.fingerprint_fn = fingerprint_fn
+        self.max_staleness = max_staleness
+        self.debounce = debounce
+        self.max_coalesce = max_coalesce
+        self.retry_backoff = retry_backoff
+        self.clock = clock
+        self._hospitals: Dict[int, Dict[str, Any]] = {}
+
+    def observe(self) -> None:
+        """Fetch fresh fingerprints and update change tracking"""
+        now = self.clock()
+        fingerprints = self.fingerprint_fn()
+
+        for hospital_id, fingerprint in fingerprints.items():
+            entry = self._hospitals.setdefault(hospital_id, {
+                "fingerprint": None,
+                "last_change_at": now,
+                "pending_since": None,
+                "last_run_fingerprint": None,
+                "last_run_at": None,
+                "retry_after": 0.0
+            })
+            if fingerprint != entry["fingerprint"]:
+                entry["fingerprint"] = fingerprint
+                entry["last_change_at"] = now
+            if fingerprint != entry["last_run_fingerprint"]:
+                if entry["pending_since"] is None:
+                    entry["pending_since"] = now
+            else:
+                entry["pending_since"] = None
+
+        # Hospitals that disappeared are no longer tracked
+        for hospital_id in set(self._hospitals) - set(fingerprints):
+            del self._hospitals[hospital_id]
+
+    def due(self) -> List[int]:
+        """Hospitals that should run now"""
+        now = self.clock()
+        due = []
+
+        for hospital_id, entry in self._hospitals.items():
+            if now < entry["retry_after"]:
+                continue
+            if entry["last_run_at"] is None:
+                due.append(hospital_id)
+            elif now - entry["last_run_at"] >= self.max_staleness:
+                due.append(hospital_id)
+            elif entry["pending_since"] is not None:
+                settled = now - entry["last_change_at"] >= self.debounce
+                waited_too_long = now - entry["pending_since"] >= self.max_coalesce
+                if settled or waited_too_long:
+                    due.append(hospital_id)
+
+        return sorted(due)
+
+    def poll(self) -> Dict[int, str]:
+        """
+        Observe inputs and return the due hospitals
+
+        Returns:
+            Mapping hospital_id -> fingerprint the run is based on
+        """
+        self.observe()
+        return {hospital_id: self._hospitals[hospital_id]["fingerprint"] for hospital_id in self.due()}
+
+    def mark_finished(self, hospital_id: int, fingerprint: str, success: bool) -> None:
+        """Record the outcome of a run started for ``fingerprint``"""
+        entry = self._hospitals.get(hospital_id)
+        if entry is None:
+            return
+
+        now = self.clock()
+        if success:
+            entry["last_run_fingerprint"] = fingerprint
+            entry["last_run_at"] = now
+            entry["retry_after"] = 0.0
+            # Inputs may have moved on while the run was in flight
+            entry["pending_since"] = None if entry["fingerprint"] == fingerprint else now
+        else:
+            entry["retry_after"] = now + self.retry_backoff
+
+    def stats(self) -> Dict[str, int]:
+        """Counts of tracked and pending hospitals"""
+        pending = [e for e in self._hospitals.values() if e["pending_since"] is not None]
+        return {"tracked": len(self._hospitals), "pending_changes": len(pending)}
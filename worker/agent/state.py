@@ -5,6 +5,8 @@ Agent State Schema
 from typing import TypedDict, List, Dict, Optional, Any
 from datetime import datetime
 
+from .timeseries import InflowSeries
+
 
 class AgentState(TypedDict):
     """State schema for the hospital prediction agent"""
@@ -15,10 +17,11 @@ class AgentState(TypedDict):
     current_date: datetime
     
     # Context Data (from database)
-    historical_inflow: List[Dict[str, Any]]  # Patient counts over time
+    historical_inflow: InflowSeries  # Patient counts over time (columnar)
     current_resources: Dict[str, Any]  # Beds, staff, supplies
     context_signals: Dict[str, Any]  # AQI, festival_flag, epidemic_tag
     departments: List[Dict[str, Any]]  # Department info
+    prefetched_context: Optional[Dict[str, Any]]  # Bulk-loaded by the executor, consumed by load_data
     
     # Analysis Results
     festival_analysis: Optional[Dict[str, Any]]
@@ -34,3 +37,5 @@ class AgentState(TypedDict):
     
     # Control
     next_action: Optional[str]
+    deadline: Optional[float]  # Epoch seconds by which the run must finish
+    degraded_nodes: List[str]  # Nodes that fell back to heuristics
@@ -0,0 +1,226 @@
+"""
+Per-department surge engine
+
+Computes a baseline, day-of-week profile and 7-day forecast for every
+department at once from the columnar inflow series, then applies
+department-specific multipliers derived from the festival, pollution and
+epidemic analyses. No LLM calls: it reuses the analyses already in the state.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .timeseries import InflowSeries
+
+
+# Days of history used for the department baselines (four full weeks)
+BASELINE_DAYS = 28
+FORECAST_DAYS = 7
+
+# Hospital baseline when there is no inflow history
+DEFAULT_BASELINE = 50.0
+
+# Share of a factor's effect that spills over to departments it doesn't name
+SPILLOVER_WEIGHT = 0.3
+
+# Bound on how far the factor effects are stretched to meet the combined multiplier
+MAX_EXCESS_SCALE = 3.0
+
+# Department labels used by the analyses, matched against department names
+DEPARTMENT_ALIASES = {
+    "er": ["emergency", "er", "casualty", "a&e", "trauma"],
+    "icu": ["icu", "intensive", "critical care"],
+    "opd": ["opd", "outpatient", "general"],
+    "pediatrics": ["pediatric", "paediatric", "children"],
+    "respiratory": ["respiratory", "pulmonology", "chest"],
+    "cardiology": ["cardio", "heart"],
+}
+
+# Pollution analysis reports conditions, not departments
+POLLUTION_DEPARTMENTS = ["ER", "Respiratory", "Cardiology", "Pediatrics"]
+
+
+def _department_matches(name: str, label: str) -> bool:
+    name = name.lower()
+    label = label.lower().strip()
+    aliases = DEPARTMENT_ALIASES.get(label, [label])
+    return any(
+        alias == name or alias in name.split() or (len(alias) > 3 and alias in name)
+        for alias in aliases
+    )
+
+
+def _risk_level(surge_pct: float) -> str:
+    if surge_pct < 20:
+        return "low"
+    elif surge_pct < 50:
+        return "medium"
+    return "high"
+
+
+def department_multipliers(
+    department_names: List[str],
+    factors: List[Dict[str, Any]],
+    weights: Optional[np.ndarray] = None,
+    combined_multiplier: Optional[float] = None
+) -> np.ndarray:
+    """
+    Spread the analysis multipliers over departments
+
+    Each factor applies fully to the departments it names and with
+    SPILLOVER_WEIGHT to the others (fully everywhere if it names none).
+    When ``combined_multiplier`` is given, the department effects are scaled
+    (by at most MAX_EXCESS_SCALE) so that their load-weighted average matches
+    it; any remainder is added evenly to every department.
+
+    Args:
+        department_names: Department names, one per row
+        factors: [{"multiplier": float, "departments": [labels]}]
+        weights: Relative load of each department (for the average)
+        combined_multiplier: Hospital-wide multiplier to stay consistent with
+
+    Returns:
+        Multiplier per department
+    """
+    n = len(department_names)
+    if n == 0:
+        return np.ones(0)
+
+    excess = np.array([float(f.get("multiplier", 1.0)) - 1.0 for f in factors])
+    exposure = np.ones((n, len(factors)))
+    for j, factor in enumerate(factors):
+        labels = factor.get("departments") or []
+        if labels:
+            hit = np.array([
+                any(_department_matches(name, label) for label in labels)
+                for name in department_names
+            ])
+            exposure[:, j] = np.where(hit, 1.0, SPILLOVER_WEIGHT)
+
+    department_excess = exposure @ excess if len(factors) else np.zeros(n)
+
+    if combined_multiplier is not None:
+        weights = np.ones(n) if weights is None or weights.sum() <= 0 else weights
+        target = combined_multiplier - 1.0
+        average = float(np.average(department_excess, weights=weights))
+        if abs(average) > 1e-9:
+            department_excess = department_excess * float(np.clip(target / average, 0.0, MAX_EXCESS_SCALE))
+        # Whatever the scaling can't reach (no factor effects, or a clamped scale) is spread evenly
+        department_excess = department_excess + (target - float(np.average(department_excess, weights=weights)))
+
+    return np.maximum(0.0, 1.0 + department_excess)
+
+
+def _daily_load(inflow: InflowSeries):
+    """Department ids, calendar days and load matrix with days without rows as zero"""
+    ids, days, matrix = inflow.department_daily_matrix()
+    if not ids:
+        return ids, days, matrix
+    span = (days[-1] - days[0]).astype(int) + 1
+    full = np.zeros((len(ids), span))
+    full[:, (days - days[0]).astype(int)] = matrix
+    return ids, days[0] + np.arange(span), full
+
+
+def hospital_baseline(inflow: InflowSeries) -> float:
+    """
+    Hospital-wide daily baseline: the sum of the department baselines
+
+    Uses the same BASELINE_DAYS calendar window as ``forecast_departments``,
+    so it is consistent with the department forecasts whatever the mix of
+    departments in the raw rows.
+    """
+    ids, _, full = _daily_load(inflow)
+    if not ids:
+        return DEFAULT_BASELINE
+    return float(full[:, -BASELINE_DAYS:].mean(axis=1).sum())
+
+
+def forecast_departments(
+    inflow: InflowSeries,
+    departments: List[Dict[str, Any]],
+    current_date: datetime,
+    factors: List[Dict[str, Any]],
+    combined_multiplier: float,
+    peak_offset: int
+) -> List[Dict[str, Any]]:
+    """
+    Baseline, day-of-week profile and 7-day forecast for every department
+
+    Args:
+        inflow: Historical inflow of the hospital
+        departments: [{"id", "name"}] from the data loader
+        current_date: Forecast origin
+        factors: Analysis factors (see ``department_multipliers``)
+        combined_multiplier: Hospital-wide multiplier from the surge prediction
+        peak_offset: Days until the surge peaks
+
+    Returns:
+        One forecast dictionary per department, largest surge first
+    """
+    ids, all_days, full = _daily_load(inflow)
+    if not ids:
+        return []
+    span = full.shape[1]
+
+    names = {d["id"]: d["name"] for d in departments}
+    department_names = [names.get(i, f"Department {i}") for i in ids]
+
+    recent = full[:, -BASELINE_DAYS:]
+    baselines = recent.mean(axis=1)
+
+    # Day-of-week profile: mean load per weekday relative to the overall mean
+    weekday = (all_days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    one_hot = np.eye(7)[weekday]
+    per_weekday = (full @ one_hot) / np.maximum(one_hot.sum(axis=0), 1)
+    overall = full.mean(axis=1, keepdims=True)
+    profiles = np.where(overall > 0, per_weekday / np.where(overall > 0, overall, 1), 1.0)
+    profiles[:, one_hot.sum(axis=0) == 0] = 1.0
+
+    # Least-squares trend per department (patients/day per day)
+    x = np.arange(span, dtype=float)
+    x_centered = x - x.mean()
+    denominator = x_centered @ x_centered
+    trends = (full - overall) @ x_centered / denominator if denominator > 0 else np.zeros(len(ids))
+
+    multipliers = department_multipliers(department_names, factors, baselines, combined_multiplier)
+
+    # Same peak/decay shape as the hospital-wide forecast
+    offsets = np.arange(1, FORECAST_DAYS + 1)
+    decay = np.maximum(0.5, 1.0 - np.abs(offsets - peak_offset) * 0.1)
+    day_multipliers = 1.0 + np.outer(multipliers - 1.0, decay)
+    forecast_days = np.datetime64(current_date.date()) + offsets
+    forecast_weekday = (forecast_days.astype(np.int64) + 3) % 7
+    forecasts = baselines[:, None] * profiles[:, forecast_weekday] * day_multipliers
+
+    peak_date = current_date + timedelta(days=peak_offset)
+    surge_pct = (multipliers - 1.0) * 100
+    dates = [(current_date + timedelta(days=int(i))).isoformat() for i in offsets]
+
+    results = []
+    for row, department_id in enumerate(ids):
+        results.append({
+            "department_id": department_id,
+            "department_name": department_names[row],
+            "baseline_inflow": round(float(baselines[row]), 1),
+            "predicted_inflow": round(float(baselines[row] * multipliers[row]), 1),
+            "multiplier": round(float(multipliers[row]), 2),
+            "surge_percentage": round(float(surge_pct[row]), 1),
+            "risk_level": _risk_level(float(surge_pct[row])),
+            "trend_per_day": round(float(trends[row]), 2),
+            "peak_date": peak_date.isoformat(),
+            "day_of_week_profile": [round(float(v), 2) for v in profiles[row]],
+            "forecast_7days": [
+                {
+                    "date": dates[i],
+                    "predicted_inflow": round(float(forecasts[row, i]), 1),
+                    "multiplier": round(float(day_multipliers[row, i]), 2)
+                }
+                for i in range(FORECAST_DAYS)
+            ]
+        })
+
+    results.sort(key=lambda r: r["surge_percentage"], reverse=True)
+    return results
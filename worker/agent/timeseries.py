@@ -0,0 +1,216 @@
+"""
+Columnar time series for the agent state
+
+``InflowSeries`` stores patient inflow as three parallel NumPy arrays
+(timestamp, department, count) instead of one dict per row, so it is cheap
+to pass through the graph and to aggregate with vectorized helpers.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+_TS_DTYPE = "datetime64[us]"
+
+# Default number of most recent records used for a baseline
+BASELINE_RECORDS = 30
+
+
+class InflowSeries:
+    """
+    Patient inflow as a struct of arrays, in ascending time order
+
+    Arrays may be shared with the inflow cache and must not be modified in
+    place; every helper returns new arrays.
+    """
+
+    __slots__ = ("ts", "department_id", "count")
+
+    def __init__(self, ts: np.ndarray, department_id: np.ndarray, count: np.ndarray):
+        self.ts = np.asarray(ts, dtype=_TS_DTYPE)
+        self.department_id = np.asarray(department_id, dtype=np.int64)
+        self.count = np.asarray(count, dtype=np.int64)
+
+    @classmethod
+    def empty(cls) -> "InflowSeries":
+        return cls(np.empty(0, dtype=_TS_DTYPE), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "InflowSeries":
+        """
+        Build from ``{"ts", "department_id", "count"}`` dicts in any order
+
+        Args:
+            records: Row dictionaries (e.g. mock data)
+
+        Returns:
+            InflowSeries sorted by time
+        """
+        records = list(records)
+        if not records:
+            return cls.empty()
+
+        ts = np.array([r["ts"] for r in records], dtype=_TS_DTYPE)
+        department_id = np.array([r.get("department_id") or 0 for r in records], dtype=np.int64)
+        count = np.array([r.get("count", 0) for r in records], dtype=np.int64)
+        order = np.argsort(ts, kind="stable")
+        return cls(ts[order], department_id[order], count[order])
+
+    @classmethod
+    def from_window(cls, window: Dict[str, np.ndarray]) -> "InflowSeries":
+        """Wrap the arrays of an inflow cache window (no copy)"""
+        return cls(window["ts"], window["department_id"], window["count"])
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Row dictionaries, newest first (the historical list format)"""
+        return [
+            {"ts": ts, "department_id": department_id, "count": count}
+            for ts, department_id, count in zip(
+                self.ts[::-1].tolist(), self.department_id[::-1].tolist(), self.count[::-1].tolist()
+            )
+        ]
+
+    def to_dict(self) -> Dict[str, List[int]]:
+        """JSON-serializable form (timestamps as epoch microseconds)"""
+        return {
+            "ts": self.ts.astype(np.int64).tolist(),
+            "department_id": self.department_id.tolist(),
+            "count": self.count.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[int]]) -> "InflowSeries":
+        """Inverse of ``to_dict``"""
+        return cls(
+            np.array(data["ts"], dtype=np.int64).astype(_TS_DTYPE),
+            data["department_id"],
+            data["count"]
+        )
+
+    def __getstate__(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.ts, self.department_id, self.count
+
+    def __setstate__(self, state: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> None:
+        self.ts, self.department_id, self.count = state
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "InflowSeries(empty)"
+        return f"InflowSeries({len(self)} rows, {self.ts[0]} .. {self.ts[-1]})"
+
+    def departments(self) -> List[int]:
+        """Department ids present in the series"""
+        return np.unique(self.department_id).tolist()
+
+    def for_department(self, department_id: int) -> "InflowSeries":
+        """Rows of a single department"""
+        mask = self.department_id == department_id
+        return InflowSeries(self.ts[mask], self.department_id[mask], self.count[mask])
+
+    def since(self, start: datetime) -> "InflowSeries":
+        """Rows at or after ``start``"""
+        cut = int(np.searchsorted(self.ts, np.datetime64(start, "us"), side="left"))
+        return InflowSeries(self.ts[cut:], self.department_id[cut:], self.count[cut:])
+
+    def baseline(self, department_id: Optional[int] = None, last_n: int = BASELINE_RECORDS) -> Optional[float]:
+        """
+        Mean count of the ``last_n`` most recent records
+
+        Returns:
+            Baseline, or None if there are no records
+        """
+        series = self if department_id is None else self.for_department(department_id)
+        if not len(series):
+            return None
+        return float(series.count[-last_n:].mean())
+
+    def department_baselines(self, last_n: int = BASELINE_RECORDS) -> Dict[int, float]:
+        """Per-department mean of the ``last_n`` most recent records"""
+        if not len(self):
+            return {}
+
+        # Group rows by department, keeping time order inside each group
+        order = np.lexsort((self.ts, self.department_id))
+        departments = self.department_id[order]
+        cumulative = np.concatenate([[0], np.cumsum(self.count[order])])
+
+        ids, starts, sizes = np.unique(departments, return_index=True, return_counts=True)
+        ends = starts + sizes
+        tail_starts = np.maximum(starts, ends - last_n)
+        means = (cumulative[ends] - cumulative[tail_starts]) / (ends - tail_starts)
+        return dict(zip(ids.tolist(), means.tolist()))
+
+    def daily_totals(self, department_id: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Total count per calendar day
+
+        Returns:
+            (days as datetime64[D], totals) in ascending order
+        """
+        series = self if department_id is None else self.for_department(department_id)
+        if not len(series):
+            return np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=float)
+        days, inverse = np.unique(series.ts.astype("datetime64[D]"), return_inverse=True)
+        return days, np.bincount(inverse, weights=series.count).astype(float)
+
+    def department_daily_matrix(self) -> Tuple[List[int], np.ndarray, np.ndarray]:
+        """
+        Daily totals for every department at once
+
+        Returns:
+            (department ids, days, matrix of shape [departments, days])
+        """
+        if not len(self):
+            return [], np.empty(0, dtype="datetime64[D]"), np.empty((0, 0))
+        ids, dept_index = np.unique(self.department_id, return_inverse=True)
+        days, day_index = np.unique(self.ts.astype("datetime64[D]"), return_inverse=True)
+        matrix = np.zeros((len(ids), len(days)))
+        np.add.at(matrix, (dept_index, day_index), self.count)
+        return ids.tolist(), days, matrix
+
+    def trend(self, department_id: Optional[int] = None) -> float:
+        """Least-squares slope of the daily totals (patients per day, per day)"""
+        days, totals = self.daily_totals(department_id)
+        if len(days) < 2:
+            return 0.0
+        x = (days - days[0]).astype(float)
+        return float(np.polyfit(x, totals, 1)[0])
+
+    def department_trends(self) -> Dict[int, float]:
+        """Slope of the daily totals for every department (one vectorized fit)"""
+        ids, days, matrix = self.department_daily_matrix()
+        if len(days) < 2:
+            return {department_id: 0.0 for department_id in ids}
+        x = (days - days[0]).astype(float)
+        x_centered = x - x.mean()
+        slopes = (matrix - matrix.mean(axis=1, keepdims=True)) @ x_centered / (x_centered @ x_centered)
+        return dict(zip(ids, slopes.tolist()))
+
+    def day_of_week_profile(self, department_id: Optional[int] = None) -> np.ndarray:
+        """
+        Relative load per weekday (Monday = index 0)
+
+        Returns:
+            Array of 7 multipliers around 1.0; weekdays without data are 1.0
+        """
+        days, totals = self.daily_totals(department_id)
+        profile = np.ones(7)
+        if not len(days):
+            return profile
+
+        # 1970-01-01 was a Thursday
+        weekday = (days.astype(np.int64) + 3) % 7
+        sums = np.bincount(weekday, weights=totals, minlength=7)
+        counts = np.bincount(weekday, minlength=7)
+        overall = totals.mean()
+        if overall <= 0:
+            return profile
+
+        seen = counts > 0
+        profile[seen] = sums[seen] / counts[seen] / overall
+        return profile
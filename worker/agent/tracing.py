@@ -0,0 +1,390 @@
+"""
+Run tracing and Prometheus metrics for the agent graph
+
+Every node and every LLM generation is recorded into the trace of the run
+it belongs to (tracked with context variables, so concurrent runs on the
+fleet executor don't mix) and into process-wide metrics:
+
+- node wall time and outcome (ok / fallback / error)
+- prompt, generated, thinking and cached prompt tokens per generation
+- generation time and tokens per second, split by thinking mode
+- cache hits and misses (inflow window cache, server prompt cache)
+
+Metrics are served in the Prometheus text format on WORKER_METRICS_PORT
+(disabled when unset); each run's trace is written as JSON under
+WORKER_TRACE_DIR (default: output/traces).
+"""
+
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+DEFAULT_TRACE_DIR = os.path.join(os.path.dirname(__file__), "..", "output", "traces")
+
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TOKENS_PER_SECOND_BUCKETS = (1, 2.5, 5, 10, 20, 40, 80, 160, 320)
+
+
+class Metrics:
+    """Thread-safe counters and histograms rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], Dict[str, Any]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+
+    def inc(self, name: str, help_text: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ("counter", help_text))
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, help_text: str, value: float, buckets=SECONDS_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help_text))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+                self._histograms[key] = histogram
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition of all metrics"""
+        def fmt(labels) -> str:
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._help.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for (metric, labels), value in sorted(self._counters.items()):
+                        if metric == name:
+                            lines.append(f"{name}{fmt(labels)} {value:g}")
+                    continue
+                for (metric, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                        lines.append(f"{name}_bucket{fmt(labels + (('le', f'{bound:g}'),))} {count}")
+                    lines.append(f"{name}_bucket{fmt(labels + (('le', '+Inf'),))} {histogram['count']}")
+                    lines.append(f"{name}_sum{fmt(labels)} {histogram['sum']:g}")
+                    lines.append(f"{name}_count{fmt(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class RunTrace:
+    """Timeline of one agent run: nodes, LLM generations and cache lookups"""
+
+    def __init__(self, hospital_id: Any, run_id: Optional[str] = None):
+        self.hospital_id = hospital_id
+        self.run_id = run_id
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.nodes: List[Dict[str, Any]] = []
+        self.generations: List[Dict[str, Any]] = []
+        self.cache: Dict[str, Dict[str, int]] = {}
+        self.duration: Optional[float] = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def add_node(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.nodes.append(record)
+
+    def add_generation(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.generations.append(record)
+
+    def add_cache(self, cache: str, hits: int, misses: int) -> None:
+        with self._lock:
+            counts = self.cache.setdefault(cache, {"hits": 0, "misses": 0})
+            counts["hits"] += hits
+            counts["misses"] += misses
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-node totals, slowest first"""
+        per_node: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for node in self.nodes:
+                entry = per_node.setdefault(node["node"], {
+                    "seconds": 0.0, "status": node["status"], "generations": 0,
+                    "generated_tokens": 0, "thinking_tokens": 0
+                })
+                entry["seconds"] += node["seconds"]
+                if node["status"] != "ok":
+                    entry["status"] = node["status"]
+            for generation in self.generations:
+                entry = per_node.get(generation["node"])
+                if entry is not None:
+                    entry["generations"] += 1
+                    entry["generated_tokens"] += generation["generated_tokens"]
+                    entry["thinking_tokens"] += generation["thinking_tokens"]
+
+        for entry in per_node.values():
+            entry["seconds"] = round(entry["seconds"], 3)
+        total = self.duration if self.duration is not None else self.elapsed()
+        return {
+            "total_seconds": round(total, 3),
+            "nodes": dict(sorted(per_node.items(), key=lambda item: item[1]["seconds"], reverse=True)),
+            "fallbacks": [name for name, entry in per_node.items() if entry["status"] == "fallback"],
+            "cache": {name: dict(counts) for name, counts in self.cache.items()}
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hospital_id": self.hospital_id,
+                "run_id": self.run_id,
+                "started_at": self.started_at.isoformat(),
+                "duration_seconds": round(self.duration, 3) if self.duration is not None else None,
+                "nodes": list(self.nodes),
+                "generations": list(self.generations),
+                "cache": {name: dict(counts) for name, counts in self.cache.items()}
+            }
+
+
+_current_trace: ContextVar[Optional[RunTrace]] = ContextVar("pulse_run_trace", default=None)
+_current_node: ContextVar[Optional[Dict[str, Any]]] = ContextVar("pulse_trace_node", default=None)
+
+
+def current_trace() -> Optional[RunTrace]:
+    """Trace of the run executing in this context, if any"""
+    return _current_trace.get()
+
+
+def start_run(hospital_id: Any, run_id: Optional[str] = None) -> RunTrace:
+    """Begin tracing a run in the current context"""
+    trace = RunTrace(hospital_id, run_id)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_run(trace: RunTrace, status: str = "ok") -> Optional[str]:
+    """
+    Close a run trace, record run metrics and write the JSON trace
+
+    Args:
+        trace: Trace returned by ``start_run``
+        status: Outcome of the run
+
+    Returns:
+        Path of the trace file, or None if it couldn't be written
+    """
+    trace.duration = trace.elapsed()
+    _current_trace.set(None)
+
+    metrics.inc("pulse_runs_total", "Agent runs by outcome", status=status)
+    metrics.observe("pulse_run_duration_seconds", "Wall time of agent runs", trace.duration)
+
+    trace_dir = os.getenv("WORKER_TRACE_DIR", DEFAULT_TRACE_DIR)
+    if trace_dir.lower() == "off":
+        return None
+    try:
+        day_dir = os.path.join(trace_dir, trace.started_at.strftime("%Y-%m-%d"))
+        os.makedirs(day_dir, exist_ok=True)
+        path = os.path.join(
+            day_dir,
+            f"hospital_{trace.hospital_id}_{trace.started_at.strftime('%H%M%S')}_{trace.run_id or 'run'}.json"
+        )
+        with open(path, "w") as f:
+            json.dump({**trace.to_dict(), "summary": trace.summary()}, f, indent=2, default=str)
+        return path
+    except Exception as e:
+        print(f"⚠️ Could not write run trace: {e}")
+        return None
+
+
+def traced_node(name: str, fn: Callable) -> Callable:
+    """
+    Wrap a graph node so its wall time and outcome are recorded
+
+    Nodes report fallbacks through ``record_fallback``; an exception marks
+    the node as failed and is re-raised.
+    """
+    @wraps(fn)
+    def wrapper(state):
+        record = {"node": name, "start": None, "seconds": 0.0, "status": "ok"}
+        trace = _current_trace.get()
+        if trace is not None:
+            record["start"] = round(trace.elapsed(), 3)
+        token = _current_node.set(record)
+        started = time.perf_counter()
+        try:
+            return fn(state)
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 4)
+            _current_node.reset(token)
+            metrics.observe("pulse_node_duration_seconds", "Wall time of graph nodes", record["seconds"], node=name)
+            metrics.inc("pulse_node_runs_total", "Graph node executions by outcome", node=name, status=record["status"])
+            if trace is not None:
+                trace.add_node(record)
+
+    return wrapper
+
+
+def current_node_status() -> Optional[str]:
+    """Outcome recorded so far for the running node ("ok", "fallback", ...)"""
+    record = _current_node.get()
+    return record["status"] if record is not None else None
+
+
+def record_fallback(reason: str) -> None:
+    """Mark the running node as having used its fallback heuristics"""
+    record = _current_node.get()
+    node = record["node"] if record is not None else "unknown"
+    if record is not None:
+        record["status"] = "fallback"
+        record["fallback_reason"] = reason[:200]
+    metrics.inc("pulse_node_fallbacks_total", "Nodes that fell back to heuristics", node=node)
+
+
+def record_generation(
+    backend: str,
+    seconds: float,
+    prompt_tokens: int,
+    generated_tokens: int,
+    thinking_tokens: int = 0,
+    cached_prompt_tokens: Optional[int] = None,
+    enable_thinking: bool = False,
+    max_new_tokens: Optional[int] = None
+) -> None:
+    """
+    Record one LLM generation for the running node
+
+    ``cached_prompt_tokens`` is None when the backend doesn't report prompt
+    cache usage; only reported values count as cache hits and misses.
+    """
+    node_record = _current_node.get()
+    node = node_record["node"] if node_record is not None else "unknown"
+    thinking = "on" if enable_thinking else "off"
+    tokens_per_second = generated_tokens / seconds if seconds > 0 else 0.0
+
+    metrics.observe("pulse_llm_generation_seconds", "Wall time of LLM generations", seconds,
+                    node=node, thinking=thinking)
+    metrics.observe("pulse_llm_tokens_per_second", "Generated tokens per second", tokens_per_second,
+                    buckets=TOKENS_PER_SECOND_BUCKETS, node=node, thinking=thinking)
+    for kind, count in (("prompt", prompt_tokens), ("generated", generated_tokens),
+                        ("thinking", thinking_tokens), ("cached_prompt", cached_prompt_tokens or 0)):
+        if count:
+            metrics.inc("pulse_llm_tokens_total", "LLM tokens by kind", count, node=node, kind=kind)
+    if prompt_tokens and cached_prompt_tokens is not None:
+        record_cache("llm_prompt", hits=cached_prompt_tokens, misses=prompt_tokens - cached_prompt_tokens)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_generation({
+            "node": node,
+            "backend": backend,
+            "seconds": round(seconds, 4),
+            "prompt_tokens": prompt_tokens,
+            "generated_tokens": generated_tokens,
+            "thinking_tokens": thinking_tokens,
+            "cached_prompt_tokens": cached_prompt_tokens,
+            "tokens_per_second": round(tokens_per_second, 2),
+            "enable_thinking": enable_thinking,
+            "max_new_tokens": max_new_tokens,
+            "hit_token_limit": max_new_tokens is not None and generated_tokens >= max_new_tokens
+        })
+
+
+def last_generation(node: str) -> Optional[Dict[str, Any]]:
+    """Most recent generation of ``node`` in the current run trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    with trace._lock:
+        for generation in reversed(trace.generations):
+            if generation["node"] == node:
+                return generation
+    return None
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    """Record cache lookups (for the llm_prompt cache, in tokens)"""
+    if hits:
+        metrics.inc("pulse_cache_hits_total", "Cache hits", hits, cache=cache)
+    if misses:
+        metrics.inc("pulse_cache_misses_total", "Cache misses", misses, cache=cache)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_cache(cache, hits, misses)
+
+
+def record_event(name: str, **labels) -> None:
+    """Count a named event (e.g. a JSON parse failure) for the running node"""
+    record = _current_node.get()
+    labels.setdefault("node", record["node"] if record is not None else "unknown")
+    metrics.inc(f"pulse_{name}_total", name.replace("_", " ").capitalize(), **labels)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics in a background thread
+
+    Args:
+        port: Port to listen on (default: WORKER_METRICS_PORT; unset disables)
+
+    Returns:
+        The HTTP server, or None when disabled
+    """
+    global _server
+
+    if port is None:
+        configured = os.getenv("WORKER_METRICS_PORT", "").strip()
+        if not configured:
+            return None
+        port = int(configured)
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="pulse-metrics", daemon=True).start()
+            print(f"📈 Metrics on http://0.0.0.0:{port}/metrics")
+
+    return _server
@@ -6,6 +6,8 @@ import json
 from datetime import datetime
 from typing import Dict, Any
 
+from .timeseries import InflowSeries
+
 
 def get_season(date: datetime) -> str:
     """Determine the season based on date"""
@@ -42,11 +44,22 @@ def parse_llm_json_response(response: str) -> Dict[str, Any]:
         return {}
 
 
-def calculate_baseline(historical_inflow: list, department_id: int = None) -> float:
-    """Calculate baseline patient inflow from historical data"""
-    if not historical_inflow:
+def calculate_baseline(historical_inflow, department_id: int = None) -> float:
+    """
+    Calculate baseline patient inflow from historical data
+    
+    Accepts an InflowSeries (vectorized, uses the 30 most recent records)
+    or a list of record dicts. The loader used to hand over newest-first
+    lists, so the list path averages the oldest 30 of them; the series is in
+    time order and averages the newest 30, which is what "recent" meant.
+    """
+    if historical_inflow is None or not len(historical_inflow):
         return 50.0  # Default baseline
     
+    if isinstance(historical_inflow, InflowSeries):
+        baseline = historical_inflow.baseline(department_id or None)
+        return baseline if baseline is not None else 50.0
+    
     # Filter by department if specified
     if department_id:
         filtered = [h for h in historical_inflow if h.get("department_id") == department_id]
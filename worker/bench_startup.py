@@ -0,0 +1,101 @@
+"""
+Startup benchmark for the Pulse worker
+
+Measures cold-start wall time of the non-LLM entry points in fresh
+interpreters and checks that the ML stack (torch/transformers) is not
+imported along the way.
+
+Usage:
+    python bench_startup.py            # 5 runs per case
+    python bench_startup.py 10         # 10 runs per case
+"""
+
+import os
+import subprocess
+import sys
+import time
+from statistics import median
+
+WORKER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Target cold start for non-LLM modes (seconds)
+BUDGET_SECONDS = 1.0
+
+CASES = [
+    ("usage (--help)", ["main.py", "--help"]),
+    ("import agent.llm", ["-c", "import agent.llm"]),
+    ("import agent.graph", ["-c", "import agent.graph"]),
+]
+
+HEAVY_MODULES_CHECK = (
+    "import sys, agent.graph; "
+    "heavy = [m for m in ('torch', 'transformers') if m in sys.modules]; "
+    "print(','.join(heavy))"
+)
+
+
+def time_command(args: list, env: dict) -> tuple:
+    """Run ``python <args>`` once; return (wall time in seconds, exit code)"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *args],
+        cwd=WORKER_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=False
+    )
+    return time.perf_counter() - start, proc.returncode
+
+
+def run_benchmark(runs: int = 5) -> bool:
+    """Run all cases and print a summary; returns True if all are in budget"""
+    env = dict(os.environ, LLM_BACKEND="stub", PYTHONDONTWRITEBYTECODE="1")
+
+    print("\n" + "="*60)
+    print("⏱️ PULSE WORKER STARTUP BENCHMARK")
+    print("="*60)
+
+    # Python interpreter startup on its own, for reference
+    baseline = median(time_command(["-c", "pass"], env)[0] for _ in range(runs))
+    print(f"Interpreter baseline: {baseline * 1000:.0f} ms")
+
+    all_ok = True
+    for name, args in CASES:
+        results = [time_command(args, env) for _ in range(runs)]
+        failed = [code for _, code in results if code != 0]
+        if failed:
+            print(f"❌ {name:<22} failed (exit code {failed[0]})")
+            all_ok = False
+            continue
+        timings = [seconds for seconds, _ in results]
+        best, mid = min(timings), median(timings)
+        ok = mid < BUDGET_SECONDS
+        all_ok = all_ok and ok
+        status = "✅" if ok else "❌"
+        print(f"{status} {name:<22} median {mid * 1000:7.0f} ms   best {best * 1000:7.0f} ms")
+
+    check = subprocess.run(
+        [sys.executable, "-c", HEAVY_MODULES_CHECK],
+        cwd=WORKER_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    heavy = check.stdout.strip()
+    if check.returncode != 0:
+        print(f"⚠️ Could not import agent.graph: {check.stderr.strip().splitlines()[-1:]}")
+        all_ok = False
+    elif heavy:
+        print(f"❌ ML stack imported eagerly: {heavy}")
+        all_ok = False
+    else:
+        print("✅ torch/transformers not imported by agent.graph")
+
+    print("="*60)
+    return all_ok
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    sys.exit(0 if run_benchmark(runs) else 1)
@@ -10,19 +10,14 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Import agent
-from agent.graph import run_agent, create_agent_graph
-
 # Try to import database models (optional)
 try:
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-    from app.app.config import settings
     from app.app import models
     from app.app.notifications import send_email
+    from agent.db import get_session_factory
     
-    engine = create_engine(settings.DATABASE_URL, future=True)
-    SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+    # Same pooled engine as the agent's data loader
+    SessionLocal = get_session_factory()
     DB_AVAILABLE = True
 except Exception as e:
     print(f"⚠️ Database not available: {e}")
@@ -43,32 +38,20 @@ def save_results_to_db(results: dict, hospital_id: int):
         print("⚠️ Database not available, skipping save to DB")
         return
     
+    from agent.alert_store import persist_alerts
+    
     db = SessionLocal()
     try:
-        # Get alerts from results
         alerts = results.get("alerts", [])
         
-        # Save each alert to database
-        for alert_data in alerts:
-            alert = models.Alert(
-                hospital_id=hospital_id,
-                severity=alert_data.get("severity", "medium").upper(),
-                title=alert_data.get("title", "Alert"),
-                message=alert_data.get("message", ""),
-                action_json={
-                    "recommendations": results.get("recommendations", []),
-                    "metrics": alert_data.get("metrics", {})
-                },
-                status="open",
-                ts=datetime.utcnow()
-            )
-            db.add(alert)
-        
+        # One bulk insert + one bulk update; repeats of open alerts are suppressed
+        saved = persist_alerts(db, models, hospital_id, alerts, results.get("recommendations", []))
         db.commit()
-        print(f"✅ Saved {len(alerts)} alerts to database")
+        print(f"✅ Alerts: {saved['inserted']} new, {saved['updated']} updated, "
+              f"{saved['suppressed']} suppressed")
         
-        # Send email notifications for critical alerts
-        critical_alerts = [a for a in alerts if a.get("severity") == "critical"]
+        # Email only for critical alerts that are new or escalated
+        critical_alerts = [a for a in saved["notify"] if a.get("severity") == "critical"]
         if critical_alerts:
             try:
                 send_email(
@@ -87,40 +70,74 @@ def save_results_to_db(results: dict, hospital_id: int):
         db.close()
 
 
-def run_agent_for_all_hospitals():
+def run_agent_for_all_hospitals(hospital_ids: list = None, fingerprints: dict = None) -> list:
     """
     Run the agent for all hospitals in the database
+    
+    Hospitals are processed concurrently by the shared fleet executor
+    (WORKER_MAX_PARALLEL at a time); results are saved as each one finishes.
+    
+    Args:
+        hospital_ids: Optional subset of hospitals to run (default: all)
+        fingerprints: Input fingerprints the runs are based on (from the
+            scheduler); they key the runs' checkpoints
+        
+    Returns:
+        Per-hospital outcomes from the executor
     """
+    from agent.graph import run_agent, run_id_for
+    from agent.executor import get_executor, print_fleet_stats
+    
+    fingerprints = fingerprints or {}
     if not DB_AVAILABLE or not SessionLocal:
         print("⚠️ Database not available, running for mock hospital")
         # Run for mock hospital
-        results = run_agent(hospital_id=1)
+        results = run_agent(hospital_id=1, run_id=run_id_for(fingerprints.get(1)))
         print_summary(results)
-        return
+        return [{"hospital_id": 1, "status": "ok", "results": results, "error": None}]
     
     db = SessionLocal()
     try:
-        hospitals = db.query(models.Hospital).all()
-        print(f"\n🏥 Found {len(hospitals)} hospitals")
-        
-        for hospital in hospitals:
-            print(f"\n{'='*60}")
-            print(f"Processing: {hospital.name} (ID: {hospital.id})")
-            print(f"{'='*60}")
-            
-            # Run agent for this hospital
-            results = run_agent(hospital_id=hospital.id)
-            
-            # Save results to database
-            save_results_to_db(results, hospital.id)
-            
-            # Print summary
-            print_summary(results)
-            
+        query = db.query(models.Hospital.id, models.Hospital.name)
+        if hospital_ids is not None:
+            query = query.filter(models.Hospital.id.in_(hospital_ids))
+        hospitals = query.all()
     except Exception as e:
-        print(f"⚠️ Error processing hospitals: {e}")
+        print(f"⚠️ Error loading hospitals: {e}")
+        return []
     finally:
         db.close()
+    
+    print(f"\n🏥 Processing {len(hospitals)} hospitals")
+    names = {hospital.id: hospital.name for hospital in hospitals}
+    
+    def handle_result(outcome: dict):
+        hospital_id = outcome["hospital_id"]
+        print(f"\n{'='*60}")
+        print(f"Processed: {names.get(hospital_id)} (ID: {hospital_id}) "
+              f"in {outcome['duration']:.1f}s - {outcome['status'].upper()}")
+        print(f"{'='*60}")
+        
+        if outcome["status"] != "ok":
+            print(f"⚠️ Hospital {hospital_id}: {outcome['error']}")
+            return
+        
+        # Save results to database
+        save_results_to_db(outcome["results"], hospital_id)
+        
+        # Print summary
+        print_summary(outcome["results"])
+    
+    sweep_deadline = float(os.getenv("WORKER_SWEEP_DEADLINE", "3300"))
+    outcomes, stats = get_executor().run(
+        names.keys(),
+        on_result=handle_result,
+        deadline_seconds=sweep_deadline,
+        fingerprints=fingerprints
+    )
+    print_fleet_stats(stats)
+    
+    return outcomes
 
 
 def run_agent_once():
@@ -131,6 +148,8 @@ def run_agent_once():
     print("🚀 PULSE PREDICTIVE AGENT - Single Run")
     print("="*60)
     
+    from agent.graph import run_agent
+    
     # Run for hospital ID 1 (or mock data if DB not available)
     results = run_agent(hospital_id=1)
     
@@ -173,6 +192,17 @@ def print_summary(results: dict):
     for rec in recommendations[:3]:  # Show top 3
         print(f"  - [{rec.get('priority', 'N/A').upper()}] {rec.get('title', 'N/A')}")
     
+    # Where the run's time went
+    trace = results.get("trace")
+    if trace:
+        print(f"\n⏱️ Timing: {trace['total_seconds']:.1f}s total")
+        for node, entry in list(trace["nodes"].items())[:3]:  # Slowest 3
+            tokens = f", {entry['generated_tokens']} tokens ({entry['thinking_tokens']} thinking)" if entry["generations"] else ""
+            print(f"  - {node}: {entry['seconds']:.1f}s{tokens}")
+    
+    if results.get("degraded_nodes"):
+        print(f"\n⚠️ Degraded (used fallbacks): {', '.join(results['degraded_nodes'])}")
+    
     # Show output files
     output_files = results.get("output_files", {})
     if output_files:
@@ -186,22 +216,46 @@ def print_summary(results: dict):
 
 def main_loop():
     """
-    Main loop - runs agent periodically
+    Main loop - runs the agent whenever a hospital's inputs change
+    
+    Every WORKER_POLL_INTERVAL seconds the inputs of all hospitals are
+    fingerprinted; only hospitals whose inputs changed (after bursts settle)
+    or whose last run is older than WORKER_MAX_STALENESS are run.
     """
+    from agent.scheduling import ChangeDrivenScheduler, InputFingerprinter
+    from agent.tracing import start_metrics_server
+    
+    poll_interval = float(os.getenv("WORKER_POLL_INTERVAL", "60"))
+    
+    if DB_AVAILABLE and SessionLocal:
+        fingerprint_fn = InputFingerprinter(SessionLocal, models)
+    else:
+        # Mock data never changes; only staleness triggers a run
+        fingerprint_fn = lambda: {1: "mock"}
+    scheduler = ChangeDrivenScheduler(fingerprint_fn)
+    start_metrics_server()
+    
     print("\n" + "="*60)
     print("🏥 PULSE PREDICTIVE AGENT - Continuous Mode")
     print("="*60)
-    print(f"Running every 1 hour...")
+    print(f"Checking for input changes every {poll_interval:.0f}s "
+          f"(max staleness {scheduler.max_staleness / 3600:.1f}h)")
     print(f"Press Ctrl+C to stop")
     print("="*60)
     
     while True:
         try:
-            run_agent_for_all_hospitals()
+            due = scheduler.poll()
+            
+            if due:
+                print(f"\n🔔 {len(due)} hospital(s) due: {', '.join(map(str, due))}")
+                outcomes = run_agent_for_all_hospitals(list(due), fingerprints=due)
+                for outcome in outcomes:
+                    hospital_id = outcome["hospital_id"]
+                    if hospital_id in due:
+                        scheduler.mark_finished(hospital_id, due[hospital_id], outcome["status"] == "ok")
             
-            # Wait 1 hour before next run
-            print(f"\n⏰ Waiting 1 hour until next run...")
-            time.sleep(3600)
+            time.sleep(poll_interval)
             
         except KeyboardInterrupt:
             print("\n\n👋 Stopping agent...")
@@ -212,27 +266,174 @@ def main_loop():
             time.sleep(300)
 
 
+def produce_loop():
+    """
+    Producer loop - enqueues a job for every hospital whose inputs changed
+
+    Uses the same change-driven scheduling as the continuous mode, but hands
+    the runs to the job queue so any number of `consume` processes can pick
+    them up.
+    """
+    from agent.scheduling import ChangeDrivenScheduler, InputFingerprinter
+    from agent.job_queue import get_job_queue
+
+    poll_interval = float(os.getenv("WORKER_POLL_INTERVAL", "60"))
+    queue = get_job_queue()
+
+    if DB_AVAILABLE and SessionLocal:
+        fingerprint_fn = InputFingerprinter(SessionLocal, models)
+    else:
+        fingerprint_fn = lambda: {1: "mock"}
+    scheduler = ChangeDrivenScheduler(fingerprint_fn)
+
+    print("\n" + "="*60)
+    print("📤 PULSE PREDICTIVE AGENT - Producer")
+    print("="*60)
+    print(f"Enqueueing changed hospitals every {poll_interval:.0f}s")
+    print("="*60)
+
+    while True:
+        try:
+            due = scheduler.poll()
+
+            if due:
+                enqueued = 0
+                for hospital_id, fingerprint in due.items():
+                    job_id = queue.enqueue(hospital_id, {"fingerprint": fingerprint})
+                    enqueued += job_id is not None
+                    # A job for this hospital is now waiting either way
+                    scheduler.mark_finished(hospital_id, fingerprint, True)
+                print(f"\n📤 Enqueued {enqueued} job(s), {len(due) - enqueued} already waiting - "
+                      f"queue: {queue.stats()}")
+
+            time.sleep(poll_interval)
+
+        except KeyboardInterrupt:
+            print("\n\n👋 Stopping producer...")
+            break
+        except Exception as e:
+            print(f"\n⚠️ Error in producer loop: {e}")
+            time.sleep(60)
+
+
+def consume_loop():
+    """
+    Consumer loop - runs the agent for queued hospital jobs
+
+    Start as many consumer processes as needed. A job that fails is retried
+    up to JOB_MAX_ATTEMPTS times; a running job's reservation is extended by a
+    heartbeat, and a job whose consumer dies becomes visible again after
+    JOB_VISIBILITY_TIMEOUT seconds. Exhausted jobs are moved to
+    the dead-letter list.
+    """
+    from agent.graph import run_agent, get_compiled_graph
+    from agent.job_queue import get_job_queue, heartbeat
+    from agent.tracing import start_metrics_server
+
+    queue = get_job_queue()
+    get_compiled_graph()
+    start_metrics_server()
+
+    print("\n" + "="*60)
+    print(f"📥 PULSE PREDICTIVE AGENT - Consumer (pid {os.getpid()})")
+    print("="*60)
+
+    while True:
+        try:
+            job = queue.reserve(timeout=30)
+            if job is None:
+                continue
+
+            hospital_id = job["hospital_id"]
+            print(f"\n📥 Job {job['id'][:8]} - hospital {hospital_id} (attempt {job['attempts']})")
+            started = time.monotonic()
+            try:
+                # Retries of the job resume from the last completed node
+                with heartbeat(queue, job):
+                    results = run_agent(hospital_id=hospital_id, run_id=job["id"])
+                    save_results_to_db(results, hospital_id)
+            except Exception as e:
+                queue.fail(job, str(e))
+                print(f"⚠️ Job {job['id'][:8]} failed: {e}")
+                continue
+
+            queue.ack(job)
+            print(f"✅ Job {job['id'][:8]} done in {time.monotonic() - started:.1f}s")
+            print_summary(results)
+
+        except KeyboardInterrupt:
+            print("\n\n👋 Stopping consumer...")
+            break
+        except Exception as e:
+            print(f"\n⚠️ Error in consumer loop: {e}")
+            time.sleep(30)
+
+
+def replay_run(hospital_id: int, run_id: str):
+    """
+    Replay a checkpointed run with the hospital's current data
+
+    The data loader's output is replaced with freshly loaded context, so the
+    analyses and everything after them are re-run; nothing else is reloaded.
+
+    Args:
+        hospital_id: Hospital of the run
+        run_id: Id of the checkpointed run (job id, YYYYMMDDHH-<fingerprint> or YYYYMMDDHH)
+    """
+    from datetime import datetime
+    from agent.graph import replay_agent
+    from agent.db import load_fleet_context
+
+    context = load_fleet_context([hospital_id], datetime.now())[hospital_id]
+    updates = {
+        "hospital_name": context["hospital_name"],
+        "departments": context["departments"],
+        "historical_inflow": context["historical_inflow"]
+    }
+    if context["current_resources"]:
+        updates["current_resources"] = context["current_resources"]
+    if context["context_signals"]:
+        updates["context_signals"] = context["context_signals"]
+
+    results = replay_agent(hospital_id, run_id, updates, as_node="load_data")
+    save_results_to_db(results, hospital_id)
+    print_summary(results)
+    return results
+
+
 def main():
     """
     Main entry point
     """
     import sys
-    
+
     # Check command line arguments
     if len(sys.argv) > 1:
         if sys.argv[1] == "once":
             # Run once and exit
             run_agent_once()
+        elif sys.argv[1] == "produce":
+            produce_loop()
+        elif sys.argv[1] == "consume":
+            consume_loop()
+        elif sys.argv[1] == "replay" and len(sys.argv) == 4:
+            replay_run(int(sys.argv[2]), sys.argv[3])
         elif sys.argv[1] == "test":
             # Test mode - run with mock data
+            from agent.graph import run_agent
             print("\n🧪 TEST MODE - Using mock data")
             results = run_agent(hospital_id=1)
             print_summary(results)
         else:
             print("Usage:")
-            print("  python -m worker.main          # Continuous mode (runs every hour)")
+            print("  python -m worker.main          # Continuous mode (runs when inputs change)")
             print("  python -m worker.main once     # Run once and exit")
             print("  python -m worker.main test     # Test mode with mock data")
+            print("  python -m worker.main produce  # Enqueue changed hospitals on the job queue")
+            print("  python -m worker.main consume  # Process queued hospital jobs")
+            print("  python -m worker.main replay <hospital_id> <run_id>  # Re-run a checkpointed run with fresh data")
+            print("")
+            print("LLM backend: set LLM_BACKEND to hf, openai or stub (default: auto-detect)")
     else:
         # Default: continuous mode
         main_loop()
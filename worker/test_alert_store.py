@@ -0,0 +1,137 @@
+"""Tests for alert deduplication and the open-alert upsert against in-memory SQLite"""
+
+import types
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, String, Text, create_engine, select, text
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from agent.alert_store import _upsert, alert_key, persist_alerts
+
+Base = declarative_base()
+
+
+class Alert(Base):
+    __tablename__ = "alerts"
+    __table_args__ = (
+        Index("uq_alerts_open_dedup_key", "dedup_key", unique=True, sqlite_where=text("status = 'open'")),
+    )
+    id = Column(Integer, primary_key=True)
+    ts = Column(DateTime)
+    hospital_id = Column(Integer)
+    severity = Column(String)
+    title = Column(String)
+    message = Column(Text)
+    action_json = Column(JSON)
+    status = Column(String, default="open")
+    dedup_key = Column(String)
+    recommendation_set_id = Column(Integer)
+
+
+class RecommendationSet(Base):
+    __tablename__ = "recommendation_sets"
+    id = Column(Integer, primary_key=True)
+    ts = Column(DateTime)
+    hospital_id = Column(Integer)
+    digest = Column(String, unique=True)
+    recommendations_json = Column(JSON)
+
+
+MODELS = types.SimpleNamespace(Alert=Alert, RecommendationSet=RecommendationSet)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _surge(severity="high", pct=40.0, department_id=1):
+    return {
+        "type": "department_surge",
+        "severity": severity,
+        "title": "ER Surge: Increase Expected",
+        "message": f"ER expected to rise by {pct:.1f}%",
+        "horizon_days": 7,
+        "metrics": {"department_id": department_id, "surge_percentage": pct},
+    }
+
+
+def _alerts(db):
+    return db.execute(select(Alert).order_by(Alert.id)).scalars().all()
+
+
+def test_repeats_only_refresh_last_seen(db):
+    saved = persist_alerts(db, MODELS, 1, [_surge(pct=40.0)], [])
+    db.commit()
+    assert saved["inserted"] == 1 and len(saved["notify"]) == 1
+    first_seen = _alerts(db)[0].ts
+
+    # Same severity, different numbers: suppressed, only ts moves
+    saved = persist_alerts(db, MODELS, 1, [_surge(pct=41.3)], [])
+    db.commit()
+    assert (saved["inserted"], saved["updated"], saved["suppressed"]) == (0, 0, 1)
+    assert saved["notify"] == []
+    (alert,) = _alerts(db)
+    assert alert.ts > first_seen
+    assert alert.message == "ER expected to rise by 40.0%"
+
+
+def test_escalation_updates_and_notifies(db):
+    persist_alerts(db, MODELS, 1, [_surge("high")], [])
+    db.commit()
+
+    saved = persist_alerts(db, MODELS, 1, [_surge("critical", pct=60.0)], [])
+    db.commit()
+    assert saved["updated"] == 1 and len(saved["notify"]) == 1
+    (alert,) = _alerts(db)
+    assert alert.severity == "CRITICAL" and alert.action_json["metrics"]["surge_percentage"] == 60.0
+
+    # De-escalation is written but not notified
+    saved = persist_alerts(db, MODELS, 1, [_surge("medium")], [])
+    db.commit()
+    assert saved["updated"] == 1 and saved["notify"] == []
+
+
+def test_alert_back_after_the_window_is_renotified(db):
+    persist_alerts(db, MODELS, 1, [_surge()], [])
+    db.commit()
+    _alerts(db)[0].ts = datetime.utcnow() - timedelta(hours=13)
+    db.commit()
+
+    saved = persist_alerts(db, MODELS, 1, [_surge()], [], suppression_seconds=12 * 3600)
+    db.commit()
+    assert saved["updated"] == 1 and len(saved["notify"]) == 1
+    assert len(_alerts(db)) == 1
+
+
+def test_closed_alerts_dont_absorb_new_ones(db):
+    persist_alerts(db, MODELS, 1, [_surge()], [])
+    db.commit()
+    _alerts(db)[0].status = "acknowledged"
+    db.commit()
+
+    saved = persist_alerts(db, MODELS, 1, [_surge()], [])
+    db.commit()
+    assert saved["inserted"] == 1
+    assert [a.status for a in _alerts(db)] == ["acknowledged", "open"]
+
+
+def test_concurrent_insert_becomes_an_update(db):
+    # Another run inserted the open alert after this run looked for it
+    key = alert_key(1, _surge())
+    row = {
+        "hospital_id": 1, "severity": "HIGH", "title": "ER Surge: Increase Expected",
+        "message": "first", "action_json": {}, "status": "open", "ts": datetime.utcnow(),
+        "dedup_key": key, "recommendation_set_id": None,
+    }
+    _upsert(db, MODELS, [row])
+    _upsert(db, MODELS, [dict(row, severity="CRITICAL", message="second")])
+    db.commit()
+
+    (alert,) = _alerts(db)
+    assert (alert.severity, alert.message) == ("CRITICAL", "second")
@@ -0,0 +1,208 @@
+"""Tests for the JSON prefix validator and the constrained decoding hooks"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from agent.constrained_decoding import (
+    JSONConstraint,
+    JSONLogitsProcessor,
+    JSONPrefixValidator,
+    JSONStoppingCriteria,
+)
+
+
+SCHEMA = {"is_festival": "boolean", "multiplier": "float", "name": "string|null"}
+
+VALID = [
+    '{}',
+    '[]',
+    ' { "a" : [ ] } ',
+    '{"a": [1, -2.5e3, 0, 0.25, 1E+2, true, false, null]}',
+    '{"a": [[1, [2]], [], {"b": {"c": []}}]}',
+    '{"s": "quote \\" backslash \\\\ slash \\/ \\b\\f\\n\\r\\t \\u00e9"}',
+    '[{"x": -0.5}, "y", 3]',
+]
+
+INVALID = [
+    '"top-level string"',
+    '42',
+    '{"a" 1}',
+    '{,}',
+    '{"a": 1,}',
+    '[1,]',
+    '[1 2]',
+    '{"a": tru }',
+    '{"a": nul}',
+    '{"a": True}',
+    '{"a": 01}',
+    '{"a": 1..2}',
+    '{"a": --1}',
+    '{"a": .5}',
+    '{"a": 1.e5}',
+    '{"a": 1e}',
+    '{"a": -}',
+    '{"a": "\\q"}',
+    '{"a": "\\u00g0"}',
+    '{"a": "line\nbreak"}',
+    '{"a": 1]',
+    '[1}',
+    '{} {}',
+]
+
+
+def _accepts(text, schema=None):
+    return JSONPrefixValidator(schema).feed(text)
+
+
+@pytest.mark.parametrize("text", VALID)
+def test_valid_documents_complete(text):
+    validator = JSONPrefixValidator()
+    assert validator.feed(text)
+    assert validator.complete
+
+
+@pytest.mark.parametrize("text", VALID)
+def test_every_prefix_of_a_valid_document_is_accepted(text):
+    validator = JSONPrefixValidator()
+    for i, char in enumerate(text):
+        assert validator.feed(char), text[:i + 1]
+        # Only the last significant character closes the value
+        assert validator.complete == (text[:i + 1].strip() == text.strip())
+
+
+@pytest.mark.parametrize("text", INVALID)
+def test_invalid_documents_are_rejected(text):
+    assert not _accepts(text)
+
+
+def test_partial_values_are_open():
+    for text in ['{"a": tr', '{"a": "esc \\', '{"a": "\\u00', '{"a": -1.5e+', '[[1, [']:
+        validator = JSONPrefixValidator()
+        assert validator.feed(text), text
+        assert not validator.complete
+
+
+def test_only_whitespace_after_completion():
+    validator = JSONPrefixValidator()
+    assert validator.feed('{"a": 1}\n ')
+    assert validator.complete
+    assert not validator.copy().feed("x")
+
+
+def test_copy_is_independent():
+    validator = JSONPrefixValidator()
+    validator.feed('{"a": [')
+    clone = validator.copy()
+    assert clone.feed("1]}")
+    assert clone.complete
+    assert not validator.complete
+    assert validator.feed('"b"]}')
+
+
+def test_schema_keys_types_and_completeness():
+    full = '{"is_festival": true, "multiplier": 1.25, "name": null}'
+    validator = JSONPrefixValidator(SCHEMA)
+    assert validator.feed(full)
+    assert validator.complete
+
+    assert not _accepts('["is_festival"]', SCHEMA)
+    assert not _accepts('{"unknown', SCHEMA)
+    assert _accepts('{"multi', SCHEMA)
+    assert not _accepts('{"is_festival": "yes"', SCHEMA)
+    assert not _accepts('{"multiplier": true', SCHEMA)
+    assert _accepts('{"name": "Diwali"', SCHEMA)
+    assert _accepts('{"name": null', SCHEMA)
+    assert not _accepts('{"is_festival": true, "is_festival": false', SCHEMA)
+    # The object can't close before every key is present
+    assert not _accepts('{"is_festival": true, "multiplier": 1.0}', SCHEMA)
+
+
+def test_schema_applies_to_top_level_only():
+    schema = {"items": "array"}
+    assert _accepts('{"items": [{"anything": "goes", "n": 1}]}', schema)
+
+
+class FakeTokenizer:
+    def __init__(self, vocab):
+        self.vocab = vocab
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(self.vocab[i] for i in ids)
+
+
+VOCAB = ['{', '"a"', ':', ' 1', '}', 'x', '<eos>', '</think>', 'hmm', ']']
+EOS, THINK_END = 6, 7
+
+
+def _step(processor, stopping, ids, scores=None):
+    input_ids = torch.tensor([ids])
+    if scores is None:
+        scores = torch.zeros(1, len(VOCAB))
+    masked = processor(input_ids, scores)
+    allowed = sorted(i for i in range(len(VOCAB)) if masked[0, i] > float("-inf"))
+    return allowed, bool(stopping(input_ids, masked)[0])
+
+
+def test_logits_processor_masks_tokens_that_break_the_prefix():
+    constraint = JSONConstraint(FakeTokenizer(VOCAB), prompt_length=1, top_k=len(VOCAB))
+    processor = JSONLogitsProcessor(constraint, eos_token_id=EOS)
+    stopping = JSONStoppingCriteria(constraint)
+
+    prompt = [8]
+    allowed, stop = _step(processor, stopping, prompt)
+    assert allowed == [0] and not stop  # only '{' starts the answer
+
+    allowed, stop = _step(processor, stopping, prompt + [0])
+    assert allowed == [1, 4] and not stop  # a key or '}'
+
+    allowed, stop = _step(processor, stopping, prompt + [0, 1, 2])
+    assert allowed == [0, 1, 3] and not stop  # any value
+
+    allowed, stop = _step(processor, stopping, prompt + [0, 1, 2, 3, 4])
+    assert allowed == [EOS] and stop  # closed: only EOS, and generation stops
+
+
+def test_logits_processor_waits_for_the_end_of_thinking():
+    constraint = JSONConstraint(
+        FakeTokenizer(VOCAB), prompt_length=1, think_end_token_id=THINK_END, top_k=len(VOCAB)
+    )
+    processor = JSONLogitsProcessor(constraint, eos_token_id=[EOS])
+    stopping = JSONStoppingCriteria(constraint)
+
+    # Thinking text is not JSON and is left alone
+    allowed, stop = _step(processor, stopping, [8, 8, 5])
+    assert allowed == list(range(len(VOCAB))) and not stop
+
+    allowed, stop = _step(processor, stopping, [8, 8, 5, THINK_END])
+    assert allowed == [0] and not stop
+
+
+def test_logits_processor_only_considers_top_k():
+    constraint = JSONConstraint(FakeTokenizer(VOCAB), prompt_length=0, top_k=2)
+    processor = JSONLogitsProcessor(constraint, eos_token_id=EOS)
+    stopping = JSONStoppingCriteria(constraint)
+
+    scores = torch.zeros(1, len(VOCAB))
+    scores[0, 5] = 3.0  # 'x', invalid
+    scores[0, 0] = 2.0  # '{'
+    allowed, _ = _step(processor, stopping, [], scores)
+    assert allowed == [0]
+
+    # No valid token in the top-k: the scores are returned untouched
+    scores = torch.zeros(1, len(VOCAB))
+    scores[0, 5] = 3.0
+    scores[0, 9] = 2.0
+    allowed, _ = _step(processor, stopping, [], scores)
+    assert allowed == list(range(len(VOCAB)))
+
+
+def test_violation_disables_masking():
+    constraint = JSONConstraint(FakeTokenizer(VOCAB), prompt_length=0, top_k=len(VOCAB))
+    processor = JSONLogitsProcessor(constraint, eos_token_id=EOS)
+    stopping = JSONStoppingCriteria(constraint)
+
+    allowed, stop = _step(processor, stopping, [5])
+    assert constraint.violated
+    assert allowed == list(range(len(VOCAB))) and not stop
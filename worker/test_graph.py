@@ -0,0 +1,31 @@
+"""Tests for the checkpoint run ids of scheduled agent runs"""
+
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from agent.graph import _claim_run_id, _release_run_id, run_id_for
+
+
+def test_run_id_changes_with_the_inputs():
+    when = datetime(2025, 6, 1, 14, 30)
+    assert run_id_for("0123456789abcdef", when) == "2025060114-0123456789ab"
+    assert run_id_for("fedcba9876543210", when) != run_id_for("0123456789abcdef", when)
+    assert run_id_for(None, when) == "2025060114"
+
+
+def test_live_run_id_is_not_reused():
+    first = _claim_run_id(7, "2025060114-abc")
+    second = _claim_run_id(7, "2025060114-abc")
+    other_hospital = _claim_run_id(8, "2025060114-abc")
+    assert first == "2025060114-abc"
+    assert second == "2025060114-abc-2"
+    assert other_hospital == "2025060114-abc"
+
+    for hospital_id, run_id in [(7, first), (7, second), (8, other_hospital)]:
+        _release_run_id(hospital_id, run_id)
+    # Once the first attempt is gone its checkpoint can be resumed again
+    assert _claim_run_id(7, "2025060114-abc") == "2025060114-abc"
+    _release_run_id(7, "2025060114-abc")
@@ -0,0 +1,85 @@
+"""Tests for the incremental inflow window cache against in-memory SQLite"""
+
+import types
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from agent.inflow_cache import InflowWindowCache
+
+Base = declarative_base()
+
+
+class PatientInflow(Base):
+    __tablename__ = "patient_inflow"
+    id = Column(Integer, primary_key=True)
+    ts = Column(DateTime, index=True)
+    hospital_id = Column(Integer, index=True)
+    department_id = Column(Integer)
+    count = Column(Integer)
+
+
+MODELS = types.SimpleNamespace(PatientInflow=PatientInflow)
+NOW = datetime(2025, 6, 1)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _add(db, hospital_id, days_ago, count=1, department_id=1):
+    db.add(PatientInflow(hospital_id=hospital_id, ts=NOW - timedelta(days=days_ago), department_id=department_id, count=count))
+    db.commit()
+
+
+def _counts(window):
+    return window["count"].tolist()
+
+
+def test_top_up_reads_only_new_rows_per_hospital(db):
+    cache = InflowWindowCache()
+    _add(db, 1, 50)
+    _add(db, 2, 2)
+    cache.load(db, MODELS, [1, 2], NOW)
+
+    _add(db, 1, 1, count=5)
+    _add(db, 2, 1, count=7)
+    windows = cache.load(db, MODELS, [1, 2], NOW)
+    assert _counts(windows[1]) == [1, 5]
+    assert _counts(windows[2]) == [1, 7]
+    # Each hospital reads from its own last row: only the two new rows plus
+    # the two rows at the last-seen timestamps, not hospital 2's history
+    assert cache.stats["rows_fetched"] == 2 + 4
+
+
+def test_late_row_with_same_timestamp_is_kept(db):
+    cache = InflowWindowCache()
+    _add(db, 1, 1, count=3)
+    cache.load(db, MODELS, [1], NOW)
+
+    # Arrives later but carries the same timestamp (and even the same values)
+    _add(db, 1, 1, count=3)
+    _add(db, 1, 1, count=4, department_id=2)
+    windows = cache.load(db, MODELS, [1], NOW)
+    assert sorted(_counts(windows[1])) == [3, 3, 4]
+
+    # Nothing new: no duplicates
+    windows = cache.load(db, MODELS, [1], NOW)
+    assert sorted(_counts(windows[1])) == [3, 3, 4]
+
+
+def test_rows_leave_the_window(db):
+    cache = InflowWindowCache()
+    _add(db, 1, 10, count=1)
+    _add(db, 1, 1, count=2)
+    windows = cache.load(db, MODELS, [1], NOW, window_days=30)
+    assert _counts(windows[1]) == [1, 2]
+    windows = cache.load(db, MODELS, [1], NOW + timedelta(days=25), window_days=30)
+    assert _counts(windows[1]) == [2]
@@ -0,0 +1,122 @@
+"""
+Tests for the per-hospital job queue
+
+The in-memory backend always runs; the Redis backend runs against fakeredis
+when it (and lupa, for the Lua scripts) is installed.
+"""
+
+import time
+
+import pytest
+
+from agent.job_queue import InMemoryJobQueue, RedisJobQueue, heartbeat
+
+
+def _memory_queue(**kwargs):
+    return InMemoryJobQueue(**kwargs)
+
+
+def _redis_queue(**kwargs):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return RedisJobQueue(fakeredis.FakeStrictRedis(), **kwargs)
+
+
+@pytest.fixture(params=[_memory_queue, _redis_queue], ids=["memory", "redis"])
+def make_queue(request):
+    return request.param
+
+
+def test_produce_consume(make_queue):
+    queue = make_queue()
+    first = queue.enqueue(1)
+    second = queue.enqueue(2, {"city": "Mumbai"})
+    assert queue.enqueue(1) is None  # hospital 1 already waiting
+
+    job = queue.reserve()
+    assert job["id"] == first and job["attempts"] == 1
+    queue.ack(job)
+    job = queue.reserve()
+    assert job["id"] == second and job["payload"] == {"city": "Mumbai"}
+    queue.ack(job)
+
+    assert queue.reserve() is None
+    assert queue.stats() == {"pending": 0, "processing": 0, "dead": 0}
+
+
+def test_failed_job_is_retried_then_dead_lettered(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.enqueue(1)
+
+    queue.fail(queue.reserve(), "boom")
+    # The retry holds the hospital's dedup slot again
+    assert queue.enqueue(1) is None
+    job = queue.reserve()
+    assert job["attempts"] == 2
+    queue.fail(job, "boom again")
+
+    assert queue.reserve() is None
+    dead = queue.dead_letters()
+    assert len(dead) == 1 and dead[0]["last_error"] == "boom again"
+
+
+def test_expired_reservation_is_retried(make_queue):
+    queue = make_queue(visibility_timeout=0.05)
+    job_id = queue.enqueue(1)
+    queue.reserve()
+    time.sleep(0.1)
+
+    assert queue.requeue_expired() == 1
+    assert queue.enqueue(1) is None
+    job = queue.reserve()
+    assert job["id"] == job_id and job["attempts"] == 2
+
+
+def test_retry_dropped_when_newer_job_waiting(make_queue):
+    queue = make_queue()
+    queue.enqueue(1)
+    job = queue.reserve()
+    newer = queue.enqueue(1)  # allowed: the first job is no longer pending
+    queue.fail(job, "boom")
+
+    assert queue.reserve()["id"] == newer
+    assert queue.reserve() is None
+
+
+def test_extend_keeps_a_running_job_reserved(make_queue):
+    queue = make_queue(visibility_timeout=0.05)
+    queue.enqueue(1)
+    job = queue.reserve()
+
+    time.sleep(0.03)
+    assert queue.extend(job, 0.2)
+    time.sleep(0.05)
+    assert queue.requeue_expired() == 0
+
+    queue.ack(job)
+    assert not queue.extend(job)
+
+
+def test_heartbeat_prevents_redelivery(make_queue):
+    queue = make_queue(visibility_timeout=0.1)
+    queue.enqueue(1)
+    job = queue.reserve()
+
+    with heartbeat(queue, job, interval=0.02):
+        time.sleep(0.3)
+        assert queue.requeue_expired() == 0
+        assert queue.reserve() is None
+    queue.ack(job)
+    assert queue.stats() == {"pending": 0, "processing": 0, "dead": 0}
+
+
+
+def test_dedup_is_atomic_with_the_write(make_queue):
+    queue = make_queue()
+    assert queue.enqueue(1) is not None
+    assert queue.enqueue(1) is None  # nothing written for the duplicate
+    assert queue.stats()["pending"] == 1
+
+    queue.reserve()
+    # Reserving frees the hospital's slot together with the pop
+    assert queue.enqueue(1) is not None
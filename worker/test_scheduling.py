@@ -0,0 +1,151 @@
+"""Tests for the change-driven scheduler with an injected clock and fingerprints"""
+
+from agent.scheduling import ChangeDrivenScheduler
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def _scheduler(fingerprints, clock, **kwargs):
+    options = {"max_staleness": 6 * 3600, "debounce": 120, "max_coalesce": 900, "retry_backoff": 600}
+    options.update(kwargs)
+    return ChangeDrivenScheduler(lambda: dict(fingerprints), clock=clock, **options)
+
+
+def _run_due(scheduler, success=True):
+    """Poll once and finish every due run immediately"""
+    due = scheduler.poll()
+    for hospital_id, fingerprint in due.items():
+        scheduler.mark_finished(hospital_id, fingerprint, success)
+    return sorted(due)
+
+
+def test_first_poll_runs_every_hospital_once():
+    clock = Clock()
+    scheduler = _scheduler({1: "a", 2: "b"}, clock)
+    assert _run_due(scheduler) == [1, 2]
+    clock.advance(60)
+    assert _run_due(scheduler) == []
+
+
+def test_quiet_hospitals_never_run_before_staleness():
+    clock = Clock()
+    fingerprints = {1: "a", 2: "b"}
+    scheduler = _scheduler(fingerprints, clock)
+    _run_due(scheduler)
+
+    runs = []
+    for _ in range(6 * 60 - 1):  # a poll every minute for just under six hours
+        clock.advance(60)
+        runs += _run_due(scheduler)
+    assert runs == []
+    assert scheduler.stats() == {"tracked": 2, "pending_changes": 0}
+
+
+def test_staleness_reruns_unchanged_hospitals():
+    clock = Clock()
+    scheduler = _scheduler({1: "a"}, clock, max_staleness=3600)
+    _run_due(scheduler)
+
+    clock.advance(3599)
+    assert _run_due(scheduler) == []
+    clock.advance(1)
+    assert _run_due(scheduler) == [1]
+    clock.advance(60)
+    assert _run_due(scheduler) == []
+
+
+def test_burst_of_changes_is_coalesced_into_one_run():
+    clock = Clock()
+    fingerprints = {1: "v0", 2: "quiet"}
+    scheduler = _scheduler(fingerprints, clock)
+    _run_due(scheduler)
+
+    # Five updates 30s apart: each one restarts the debounce
+    for version in range(1, 6):
+        clock.advance(30)
+        fingerprints[1] = f"v{version}"
+        assert _run_due(scheduler) == []
+
+    clock.advance(119)
+    assert _run_due(scheduler) == []
+    clock.advance(1)
+    due = scheduler.poll()
+    assert due == {1: "v5"}
+    scheduler.mark_finished(1, "v5", True)
+
+    clock.advance(600)
+    assert _run_due(scheduler) == []
+
+
+def test_max_coalesce_bounds_the_wait_under_constant_churn():
+    clock = Clock()
+    fingerprints = {1: "v0"}
+    scheduler = _scheduler(fingerprints, clock, debounce=120, max_coalesce=900)
+    _run_due(scheduler)
+
+    runs = []
+    for version in range(1, 40):
+        clock.advance(60)  # never settles for 120s
+        fingerprints[1] = f"v{version}"
+        runs.append(_run_due(scheduler))
+
+    ran_at = [i + 1 for i, due in enumerate(runs) if due]
+    # First change at minute 1; runs once 900s have passed since, then again 900s after the next change
+    assert ran_at == [16, 32]
+
+
+def test_change_during_a_run_stays_pending():
+    clock = Clock()
+    fingerprints = {1: "a"}
+    scheduler = _scheduler(fingerprints, clock)
+    _run_due(scheduler)
+
+    fingerprints[1] = "b"
+    scheduler.observe()
+    clock.advance(120)
+    due = scheduler.poll()
+    assert due == {1: "b"}
+
+    # Inputs move on before the run for "b" finishes
+    fingerprints[1] = "c"
+    scheduler.observe()
+    scheduler.mark_finished(1, "b", True)
+    assert scheduler.stats()["pending_changes"] == 1
+
+    clock.advance(120)
+    assert scheduler.poll() == {1: "c"}
+
+
+def test_failed_runs_back_off_before_retrying():
+    clock = Clock()
+    scheduler = _scheduler({1: "a"}, clock, retry_backoff=600)
+    assert _run_due(scheduler, success=False) == [1]
+
+    clock.advance(599)
+    assert _run_due(scheduler) == []
+    clock.advance(1)
+    assert _run_due(scheduler) == [1]
+    clock.advance(60)
+    assert _run_due(scheduler) == []
+
+
+def test_removed_hospitals_are_forgotten():
+    clock = Clock()
+    fingerprints = {1: "a", 2: "b"}
+    scheduler = _scheduler(fingerprints, clock)
+    _run_due(scheduler)
+
+    del fingerprints[2]
+    clock.advance(60)
+    assert _run_due(scheduler) == []
+    assert scheduler.stats()["tracked"] == 1
+    scheduler.mark_finished(2, "b", True)  # late result for a removed hospital is ignored